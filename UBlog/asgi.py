@@ -3,6 +3,12 @@ ASGI config for UBlog project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve with an ASGI server (e.g. ``uvicorn UBlog.asgi:application``) and set
+UBLOG_LIVE_EVENTS=1 to turn on the async Server-Sent Events endpoint
+(``blog/<pk>/events/``): it holds idle client connections on the event loop
+instead of tying up a worker thread each. Under WSGI leave it off; post pages
+then fall back to short polling.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
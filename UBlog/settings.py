@@ -10,31 +10,45 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
-from django.conf import settings
-
-import pymysql
-pymysql.install_as_MySQLdb()
 from pathlib import Path
 import os
 
-from dotenv import load_dotenv  # NEW
-load_dotenv()
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+#A .env file is optional (containers and prod pass real environment variables),
+#so python-dotenv is only imported when there is one to read
+_ENV_FILE = BASE_DIR / '.env'
+if _ENV_FILE.exists():
+    from dotenv import load_dotenv
+    load_dotenv(_ENV_FILE)
+
+#Settings profile: 'dev' (default), 'test' or 'prod'
+UBLOG_ENV = os.environ.get('UBLOG_ENV', 'dev')
+if UBLOG_ENV not in ('dev', 'test', 'prod'):
+    raise RuntimeError(f"UBLOG_ENV must be dev, test or prod (got {UBLOG_ENV!r})")
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in ('1', 'true', 'yes', 'on')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY and UBLOG_ENV == 'test':
+    SECRET_KEY = 'ublog-test-only-secret-key'
 if not SECRET_KEY:
     raise RuntimeError("DJANGO_SECRET_KEY is not set in the environment/.env file")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+#Only dev defaults to DEBUG: it records every query in connection.queries and
+#runs the debug context processor on every render
+DEBUG = _env_bool('DJANGO_DEBUG', UBLOG_ENV == 'dev')
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [h for h in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if h]
 
 
 # Application definition
@@ -51,11 +65,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main_app.middleware.StaticAssetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main_app.middleware.RequestMemoMiddleware',
+    'main_app.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'main_app.middleware.TemplateProfileMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -65,13 +82,21 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'main_app' / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            #Parsed templates are kept per process, so each {% include %} of a partial
+            #is a dict lookup (runserver's autoreloader still clears it on edits)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
-                'django.template.context_processors.debug',
+                *(['django.template.context_processors.debug'] if DEBUG else []),
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main_app.context_processors.notifications',
             ],
         },
     },
@@ -83,17 +108,48 @@ WSGI_APPLICATION = 'UBlog.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+#Prod keeps connections open between requests
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'ublog_db',
-        'USER': 'root',
-        'PASSWORD': 'root',
-        'HOST': 'localhost',
-        'PORT': '3306',
+        'NAME': os.environ.get('UBLOG_DB_NAME', 'ublog_db'),
+        'USER': os.environ.get('UBLOG_DB_USER', 'root'),
+        'PASSWORD': os.environ.get('UBLOG_DB_PASSWORD', 'root'),
+        'HOST': os.environ.get('UBLOG_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('UBLOG_DB_PORT', '3306'),
+        'CONN_MAX_AGE': int(os.environ.get('UBLOG_DB_CONN_MAX_AGE', 60 if UBLOG_ENV == 'prod' else 0)),
+        'CONN_HEALTH_CHECKS': UBLOG_ENV == 'prod',
     }
 }
 
+#Tests run on SQLite unless pointed at a server (no MySQL needed for `manage.py test`)
+if UBLOG_ENV == 'test' and not os.environ.get('UBLOG_DB_HOST'):
+    DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'test_db.sqlite3'}
+
+#PyMySQL stands in for mysqlclient when that isn't installed; only MySQL profiles import a driver
+if DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
+    from importlib.util import find_spec
+    if find_spec('MySQLdb') is None:
+        import pymysql
+        pymysql.install_as_MySQLdb()
+
+#Per-process memory cache unless a shared Redis is configured (needs the redis package);
+#rate limits, cached sessions and the user cache are only global with a shared cache
+UBLOG_REDIS_URL = os.environ.get('UBLOG_REDIS_URL')
+if UBLOG_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': UBLOG_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -131,12 +187,35 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
-STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+STATIC_ROOT = os.environ.get('UBLOG_STATIC_ROOT', os.path.join(BASE_DIR, 'static'))
 
 STATICFILES_DIRS = [
     BASE_DIR / 'main_app' / 'static',
 ]
 
+#collectstatic minifies, bundles, content-hashes and pre-compresses (main_app/assets.py).
+#Prod only: with the manifest storage every {% static %} raises until collectstatic has run
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'main_app.assets.HashedAssetStorage' if UBLOG_ENV == 'prod' and not DEBUG
+        else 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+#Stylesheets served as one file once collected ({% css_bundle %}; separate files under DEBUG)
+UBLOG_CSS_BUNDLES = {
+    'auth': ['css/style.css', 'css/auth.css'],
+}
+
+#Serve STATIC_ROOT from the app (StaticAssetMiddleware) with far-future caching for
+#hashed names; turn off when nginx/a CDN serves /static/ with the same rules
+UBLOG_SERVE_STATIC = not DEBUG
+UBLOG_STATIC_MAX_AGE = 31536000
+
+#Template render profiling via ?_profile=timing|table|flame (staff only; main_app/profiling.py)
+UBLOG_TEMPLATE_PROFILE = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -144,6 +223,29 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'main_app.CustomUser'
 
+#Email-or-username login with a single user lookup (main_app/backends.py)
+AUTHENTICATION_BACKENDS = ['main_app.backends.IdentifierBackend']
+
+#Password hashing: UBLOG_PASSWORD_HASHER hashes new passwords; the others still verify
+#older hashes, which are re-hashed on the user's next login. 'argon2' needs argon2-cffi.
+#Costs in UBLOG_HASHER_PARAMS can only be raised above Django's defaults (main_app/hashers.py).
+UBLOG_PASSWORD_HASHER = os.environ.get('UBLOG_PASSWORD_HASHER', 'pbkdf2')
+_HASHERS = {
+    'pbkdf2': 'main_app.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'main_app.hashers.ScryptPasswordHasher',
+    'argon2': 'main_app.hashers.Argon2PasswordHasher',
+}
+if UBLOG_PASSWORD_HASHER not in _HASHERS:
+    raise RuntimeError(f"UBLOG_PASSWORD_HASHER must be one of {', '.join(_HASHERS)}")
+PASSWORD_HASHERS = [_HASHERS[UBLOG_PASSWORD_HASHER]] + [
+    path for name, path in _HASHERS.items() if name != UBLOG_PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+UBLOG_HASHER_PARAMS = {
+    # 'pbkdf2': {'iterations': 1_200_000},
+    # 'scrypt': {'work_factor': 2**15, 'block_size': 8, 'parallelism': 5},
+    # 'argon2': {'time_cost': 2, 'memory_cost': 102400, 'parallelism': 8},
+}
+
 # Email / SMTP configuration for Gmail
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
@@ -159,6 +261,80 @@ EMAIL_HOST_PASSWORD = os.environ.get("UBLOG_EMAIL_APP_PWD")
 # What users see as the sender
 DEFAULT_FROM_EMAIL = f"UBlog <{EMAIL_HOST_USER}>"
 
+#Sessions: 'cached_db' (cache reads, write-through to DB), 'cache', 'signed_cookies' or 'db'.
+#The cache modes need a cache every worker shares (UBLOG_REDIS_URL): with the per-process
+#LocMem cache a logout on one worker leaves the session readable on the others
+UBLOG_SESSION_MODE = os.environ.get('UBLOG_SESSION_MODE', 'cached_db' if UBLOG_REDIS_URL else 'db')
+SESSION_ENGINE = {
+    'cached_db': 'main_app.sessions',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'db': 'django.contrib.sessions.backends.db',
+}[UBLOG_SESSION_MODE]
+
+#Flash messages ride in a cookie so POST-redirects don't write the session (no cache involved)
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+#Authenticated user rows cached by id, checked against the session auth hash. Only with a
+#shared cache: invalidation on save must reach every worker (None = load from the DB each request)
+UBLOG_USER_CACHE = 'default' if UBLOG_REDIS_URL else None
+UBLOG_USER_CACHE_TIMEOUT = 300
+
+#Live post updates. UBLOG_LIVE_EVENTS turns on the SSE stream: ASGI only (UBlog/asgi.py), since
+#under WSGI every open post page would hold a worker for good. InProcessBroker reaches only the
+#process that published, so run one ASGI process or plug in a cross-process broker. With SSE off,
+#post pages poll blog/<pk>/live/ (database-backed, any number of workers); 0 turns polling off.
+UBLOG_LIVE_EVENTS = _env_bool('UBLOG_LIVE_EVENTS', False)
+UBLOG_EVENT_BROKER = 'main_app.events.InProcessBroker'
+UBLOG_LIVE_POLL_SECONDS = 20
+
+#Notifications: fan-out runs on a background thread every FLUSH_INTERVAL seconds
+UBLOG_NOTIFICATIONS_ASYNC = True
+UBLOG_NOTIFICATION_FLUSH_INTERVAL = 1.0
+
+#Moderation purges (main_app/moderation.py): ids per DELETE batch; with ASYNC off,
+#queued jobs only run via `manage.py run_moderation_jobs`
+UBLOG_MODERATION_ASYNC = True
+UBLOG_MODERATION_BATCH_SIZE = 500
+
+#Home timelines (main_app/timeline.py): authors at or above FANOUT_THRESHOLD followers
+#are merged in at read time instead of being copied into every follower's timeline
+UBLOG_FANOUT_THRESHOLD = 10000
+UBLOG_FANOUT_BATCH_SIZE = 1000
+UBLOG_TIMELINE_ASYNC = True
+UBLOG_TIMELINE_BACKFILL = 50
+UBLOG_TIMELINE_PAGE_SIZE = 20
+
+#Viewer vote state on post cards (main_app/votestate.py): cached per user for TTL seconds,
+#dropped on the user's own vote toggle. Only with a shared cache: the drop must reach every
+#worker (None = one UNION query per request)
+UBLOG_VOTE_STATE_CACHE = 'default' if UBLOG_REDIS_URL else None
+UBLOG_VOTE_STATE_TTL = 60
+UBLOG_VOTE_STATE_MAX_POSTS = 1000
+
+#Request-scoped identity map (main_app/memo.py): X-UBlog-Memo hit counts on every
+#response (always on under DEBUG)
+UBLOG_MEMO_DEBUG = False
+
+#Default comment order on post pages: top, new or active (main_app/threads.py)
+UBLOG_COMMENT_SORT = 'top'
+
+#Tags (main_app/tags.py): names per post, posts per tag page, topics in the sidebar facet list
+UBLOG_MAX_TAGS_PER_POST = 5
+UBLOG_TAG_PAGE_SIZE = 20
+UBLOG_TAG_FACETS = 15
+
+#Feed-card excerpt length in characters (max 500; see main_app/markup.py)
+UBLOG_EXCERPT_LENGTH = 280
+
+#Posts older than this are archived by `manage.py archive_posts` (read-only, out of feeds/search)
+UBLOG_ARCHIVE_AFTER_DAYS = 365
+
+#Activity rollups (`manage.py rollup_stats`, main_app/rollups.py): each run re-reads
+#LAG_SECONDS before the watermark for late commits; WINDOW_HOURS per transaction
+UBLOG_ROLLUP_LAG_SECONDS = 300
+UBLOG_ROLLUP_WINDOW_HOURS = 24
+
 #Redirect Behavior
 LOGIN_REDIRECT_URL = 'postlistview'   # fallback after login
 LOGOUT_REDIRECT_URL = 'homeview'      # send logged-out users to landing
@@ -170,6 +346,40 @@ PASSWORD_RESET_TIMEOUT = 15 * 60
 #Verification resend cooldown
 UBLOG_VERIFICATION_RESEND_COOLDOWN = 300
 
+#Rate limits (see main_app/ratelimit.py). Counters live in this cache alias;
+#use a shared backend (Redis/Memcached) when running several workers.
+#UBLOG_RATELIMIT_ENABLED=0 in the environment turns them off (load tests from one IP).
+UBLOG_RATELIMIT_ENABLED = _env_bool('UBLOG_RATELIMIT_ENABLED', True)
+UBLOG_RATELIMIT_CACHE = 'default'
+UBLOG_RATELIMITS = {
+    'login': {'ip': '30/5m', 'identifier': '5/5m'},
+    'signup': {'ip': '5/h'},
+    'resend_verification': {'ip': '10/h', 'identifier': f'1/{UBLOG_VERIFICATION_RESEND_COOLDOWN}s'},
+    'password_reset': {'ip': '10/h', 'identifier': '3/15m'},
+    'vote': {'user': '120/m'},
+    'follow': {'user': '30/m'},
+}
+
+#Feeds: the newest MAX_ITEMS posts, read CHUNK_SIZE rows at a time. Keep the cap finite:
+#every aggregator poll that misses the ETag streams the whole feed
+UBLOG_FEED_CHUNK_SIZE = 500
+UBLOG_FEED_MAX_ITEMS = 50
+
 # helper to purge unverified accounts (7 days)
 
+#Profile-specific overrides
+if UBLOG_ENV == 'prod':
+    SESSION_COOKIE_SECURE = CSRF_COOKIE_SECURE = _env_bool('UBLOG_SECURE_COOKIES', True)
+
+if UBLOG_ENV == 'test':
+    #Fast hashing, captured mail and inline background work, so tests are deterministic
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    UBLOG_NOTIFICATIONS_ASYNC = False
+    UBLOG_MODERATION_ASYNC = False
+    UBLOG_TIMELINE_ASYNC = False
+    #Source files, no collectstatic: the manifest storage would fail every render
+    STORAGES = {**STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+    UBLOG_SERVE_STATIC = False
+
 
@@ -1,9 +1,402 @@
-from django.contrib import admin
-
-from .models import CustomUser, Post, Comment, Like, Profile
- 
-admin.site.register(CustomUser)
-admin.site.register(Post)
-admin.site.register(Comment)
-admin.site.register(Like)
-admin.site.register(Profile)
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from .models import (
+    CustomUser,
+    Post,
+    Comment,
+    Like,
+    Downvote,
+    CommentLike,
+    CommentDownvote,
+    Profile,
+    Notification,
+    ModerationJob,
+    ArchivedVote,
+    Tag,
+)
+from . import archive, moderation, tags, threads
+from .middleware import forget_cached_user
+from .notifications import recount_unread, unread_recipients
+from .transfer import rebuild_comment_counters
+from .votestate import forget as forget_vote_state
+
+
+# -------------------------------------------------------------------
+# Paging for very large tables
+# -------------------------------------------------------------------
+class EstimatedCountPaginator(Paginator):
+    """
+    For an unfiltered changelist, take the row count from the database's
+    table statistics instead of a full COUNT(*). Small tables, filtered
+    querysets and backends without statistics fall back to the exact count.
+    """
+    exact_below = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = self._estimate(self.object_list.model._meta.db_table)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def _estimate(table):
+        if connection.vendor == 'mysql':
+            sql = ("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s")
+        elif connection.vendor == 'postgresql':
+            sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+        else:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Base for high-volume tables: FK columns come from one JOIN
+    (list_select_related), FK inputs are raw ids instead of <select>s of every
+    row, and neither the page count nor the "N total" link runs a full COUNT(*).
+    Filter by an indexed FK through the URL, e.g. ``?post=42`` or ``?user=7``.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class PurgeActionMixin:
+    """
+    Swaps the stock "delete selected" action (Django's collector loads every
+    cascaded row first) for a batched background purge (main_app/moderation.py).
+    """
+    purge_kind = None
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description="Purge selected and all their content (background job)", permissions=['delete'])
+    def purge_selected(self, request, queryset):
+        jobs = [moderation.enqueue(self.purge_kind, obj, requested_by=request.user) for obj in queryset]
+        url = reverse('admin:main_app_moderationjob_changelist')
+        self.message_user(
+            request,
+            format_html('Queued {} purge job(s). <a href="{}">Follow progress</a>.', len(jobs), url),
+            messages.SUCCESS,
+        )
+
+
+def _changelist_link(model, label, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    url = reverse(f'admin:main_app_{model._meta.model_name}_changelist')
+    return format_html('<a href="{}?{}">{}</a>', url, query, label)
+
+
+# -------------------------------------------------------------------
+# Users / profiles
+# -------------------------------------------------------------------
+@admin.register(CustomUser)
+class CustomUserAdmin(PurgeActionMixin, LargeTableAdmin):
+    list_display = ('id', 'email', 'username', 'is_active', 'is_staff', 'date_joined')
+    search_fields = ('email', 'username')
+    search_help_text = "Exact email or username (case-insensitive)."
+    ordering = ('-id',)
+    actions = ['deactivate_users', 'activate_users', 'purge_selected']
+    purge_kind = ModerationJob.PURGE_USER
+
+    def get_search_results(self, request, queryset, search_term):
+        # Exact match through the LOWER() unique indexes instead of LIKE '%term%' scans
+        term = search_term.strip().lower()
+        if not term:
+            return queryset, False
+        field = 'email__lower' if '@' in term else 'username__lower'
+        return queryset.filter(**{field: term}), False
+
+    def _set_active(self, queryset, active):
+        user_ids = list(queryset.values_list('pk', flat=True))
+        updated = CustomUser.objects.filter(pk__in=user_ids).update(is_active=active)
+        # update() sends no post_save: drop the cached rows so sessions see the change now
+        for user_id in user_ids:
+            forget_cached_user(user_id)
+        return updated
+
+    @admin.action(description="Deactivate selected users")
+    def deactivate_users(self, request, queryset):
+        updated = self._set_active(queryset, False)
+        self.message_user(request, f"Deactivated {updated} user(s).", messages.SUCCESS)
+
+    @admin.action(description="Activate selected users")
+    def activate_users(self, request, queryset):
+        updated = self._set_active(queryset, True)
+        self.message_user(request, f"Activated {updated} user(s).", messages.SUCCESS)
+
+
+@admin.register(Profile)
+class ProfileAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'bio')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+
+# -------------------------------------------------------------------
+# Content
+# -------------------------------------------------------------------
+@admin.register(Post)
+class PostAdmin(PurgeActionMixin, LargeTableAdmin):
+    list_display = ('id', 'title', 'author_username', 'published_date', 'modified_date', 'votes', 'comments')
+    list_select_related = ('author',)
+    list_filter = (('archived_at', admin.EmptyFieldListFilter), ('modified_date', admin.DateFieldListFilter))
+    raw_id_fields = ('author',)
+    readonly_fields = ('archived_at', 'archived_score')
+    ordering = ('-id',)
+    actions = ['purge_selected', 'archive_selected', 'unarchive_selected']
+    purge_kind = ModerationJob.PURGE_POST
+
+    @admin.display(description='Author', ordering='author__username')
+    def author_username(self, obj):
+        return obj.author.username
+
+    @admin.display(description='Votes')
+    def votes(self, obj):
+        return format_html(
+            '{} / {}',
+            _changelist_link(Like, 'likes', post=obj.pk),
+            _changelist_link(Downvote, 'downvotes', post=obj.pk),
+        )
+
+    @admin.display(description='Comments')
+    def comments(self, obj):
+        return _changelist_link(Comment, 'comments', post=obj.pk)
+
+    @admin.action(description="Archive selected posts (read-only, out of feeds and search)")
+    def archive_selected(self, request, queryset):
+        archived = archive.archive_batch(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f"Archived {archived} post(s).", messages.SUCCESS)
+
+    @admin.action(description="Unarchive selected posts")
+    def unarchive_selected(self, request, queryset):
+        restored = sum(archive.unarchive(pk) for pk in queryset.filter(archived_at__isnull=False).values_list('pk', flat=True))
+        self.message_user(request, f"Unarchived {restored} post(s).", messages.SUCCESS)
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        tags.posts_removed([obj.pk])
+        recipients = unread_recipients([obj.pk])
+        super().delete_model(request, obj)
+        recount_unread(recipients)
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'post_count', 'tag_link', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = ('post_count',)
+    ordering = ('-post_count', 'name')
+    actions = ['recount_selected', 'rebuild_index']
+
+    @admin.display(description='Page')
+    def tag_link(self, obj):
+        return format_html('<a href="{}">#{}</a>', reverse('tag_feed', args=[obj.name]), obj.name)
+
+    @admin.action(description="Recount posts for selected tags")
+    def recount_selected(self, request, queryset):
+        tags.recount(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, "Tag counts rebuilt.", messages.SUCCESS)
+
+    @admin.action(description="Rebuild the whole tag index from post tags (ignores the selection)")
+    def rebuild_index(self, request, queryset):
+        written = tags.rebuild()
+        self.message_user(request, f"Tag index rebuilt ({written} post-tag row(s)).", messages.SUCCESS)
+
+
+@admin.register(Comment)
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('id', 'user_username', 'post_title', 'parent_ref', 'short_content',
+                    'like_count', 'downvote_count', 'reply_count', 'descendant_count', 'published_date')
+    list_select_related = ('user', 'post')
+    raw_id_fields = ('user', 'post', 'parent')
+    ordering = ('-id',)
+    actions = ['recount_votes', 'recount_threads']
+
+    @admin.display(description='User', ordering='user__username')
+    def user_username(self, obj):
+        return obj.user.username
+
+    @admin.display(description='Post')
+    def post_title(self, obj):
+        return obj.post.title
+
+    @admin.display(description='Parent', ordering='parent_id')
+    def parent_ref(self, obj):
+        return obj.parent_id
+
+    @admin.display(description='Content')
+    def short_content(self, obj):
+        return obj.content[:60]
+
+    @admin.action(description="Recount likes/downvotes for selected comments")
+    def recount_votes(self, request, queryset):
+        rebuild_comment_counters(Comment.objects.filter(pk__in=queryset.values('pk')))
+        self.message_user(request, "Vote counters rebuilt.", messages.SUCCESS)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        threads.rebuild([obj.post_id])
+        Post.touch(obj.post_id)
+
+    # Replies and notifications cascade with a comment: recount threads and unread badges after,
+    # and bump the post so conditional GETs stop answering 304 for the old page
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        recipients = unread_recipients([obj.post_id])
+        super().delete_model(request, obj)
+        threads.rebuild([obj.post_id])
+        recount_unread(recipients)
+        Post.touch(obj.post_id)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        post_ids = set(queryset.values_list('post_id', flat=True))
+        recipients = unread_recipients(post_ids)
+        super().delete_queryset(request, queryset)
+        threads.rebuild(post_ids)
+        recount_unread(recipients)
+        Post.touch(*post_ids)
+
+    @admin.action(description="Recount replies for the threads of selected comments")
+    def recount_threads(self, request, queryset):
+        changed = threads.rebuild(set(queryset.values_list('post_id', flat=True)))
+        self.message_user(request, f"Thread counters rebuilt ({changed} comment(s) changed).", messages.SUCCESS)
+
+
+# -------------------------------------------------------------------
+# Votes
+# -------------------------------------------------------------------
+class PostVoteAdmin(LargeTableAdmin):
+    list_display = ('id', 'user_username', 'post_title')
+    list_select_related = ('user', 'post')
+    raw_id_fields = ('user', 'post')
+    ordering = ('-id',)
+
+    @admin.display(description='User', ordering='user__username')
+    def user_username(self, obj):
+        return obj.user.username
+
+    @admin.display(description='Post', ordering='post_id')
+    def post_title(self, obj):
+        return f"#{obj.post_id} {obj.post.title}"
+
+    def _votes_changed(self, post_ids, user_ids):
+        # Scores are counted at read time: bump the posts' ETags and the voters' cached vote state
+        Post.touch(*post_ids)
+        for user_id in user_ids:
+            forget_vote_state(user_id)
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self._votes_changed([obj.post_id], [obj.user_id])
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self._votes_changed([obj.post_id], [obj.user_id])
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        rows = list(queryset.values_list('post_id', 'user_id'))
+        super().delete_queryset(request, queryset)
+        self._votes_changed({post_id for post_id, _ in rows}, {user_id for _, user_id in rows})
+
+
+class CommentVoteAdmin(LargeTableAdmin):
+    list_display = ('id', 'user_username', 'comment_ref')
+    list_select_related = ('user',)
+    raw_id_fields = ('user', 'comment')
+    ordering = ('-id',)
+
+    @admin.display(description='User', ordering='user__username')
+    def user_username(self, obj):
+        return obj.user.username
+
+    @admin.display(description='Comment', ordering='comment_id')
+    def comment_ref(self, obj):
+        # Bare id; str(comment) would load the comment, its user and post per row
+        return obj.comment_id
+
+    # Model.save() / delete() recount the comment; the post still needs a new ETag
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        Post.touch(obj.comment.post_id)
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        Post.touch(obj.comment.post_id)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        # "Delete selected" is a single DELETE and skips the per-row recount in Model.delete()
+        rows = list(queryset.values_list('comment_id', 'comment__post_id'))
+        super().delete_queryset(request, queryset)
+        rebuild_comment_counters(Comment.objects.filter(pk__in={comment_id for comment_id, _ in rows}))
+        Post.touch(*{post_id for _, post_id in rows})
+
+
+class ArchivedVoteAdmin(PostVoteAdmin):
+    list_display = PostVoteAdmin.list_display + ('value',)
+
+    def _votes_changed(self, post_ids, user_ids):
+        archive.refresh_archived_scores(post_ids)
+        super()._votes_changed(post_ids, user_ids)
+
+
+admin.site.register(Like, PostVoteAdmin)
+admin.site.register(Downvote, PostVoteAdmin)
+admin.site.register(CommentLike, CommentVoteAdmin)
+admin.site.register(CommentDownvote, CommentVoteAdmin)
+admin.site.register(ArchivedVote, ArchivedVoteAdmin)
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdmin):
+    list_display = ('id', 'recipient', 'verb', 'post_ref', 'actor_count', 'is_read', 'updated_at')
+    list_select_related = ('recipient',)
+    raw_id_fields = ('recipient', 'actor', 'post', 'comment')
+    ordering = ('-id',)
+
+    @admin.display(description='Post', ordering='post_id')
+    def post_ref(self, obj):
+        return obj.post_id
+
+
+@admin.register(ModerationJob)
+class ModerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'target_id', 'target_label', 'status', 'stage', 'rows_deleted',
+                    'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    list_select_related = ('requested_by',)
+    readonly_fields = [f.name for f in ModerationJob._meta.fields]
+    actions = ['requeue']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Re-queue selected failed jobs")
+    def requeue(self, request, queryset):
+        # Purges are resumable: a re-run deletes whatever the failed run left behind
+        requeued = queryset.filter(status=ModerationJob.FAILED).update(status=ModerationJob.QUEUED)
+        if requeued:
+            moderation.wake_worker()
+        self.message_user(request, f"Re-queued {requeued} job(s).", messages.SUCCESS)
@@ -0,0 +1,118 @@
+# path: main_app/archive.py
+"""
+Archiving of old posts, so the hot tables stop growing with history.
+
+A post older than UBLOG_ARCHIVE_AFTER_DAYS gets ``archived_at`` set.
+Its likes and downvotes move out of Like / Downvote into the compact
+ArchivedVote table, and its score is frozen in ``archived_score``.
+
+Feeds, the post list and search read ``Post.objects.live()``, which is served
+by the (archived_at, -published_date) index and never touches the archived range.
+The vote tables keep only votes on live posts. The detail page still opens
+archived posts by pk and falls back to ArchivedVote for the viewer's vote.
+Archived posts are read-only: no new votes or comments.
+
+Archiving also drops the posts from home timelines (TimelineEntry) and from
+tag pages and counts (main_app/tags.py); unarchiving puts their tags back.
+
+Comments and comment votes stay where they are. They are only ever read by
+post id, so their size does not slow down the hot queries.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import tags
+from .bulk import delete_rows
+from .models import ArchivedVote, Downvote, Like, Post, TimelineEntry
+
+VOTE_MODELS = ((Like, ArchivedVote.UP), (Downvote, ArchivedVote.DOWN))
+
+
+def archive_cutoff(days=None):
+    days = getattr(settings, 'UBLOG_ARCHIVE_AFTER_DAYS', 365) if days is None else days
+    return timezone.now() - timedelta(days=days)
+
+
+def refresh_archived_scores(post_ids=None):
+    """Recompute archived_score from ArchivedVote in a single UPDATE (every archived post when None)."""
+    total = (
+        ArchivedVote.objects.filter(post=OuterRef('pk'))
+        .order_by().values('post').annotate(s=Sum('value')).values('s')
+    )
+    posts = Post.objects.filter(archived_at__isnull=False)
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    posts.update(
+        archived_score=Coalesce(Subquery(total), Value(0))
+    )
+
+
+def _move(source_qs, target, make_row, chunk_size):
+    """Copy (pk, post_id, user_id, created_at) rows chunk by chunk into ``target``, deleting each chunk from the source."""
+    while True:
+        rows = list(source_qs.order_by('pk').values_list('pk', 'post_id', 'user_id', 'created_at')[:chunk_size])
+        if not rows:
+            return
+        target.objects.bulk_create([make_row(row) for row in rows], ignore_conflicts=True)
+        chunk = source_qs.model.objects.filter(pk__in=[row[0] for row in rows])
+        delete_rows(chunk)
+
+
+def archive_batch(post_ids, chunk_size=5000):
+    """Archive these posts (skipping any already archived); returns how many were archived."""
+    with transaction.atomic():
+        # Row locks order this against votes/comments, which lock the post first
+        ids = list(
+            Post.objects.select_for_update().live().filter(pk__in=post_ids).values_list('pk', flat=True)
+        )
+        if not ids:
+            return 0
+        for model, value in VOTE_MODELS:
+            _move(
+                model.objects.filter(post_id__in=ids), ArchivedVote,
+                lambda row, value=value: ArchivedVote(post_id=row[1], user_id=row[2], value=value, created_at=row[3]),
+                chunk_size,
+            )
+        # Home timelines only carry live posts (keeps TimelineEntry bounded)
+        entries = TimelineEntry.objects.filter(post_id__in=ids)
+        delete_rows(entries)
+        tags.posts_removed(ids)
+        now = timezone.now()
+        Post.objects.filter(pk__in=ids).update(archived_at=now, modified_date=now)
+        refresh_archived_scores(ids)
+    return len(ids)
+
+
+def archive_older_than(cutoff, batch_size=200, on_batch=None):
+    """Archive every live post published before ``cutoff``, ``batch_size`` posts per transaction."""
+    candidates = Post.objects.live().filter(published_date__lt=cutoff).order_by('published_date', 'pk')
+    total = 0
+    while True:
+        ids = list(candidates.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += archive_batch(ids)
+        if on_batch:
+            on_batch(total)
+
+
+def unarchive(post_id, chunk_size=5000):
+    """Return a post to the live set, moving its votes back into Like / Downvote."""
+    with transaction.atomic():
+        post = Post.objects.select_for_update().filter(pk=post_id, archived_at__isnull=False).first()
+        if post is None:
+            return False
+        for model, value in VOTE_MODELS:
+            _move(
+                ArchivedVote.objects.filter(post_id=post_id, value=value), model,
+                lambda row, model=model: model(post_id=row[1], user_id=row[2], created_at=row[3]),
+                chunk_size,
+            )
+        Post.objects.filter(pk=post_id).update(archived_at=None, archived_score=0, modified_date=timezone.now())
+        tags.posts_restored([post_id])
+    return True
@@ -0,0 +1,150 @@
+# path: main_app/assets.py
+"""
+Static asset build step: content-hashed, minified, pre-compressed files.
+
+``manage.py collectstatic`` with HashedAssetStorage (STORAGES['staticfiles'])
+runs three steps:
+1. It minifies every CSS file and concatenates the UBLOG_CSS_BUNDLES into
+   ``css/<name>.bundle.css``, so a page loads one stylesheet.
+2. It names every file by content hash (``feed.3f2a9c1b7e4d.css``), Django's
+   ManifestStaticFilesStorage, so a cached copy never needs revalidating.
+3. It writes ``.gz`` and, if the optional ``brotli`` package is installed,
+   ``.br`` siblings of every compressible file, so nothing is compressed per
+   request.
+
+StaticAssetMiddleware (main_app/middleware.py) serves the result from
+STATIC_ROOT. It picks the best pre-compressed variant and marks hashed names
+``immutable`` for a year. Repeat visits then make no CSS requests at all.
+Put a CDN or nginx in front with the same rules if you have one.
+"""
+import gzip
+import re
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz variants are written
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.json', '.xml', '.html', '.map')
+# Below this, compression headers cost more than they save
+MIN_COMPRESS_SIZE = 256
+
+# Comments and strings in one left-to-right pass, so a quote inside a comment
+# never opens a string and a '/*' inside a string never opens a comment.
+# Group 1 is what survives verbatim: strings and /*! ... */ comments.
+_COMMENT_OR_STRING_RE = re.compile(
+    r'(/\*!.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.DOTALL,
+)
+_SPACE_RE = re.compile(r'\s+')
+_PUNCT_RE = re.compile(r'\s*([{};,>])\s*')
+_DECL_COLON_RE = re.compile(r'([{;]-{0,2}[a-zA-Z][\w-]*):\s+')
+
+
+def bundles():
+    return getattr(settings, 'UBLOG_CSS_BUNDLES', {})
+
+
+def bundle_path(name):
+    # Same directory as the members, so relative url()s keep resolving
+    return f'css/{name}.bundle.css'
+
+
+# -------------------------------------------------------------------
+# Minify / compress
+# -------------------------------------------------------------------
+def minify_css(css):
+    """
+    Conservative CSS minifier: drops comments (keeps /*! ... */), collapses
+    whitespace, and trims it around { } ; , > and after declaration colons.
+    Strings are left untouched. Other spaces around ':' stay: in selectors they
+    are significant (``a :hover``).
+    """
+    strings = []
+
+    def _keep(m):
+        if m.group(1) is None:
+            return ''
+        strings.append(m.group(1))
+        return f'\x00{len(strings) - 1}\x00'
+
+    css = _COMMENT_OR_STRING_RE.sub(_keep, css.replace('\x00', ''))
+    css = _SPACE_RE.sub(' ', css)
+    css = _PUNCT_RE.sub(r'\1', css).replace(';}', '}')
+    css = _DECL_COLON_RE.sub(r'\1:', css)
+    css = re.sub('\x00(\\d+)\x00', lambda m: strings[int(m.group(1))], css)
+    return css.strip() + '\n'
+
+
+def compress_variants(data):
+    """{'.gz': bytes, '.br': bytes} for the encodings that make ``data`` smaller."""
+    if len(data) < MIN_COMPRESS_SIZE:
+        return {}
+    out = {}
+    buf = BytesIO()
+    # mtime=0 keeps the .gz byte-identical across builds
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9, mtime=0) as gz:
+        gz.write(data)
+    out['.gz'] = buf.getvalue()
+    if brotli is not None:
+        out['.br'] = brotli.compress(data, mode=brotli.MODE_TEXT, quality=11)
+    return {ext: blob for ext, blob in out.items() if len(blob) < len(data)}
+
+
+# -------------------------------------------------------------------
+# Storage
+# -------------------------------------------------------------------
+class HashedAssetStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also minifies, bundles and pre-compresses."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        paths = dict(paths)
+        self._minify_and_bundle(paths)
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception) and hashed_name:
+                self._write_variants(name)
+                self._write_variants(hashed_name)
+            yield name, hashed_name, processed
+
+    def _minify_and_bundle(self, paths):
+        # Rewritten copies live in STATIC_ROOT; point the hashing pass at them
+        minified = {}
+        for path, (storage, source_path) in list(paths.items()):
+            if not path.endswith('.css') or path.endswith('.bundle.css'):
+                continue
+            with storage.open(source_path) as f:
+                minified[path] = minify_css(f.read().decode('utf-8'))
+            self._replace(path, minified[path].encode('utf-8'))
+            paths[path] = (self, path)
+
+        for name, members in bundles().items():
+            missing = [m for m in members if m not in minified]
+            if missing:
+                raise ValueError(f"CSS bundle {name!r} lists unknown files: {', '.join(missing)}")
+            path = bundle_path(name)
+            self._replace(path, ''.join(minified[m] for m in members).encode('utf-8'))
+            paths[path] = (self, path)
+
+    def _replace(self, path, data):
+        if self.exists(path):
+            self.delete(path)
+        self._save(path, ContentFile(data))
+
+    def _write_variants(self, name):
+        if not name.endswith(COMPRESSIBLE):
+            return
+        with self.open(name) as f:
+            data = f.read()
+        for ext, blob in compress_variants(data).items():
+            self._replace(name + ext, blob)
+
+
+def is_built():
+    """True when {% static %} resolves to collected, hashed files (not DEBUG's source files)."""
+    return not settings.DEBUG and isinstance(staticfiles_storage, ManifestStaticFilesStorage)
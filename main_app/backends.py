@@ -0,0 +1,54 @@
+# path: main_app/backends.py
+"""
+Login by email or username with one indexed user lookup.
+
+The old path found the user by identifier, then ModelBackend looked them up
+again by email before hashing. IdentifierBackend does one query
+(CustomUserManager.get_by_identifier) and hands that row straight to the
+password check. An unknown identifier still pays for one hash, so response
+time doesn't reveal which accounts exist.
+
+Timings land in main_app.metrics: ``auth.lookup``, ``auth.hash``,
+``auth.authenticate``. Counters: ``auth.login_ok``, ``auth.login_failed``,
+``auth.login_unknown``, ``auth.rehash``.
+"""
+import time
+
+from django.contrib.auth.backends import ModelBackend
+
+from . import metrics
+from .models import CustomUser
+
+
+class IdentifierBackend(ModelBackend):
+    """ModelBackend that accepts an email or a username and looks the user up once."""
+
+    def authenticate(self, request, username=None, password=None, identifier=None, **kwargs):
+        identifier = identifier or username or kwargs.get(CustomUser.USERNAME_FIELD)
+        if not identifier or password is None:
+            return None
+
+        start = time.perf_counter()
+        try:
+            with metrics.timed('auth.lookup'):
+                user = CustomUser.objects.get_by_identifier(identifier)
+            if user is None:
+                metrics.incr('auth.login_unknown')
+                with metrics.timed('auth.hash'):
+                    # Same work as a real check (Django's default hasher)
+                    CustomUser().set_password(password)
+                return None
+
+            stored = user.password
+            with metrics.timed('auth.hash'):
+                # A stale hash (other algorithm or cost) is re-hashed and saved here
+                valid = user.check_password(password)
+            if user.password != stored:
+                metrics.incr('auth.rehash')
+            if valid and self.user_can_authenticate(user):
+                metrics.incr('auth.login_ok')
+                return user
+            metrics.incr('auth.login_failed')
+            return None
+        finally:
+            metrics.observe('auth.authenticate', time.perf_counter() - start)
@@ -0,0 +1,20 @@
+# path: main_app/bulk.py
+"""
+Single-statement deletes for the bulk paths (purges, archiving, rollups,
+the tag index).
+
+``QuerySet.delete()`` runs Django's collector: it looks for cascades and
+delete signals, and falls back to loading pks when it can't prove there are
+none. The bulk paths delete from tables whose dependents they have already
+removed (votes, join rows, summaries, batches of ids), so they send one
+DELETE ... WHERE instead.
+
+This leans on the private ``QuerySet._raw_delete(using)``, which returns the
+row count; written against Django 5.2. Every caller goes through
+``delete_rows``, so a Django upgrade that changes it is fixed here.
+"""
+
+
+def delete_rows(queryset):
+    """DELETE ``queryset``'s rows in one statement, with no cascades or signals; returns the row count."""
+    return queryset._raw_delete(queryset.db)
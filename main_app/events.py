@@ -0,0 +1,106 @@
+# path: main_app/events.py
+"""
+Pub/sub bus for live post updates (served as Server-Sent Events).
+
+Views publish small events per post ("score", "comment", "comment_score");
+the async SSE view subscribes to a post's channel. Nothing is published
+unless UBLOG_LIVE_EVENTS is on (ASGI deployments only). The broker class comes from
+settings.UBLOG_EVENT_BROKER, so multi-process deployments can swap the
+in-process default for one backed by Redis/Postgres LISTEN etc. by
+implementing BaseBroker.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class BaseBroker:
+    """
+    publish() may be called from any thread (sync views); subscribe() is an
+    async generator that yields events, or None every ``heartbeat`` seconds
+    while idle so the caller can keep the connection alive.
+    """
+
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+    async def subscribe(self, channel, heartbeat=15):
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+
+class InProcessBroker(BaseBroker):
+    """Fan-out to subscribers in this process only (single-worker / dev)."""
+
+    queue_size = 100
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Subscriber's event loop already closed
+                pass
+
+    @staticmethod
+    def _offer(queue, event):
+        if queue.full():
+            # Slow client: drop the oldest event rather than block publishers
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    async def subscribe(self, channel, heartbeat=15):
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        with self._lock:
+            self._subscribers[channel].add(entry)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(entry[1].get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(entry)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'UBLOG_EVENT_BROKER', 'main_app.events.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def enabled():
+    return getattr(settings, 'UBLOG_LIVE_EVENTS', False)
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+def publish_post_event(post_id, event_type, data):
+    """Publish once the surrounding transaction commits (no events for rolled-back votes)."""
+    if not enabled():
+        return
+    event = {'type': event_type, 'data': data}
+    transaction.on_commit(lambda: get_broker().publish(post_channel(post_id), event))
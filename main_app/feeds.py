@@ -0,0 +1,198 @@
+# path: main_app/feeds.py
+"""
+Machine-readable post feeds (RSS 2.0, Atom 1.0, JSON Feed 1.1).
+
+Bodies are produced by generators over ``.iterator(chunk_size=...)`` and
+sent with ``StreamingHttpResponse``. PostgreSQL and SQLite then fetch rows
+chunk by chunk; MySQL drivers buffer the whole result client-side, so the
+row count is bounded by UBLOG_FEED_MAX_ITEMS rather than by the iterator.
+Conditional GET is answered from one aggregate query (newest
+``modified_date`` + row count).
+"""
+import json
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+from django.utils.html import linebreaks
+from django.views.decorators.http import condition, require_safe
+
+from .models import CustomUser, Post
+
+FEED_CHUNK_SIZE = getattr(settings, 'UBLOG_FEED_CHUNK_SIZE', 500)
+FEED_MAX_ITEMS = getattr(settings, 'UBLOG_FEED_MAX_ITEMS', 50)
+
+CONTENT_TYPES = {
+    'rss': 'application/rss+xml; charset=utf-8',
+    'atom': 'application/atom+xml; charset=utf-8',
+    'json': 'application/feed+json; charset=utf-8',
+}
+
+
+# -------------------------------------------------------------------
+# Querysets / validators
+# -------------------------------------------------------------------
+def _feed_queryset(author_pk=None):
+    qs = Post.objects.live()
+    if author_pk is not None:
+        qs = qs.filter(author_id=author_pk)
+    return qs
+
+
+def _feed_state(request, author_pk=None):
+    """
+    (newest modified_date, post count) for the feed, computed once per request
+    and shared by the ETag and Last-Modified callbacks.
+    """
+    state = getattr(request, '_ublog_feed_state', None)
+    if state is None:
+        state = _feed_queryset(author_pk).aggregate(
+            newest=Max('modified_date'), total=Count('id')
+        )
+        request._ublog_feed_state = state
+    return state
+
+
+def _feed_etag(request, fmt, author_pk=None):
+    state = _feed_state(request, author_pk)
+    if state['newest'] is None:
+        return None
+    scope = f'a{author_pk}' if author_pk is not None else 'all'
+    return f'{fmt}-{scope}-{state["newest"].timestamp():.6f}-{state["total"]}'
+
+
+def _feed_last_modified(request, fmt, author_pk=None):
+    return _feed_state(request, author_pk)['newest']
+
+
+# -------------------------------------------------------------------
+# Item streaming
+# -------------------------------------------------------------------
+def _iter_posts(author_pk=None):
+    qs = (
+        _feed_queryset(author_pk)
+        .select_related('author')
+        .only(
+            'id', 'title', 'content_html', 'render_version', 'excerpt', 'published_date', 'modified_date',
+            'author__username',
+        )
+        .order_by('-published_date', '-id')
+    )
+    if FEED_MAX_ITEMS:
+        qs = qs[:FEED_MAX_ITEMS]
+    return qs.iterator(chunk_size=FEED_CHUNK_SIZE)
+
+
+def _html(post):
+    # Stored at write time (main_app/markup.py). Branch on render_version, not on
+    # content_html: an empty body renders to ''. Only never-rendered rows read the
+    # deferred content, one query each, as views.post_body does.
+    if post.render_version:
+        return post.content_html
+    return linebreaks(post.content, autoescape=True)
+
+
+def _stream_rss(request, title, link, posts):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<rss version="2.0"><channel>'
+        f'<title>{escape(title)}</title><link>{escape(link)}</link>'
+        f'<description>{escape(title)}</description><language>en-us</language>'
+    )
+    for post in posts:
+        url = request.build_absolute_uri(post.get_absolute_url())
+        yield (
+            '<item>'
+            f'<title>{escape(post.title)}</title><link>{escape(url)}</link>'
+            f'<guid isPermaLink="true">{escape(url)}</guid>'
+            f'<author>{escape(post.author.username)}</author>'
+            f'<pubDate>{rfc2822_date(post.published_date)}</pubDate>'
+            f'<description>{escape(_html(post))}</description>'
+            '</item>'
+        )
+    yield '</channel></rss>\n'
+
+
+def _stream_atom(request, title, link, posts, updated):
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f'<title>{escape(title)}</title>'
+        f'<link href={quoteattr(link)} rel="alternate"/>'
+        f'<id>{escape(link)}</id>'
+    )
+    if updated is not None:
+        yield f'<updated>{rfc3339_date(updated)}</updated>'
+    for post in posts:
+        url = request.build_absolute_uri(post.get_absolute_url())
+        yield (
+            '<entry>'
+            f'<title>{escape(post.title)}</title>'
+            f'<link href={quoteattr(url)} rel="alternate"/><id>{escape(url)}</id>'
+            f'<updated>{rfc3339_date(post.modified_date)}</updated>'
+            f'<published>{rfc3339_date(post.published_date)}</published>'
+            f'<author><name>{escape(post.author.username)}</name></author>'
+            f'<summary type="text">{escape(post.excerpt)}</summary>'
+            f'<content type="html">{escape(_html(post))}</content>'
+            '</entry>'
+        )
+    yield '</feed>\n'
+
+
+def _stream_json(request, title, link, posts):
+    header = {
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': title,
+        'home_page_url': link,
+        'feed_url': request.build_absolute_uri(),
+    }
+    # Emit the header object minus its closing brace, then the items array.
+    yield json.dumps(header)[:-1] + ', "items": ['
+    sep = ''
+    for post in posts:
+        url = request.build_absolute_uri(post.get_absolute_url())
+        item = {
+            'id': str(post.pk),
+            'url': url,
+            'title': post.title,
+            'content_html': _html(post),
+            'summary': post.excerpt,
+            'date_published': rfc3339_date(post.published_date),
+            'date_modified': rfc3339_date(post.modified_date),
+            'authors': [{'name': post.author.username}],
+        }
+        yield sep + json.dumps(item)
+        sep = ','
+    yield ']}\n'
+
+
+# -------------------------------------------------------------------
+# Views
+# -------------------------------------------------------------------
+@require_safe
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def post_feed(request, fmt, author_pk=None):
+    if fmt not in CONTENT_TYPES:
+        raise Http404("Unknown feed format")
+
+    if author_pk is not None:
+        author = get_object_or_404(CustomUser.objects.only('id', 'username'), pk=author_pk)
+        title = f"UBlog • @{author.username}"
+        link = request.build_absolute_uri(reverse('profileview', kwargs={'pk': author.pk}))
+    else:
+        title = "UBlog"
+        link = request.build_absolute_uri(reverse('postlistview'))
+
+    posts = _iter_posts(author_pk)
+    if fmt == 'rss':
+        body = _stream_rss(request, title, link, posts)
+    elif fmt == 'atom':
+        body = _stream_atom(request, title, link, posts, _feed_state(request, author_pk)['newest'])
+    else:
+        body = _stream_json(request, title, link, posts)
+
+    return StreamingHttpResponse(body, content_type=CONTENT_TYPES[fmt])
@@ -1,6 +1,7 @@
 from django.contrib.auth.forms import UserCreationForm
 from django.db import models
 from .models import Post, CustomUser, Profile
+from . import tags
 from django import forms
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
@@ -18,14 +19,14 @@ class UserRegisterForm(UserCreationForm):
 
     def clean_username(self):
         """
-        Username must be present and UNIQUE in a case-sensitive way.
+        Username must be present and UNIQUE ignoring case (login accepts any casing).
         """
         username = self.cleaned_data.get("username", "")
         if not username:
             raise ValidationError("Please enter a username.")
 
-        # Case-sensitive uniqueness check
-        if CustomUser.objects.filter(username=username).exists():
+        # Case-insensitive uniqueness check (LOWER(username) index)
+        if CustomUser.objects.filter(username__lower=username.lower()).exists():
             raise ValidationError("That username is already taken.")
 
         return username
@@ -44,8 +45,8 @@ class UserRegisterForm(UserCreationForm):
         except ValidationError:
             raise ValidationError("Please enter a valid email address.")
 
-        # Uniqueness (case-insensitive)
-        if CustomUser.objects.filter(email__iexact=email).exists():
+        # Uniqueness (case-insensitive, LOWER(email) index)
+        if CustomUser.objects.filter(email__lower=email.lower()).exists():
             raise ValidationError("An account with this email already exists.")
 
         return email
@@ -90,6 +91,13 @@ class UserRegisterForm(UserCreationForm):
 
 
 class PostForm(forms.ModelForm):
+    # Stored by the view through main_app/tags.py, not as a model field
+    tags = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'python django web'}),
+        help_text="Topics, separated by spaces or commas (python, django).",
+    )
+
     class Meta:
         model = Post
         fields = ('title', 'content')
@@ -98,6 +106,21 @@ class PostForm(forms.ModelForm):
             'title': forms.TextInput(attrs={'class': 'form-control'}),
             'content': forms.Textarea(attrs={'class': 'form-control'}),
         }
+        help_texts = {
+            'content': "Markdown: **bold**, *italic*, `code`, [link](https://...), - lists, > quotes, ``` code blocks.",
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['tags'].initial = self.instance.tag_names
+
+    def clean_tags(self):
+        """Normalized list of tag names."""
+        try:
+            return tags.parse(self.cleaned_data.get('tags'))
+        except ValueError as exc:
+            raise ValidationError(str(exc))
 
 
 class ProfileUpdateForm(forms.ModelForm):
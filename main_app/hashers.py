@@ -0,0 +1,42 @@
+# path: main_app/hashers.py
+"""
+Django's password hashers with their cost read from UBLOG_HASHER_PARAMS.
+
+The algorithm names are unchanged, so stored hashes keep verifying. When a
+stored hash was made with other parameters (or another algorithm than the
+first in PASSWORD_HASHERS), Django re-hashes the password on that user's next
+successful login. Costs can only be raised above Django's defaults, never
+lowered: the cheaper login comes from picking a memory-hard algorithm
+(scrypt, Argon2), not from fewer rounds.
+
+``manage.py bench_hashers`` times each configured hasher.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _cost(algorithm, name, default):
+    configured = getattr(settings, 'UBLOG_HASHER_PARAMS', {}).get(algorithm, {}).get(name, default)
+    return max(int(configured), default)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = _cost('pbkdf2', 'iterations', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = _cost('scrypt', 'work_factor', hashers.ScryptPasswordHasher.work_factor)
+    block_size = _cost('scrypt', 'block_size', hashers.ScryptPasswordHasher.block_size)
+    parallelism = _cost('scrypt', 'parallelism', hashers.ScryptPasswordHasher.parallelism)
+    # scrypt needs ~128 * N * r bytes; OpenSSL's default cap (32 MiB) is too small past N=2**14
+    maxmem = 2 * 128 * work_factor * block_size
+
+    def __init__(self):
+        if self.work_factor & (self.work_factor - 1):
+            raise ValueError("UBLOG_HASHER_PARAMS['scrypt']['work_factor'] must be a power of two")
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    time_cost = _cost('argon2', 'time_cost', hashers.Argon2PasswordHasher.time_cost)
+    memory_cost = _cost('argon2', 'memory_cost', hashers.Argon2PasswordHasher.memory_cost)
+    parallelism = _cost('argon2', 'parallelism', hashers.Argon2PasswordHasher.parallelism)
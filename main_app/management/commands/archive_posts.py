@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.archive import archive_cutoff, archive_older_than, unarchive
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive posts published more than --days ago (default UBLOG_ARCHIVE_AFTER_DAYS): "
+        "their votes move to ArchivedVote and they drop out of feeds and search. "
+        "Safe to run repeatedly, e.g. nightly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Archive posts older than this many days.")
+        parser.add_argument('--batch-size', type=int, default=200, help="Posts per transaction.")
+        parser.add_argument('--unarchive', type=int, metavar='POST_ID', help="Return one post to the live set.")
+
+    def handle(self, *args, **options):
+        if options['unarchive']:
+            if not unarchive(options['unarchive']):
+                raise CommandError(f"Post {options['unarchive']} does not exist or is not archived")
+            self.stdout.write(self.style.SUCCESS(f"Post {options['unarchive']} is live again."))
+            return
+
+        cutoff = archive_cutoff(options['days'])
+        started = time.monotonic()
+        total = archive_older_than(
+            cutoff, batch_size=options['batch_size'],
+            on_batch=lambda n: self.stdout.write(f"archived {n} post(s)..."),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {total} post(s) published before {cutoff:%Y-%m-%d} in {time.monotonic() - started:.2f}s."
+        ))
@@ -0,0 +1,34 @@
+import statistics
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Time one password hash with each hasher in PASSWORD_HASHERS at its configured cost "
+        "(see UBLOG_HASHER_PARAMS). The first one listed hashes new passwords."
+    )
+    cost_params = ('iterations', 'work_factor', 'block_size', 'parallelism', 'time_cost', 'memory_cost')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Hashes per hasher (median is reported).")
+
+    def handle(self, *args, **options):
+        for i, hasher in enumerate(get_hashers()):
+            try:
+                hasher.encode('benchmark-password', hasher.salt())
+            except (ValueError, ImportError) as exc:
+                self.stdout.write(f"{hasher.algorithm:<16} unavailable: {exc}")
+                continue
+            samples = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                hasher.encode('benchmark-password', hasher.salt())
+                samples.append(time.perf_counter() - start)
+            params = {name: getattr(hasher, name) for name in self.cost_params if hasattr(hasher, name)}
+            marker = '  (default)' if i == 0 else ''
+            self.stdout.write(
+                f"{hasher.algorithm:<16} {statistics.median(samples) * 1000:>8.1f} ms  {params}{marker}"
+            )
@@ -0,0 +1,99 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.backends.django import Template as BackendTemplate
+from django.template.engine import Engine
+from django.test import RequestFactory
+from django.utils import timezone
+
+from main_app.models import CustomUser, Post
+from main_app.profiling import RenderProfile
+
+PAGE = 'main_app/postlist.html'
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the post list with N in-memory posts (no database) and report the per-card cost, "
+        "with the configured template loaders and, with --uncached, without the cached loader."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[50, 500, 5000])
+        parser.add_argument('--repeat', type=int, default=5, help="Timed renders per size (median is reported).")
+        parser.add_argument('--uncached', action='store_true', help="Also time a loader setup without caching.")
+        parser.add_argument('--profile', action='store_true', help="Print the per-template table for the largest size.")
+        parser.add_argument('--flame', metavar='PATH', help="Write folded stacks for the largest size to PATH.")
+
+    def handle(self, *args, **options):
+        configured = engines['django'].engine
+        setups = [('cached', configured)]
+        if options['uncached']:
+            setups.append(('uncached', self._uncached(configured)))
+
+        request = RequestFactory().get('/blog/')
+        request.user = AnonymousUser()
+        sizes = sorted(set(options['items']))
+
+        self.stdout.write(f"{'loader':<9} {'posts':>6} {'page ms':>9} {'per card us':>12}")
+        for label, engine in setups:
+            template = BackendTemplate(engine.get_template(PAGE), engines['django'])
+            baseline = self._time(template, request, [], options['repeat'])
+            for n in sizes:
+                page = self._time(template, request, self._posts(n), options['repeat'])
+                # Marginal cost: whatever the page costs beyond an empty list, per card
+                per_card = (page - baseline) / n * 1e6
+                self.stdout.write(f"{label:<9} {n:>6} {page * 1000:>9.2f} {per_card:>12.1f}")
+
+        if options['profile'] or options['flame']:
+            template = engines['django'].get_template(PAGE)
+            posts = self._posts(sizes[-1])
+            with RenderProfile() as profile:
+                template.render({'posts': posts}, request)
+            if options['profile']:
+                self.stdout.write(profile.table())
+            if options['flame']:
+                with open(options['flame'], 'w') as f:
+                    f.write(profile.collapsed())
+                self.stdout.write(f"Folded stacks written to {options['flame']}")
+
+    @staticmethod
+    def _uncached(engine):
+        return Engine(
+            dirs=engine.dirs,
+            app_dirs=False,
+            loaders=['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader'],
+            context_processors=engine.context_processors,
+            debug=engine.debug,
+            libraries=engine.libraries,
+            builtins=engine.builtins,
+            autoescape=engine.autoescape,
+        )
+
+    @staticmethod
+    def _time(template, request, posts, repeat):
+        template.render({'posts': posts}, request)  # warm-up: loader caches, URL resolver
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            template.render({'posts': posts}, request)
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples)
+
+    @staticmethod
+    def _posts(n):
+        author = CustomUser(pk=1, username='bench')
+        now = timezone.now()
+        posts = []
+        for i in range(1, n + 1):
+            post = Post(
+                pk=i, author=author, title=f"Benchmark post {i}", content="x" * 400, published_date=now,
+                excerpt="Lorem ipsum dolor sit amet, " * 8, excerpt_truncated=bool(i % 3), render_version=1,
+            )
+            post.vote_score, post.num_comments = i % 17 - 5, i % 9
+            post.user_liked, post.user_downvoted = i % 5 == 0, False
+            posts.append(post)
+        return posts
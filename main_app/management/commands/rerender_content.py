@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from main_app.markup import RENDERER_VERSION
+from main_app.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-render stored post/comment HTML (and post excerpts) whose render_version is older "
+        "than main_app.markup.RENDERER_VERSION. Run after bumping the version, upgrading, or a bulk import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Re-render every row, not just stale ones.")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        for model in (Post, Comment):
+            started = time.monotonic()
+            n = self._rerender(model, options['batch_size'], options['all'])
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {n} re-rendered in {time.monotonic() - started:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f"Stored HTML is at renderer version {RENDERER_VERSION}."))
+
+    def _rerender(self, model, batch_size, everything):
+        qs = model.objects.order_by('pk')
+        if not everything:
+            qs = qs.filter(render_version__lt=RENDERER_VERSION)
+        qs = qs.only('pk', 'content', 'post_id') if model is Comment else qs.only('pk', 'content')
+
+        n = 0
+        last_pk = 0
+        while True:
+            rows = list(qs.filter(pk__gt=last_pk)[:batch_size])
+            if not rows:
+                return n
+            for row in rows:
+                row.render_content()
+            model.objects.bulk_update(rows, model.RENDERED_FIELDS)
+            # New HTML means new pages: move the conditional-GET validators on
+            post_ids = {row.post_id for row in rows} if model is Comment else {row.pk for row in rows}
+            Post.objects.filter(pk__in=post_ids).update(modified_date=timezone.now())
+            n += len(rows)
+            last_pk = rows[-1].pk
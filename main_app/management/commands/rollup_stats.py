@@ -0,0 +1,39 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from main_app import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Bring the hourly/daily activity summaries (main_app/rollups.py) up to date, reading only "
+        "raw rows past the stored watermark. Schedule it every few minutes up to hourly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', metavar='DATE[TIME]',
+            help="Recompute from this point instead of the watermark (e.g. 2025-01-01 for a rebuild).",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                day = parse_date(options['since'])
+                if day is None:
+                    raise CommandError(f"Can't parse --since {options['since']!r}")
+                since = datetime.combine(day, time.min)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        self.stdout.write(f"Watermark: {rollups.watermark() or 'none (first run covers all history)'}")
+        written = rollups.run(since=since, on_window=self._progress)
+        self.stdout.write(self.style.SUCCESS(f"{written} summary rows written; watermark now {rollups.watermark()}"))
+
+    def _progress(self, start, end, written):
+        self.stdout.write(f"  {start:%Y-%m-%d %H:%M} .. {end:%Y-%m-%d %H:%M}  ({written} rows so far)")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app import moderation
+from main_app.models import CustomUser, ModerationJob, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued moderation purges (see main_app/moderation.py) in the foreground, "
+        "printing progress after each batch. --purge-user / --purge-post queue a new job first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge-user', type=int, metavar='USER_ID', help="Queue a purge of this user.")
+        parser.add_argument('--purge-post', type=int, metavar='POST_ID', help="Queue a purge of this post.")
+        parser.add_argument('--retry-failed', action='store_true', help="Re-queue failed jobs before running.")
+
+    def handle(self, *args, **options):
+        if options['purge_user']:
+            self._queue(ModerationJob.PURGE_USER, CustomUser, options['purge_user'])
+        if options['purge_post']:
+            self._queue(ModerationJob.PURGE_POST, Post, options['purge_post'])
+        if options['retry_failed']:
+            n = ModerationJob.objects.filter(status=ModerationJob.FAILED).update(status=ModerationJob.QUEUED)
+            self.stdout.write(f"Re-queued {n} failed job(s).")
+
+        ran = moderation.run_queued(on_progress=self._progress)
+        failed = ModerationJob.objects.filter(status=ModerationJob.FAILED).count()
+        self.stdout.write(self.style.SUCCESS(f"Ran {ran} job(s); {failed} failed job(s) on record."))
+
+    @staticmethod
+    def _queue(kind, model, pk):
+        target = model.objects.filter(pk=pk).first()
+        if target is None:
+            raise CommandError(f"No {model._meta.verbose_name} with id {pk}")
+        # The command runs the job itself; keep the in-process worker out of it
+        ModerationJob.objects.create(kind=kind, target_id=pk, target_label=str(target)[:255])
+
+    def _progress(self, job):
+        self.stdout.write(f"job {job.pk} [{job.stage}] {job.rows_deleted} rows deleted: {job.deleted}")
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.html import escape
+
+from main_app.models import Notification, NotificationInbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Email each user one digest of unread notifications that changed since their last digest. "
+        "Messages go out over a single SMTP connection in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Emails per SMTP batch.")
+        parser.add_argument('--max-items', type=int, default=20, help="Notifications listed per email.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        connection = None if options['dry_run'] else get_connection()
+        inboxes = (
+            NotificationInbox.objects.filter(unread_count__gt=0)
+            .select_related('user')
+            .only('user_id', 'digest_sent_at', 'user__username', 'user__email', 'user__is_active')
+            .order_by('user_id')
+        )
+
+        batch, batch_users, sent = [], [], 0
+        for inbox in inboxes.iterator(chunk_size=500):
+            if not inbox.user.is_active or not inbox.user.email:
+                continue
+            items = Notification.objects.filter(recipient_id=inbox.user_id, is_read=False)
+            if inbox.digest_sent_at:
+                items = items.filter(updated_at__gt=inbox.digest_sent_at)
+            items = list(items.select_related('actor', 'post').order_by('-updated_at')[:options['max_items']])
+            if not items:
+                continue
+            batch.append(self._build(inbox.user, items))
+            batch_users.append(inbox.user_id)
+            if len(batch) >= batch_size:
+                sent += self._send(connection, batch, batch_users, now)
+                batch, batch_users = [], []
+        if batch:
+            sent += self._send(connection, batch, batch_users, now)
+
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} digest email(s)."))
+
+    def _send(self, connection, batch, user_ids, now):
+        if connection is not None:
+            connection.send_messages(batch)
+            NotificationInbox.objects.filter(user_id__in=user_ids).update(digest_sent_at=now)
+        return len(batch)
+
+    @staticmethod
+    def _build(user, items):
+        lines = [f"- {n.summary} \"{n.post.title}\"" for n in items]
+        text = f"Hi {user.username},\n\nHere's what happened on UBlog:\n\n" + "\n".join(lines)
+        html = "<p>Hi <b>{}</b>, here's what happened on UBlog:</p><ul>{}</ul>".format(
+            escape(user.username),
+            "".join(f"<li>{escape(n.summary)} <i>{escape(n.post.title)}</i></li>" for n in items),
+        )
+        message = EmailMultiAlternatives(
+            "Your UBlog notifications", text, settings.DEFAULT_FROM_EMAIL, [user.email]
+        )
+        message.attach_alternative(html, 'text/html')
+        return message
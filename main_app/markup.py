@@ -0,0 +1,176 @@
+# path: main_app/markup.py
+"""
+Markdown rendering for posts and comments, done once at write time.
+
+Post.save() / Comment.save() store the rendered HTML (and, for posts, a
+plain-text excerpt for feed cards), so page views only output stored
+columns. Bump RENDERER_VERSION whenever the output of render() changes, then
+run ``manage.py rerender_content`` to refresh the stored HTML.
+
+The renderer supports a deliberately small subset, with no extra
+dependency:
+- paragraphs and line breaks
+- # headings
+- > quotes
+- - / * / 1. lists
+- --- rules
+- ``` fenced code
+- `code`, **bold**, *italic* / _italic_
+- [links](https://...)
+
+It is escape-first: the source is HTML-escaped before any markup is
+recognised, and the only tags in the output are the ones emitted here. Link
+targets are limited to http(s), mailto and site-relative URLs. Sanitising
+needs no separate HTML-cleaning pass.
+"""
+import re
+from html import unescape
+
+from django.conf import settings
+from django.utils.html import escape, strip_tags
+from django.utils.text import Truncator
+
+RENDERER_VERSION = 2
+
+_FENCE_RE = re.compile(r'^```')
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*$')
+_RULE_RE = re.compile(r'^(?:-{3,}|\*{3,}|_{3,})$')
+_QUOTE_RE = re.compile(r'^&gt;\s?(.*)$')
+_UL_RE = re.compile(r'^[-*+]\s+(.*)$')
+_OL_RE = re.compile(r'^\d{1,9}[.)]\s+(.*)$')
+
+_CODE_SPAN_RE = re.compile(r'`([^`\n]+)`')
+_LINK_RE = re.compile(r'\[([^\]\n]+)\]\(([^)\s]+)\)')
+_BOLD_RE = re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*')
+_ITALIC_RE = re.compile(r'(?<![\w*])([*_])(?=\S)(.+?)(?<=\S)\1(?![\w*])')
+# Site-relative means one slash: browsers read both // and /\ as protocol-relative (another host)
+_SAFE_URL_RE = re.compile(r'^(?:https?://|mailto:|/(?![/\\])|#)', re.IGNORECASE)
+_PLACEHOLDER_RE = re.compile('\x00(\\d+)\x00')
+
+
+# -------------------------------------------------------------------
+# Inline markup (input is already escaped)
+# -------------------------------------------------------------------
+def _inline(text):
+    # Code spans are opaque: swap them out before the other rules run
+    stash = []
+
+    def _keep(html):
+        stash.append(html)
+        return f'\x00{len(stash) - 1}\x00'
+
+    text = _CODE_SPAN_RE.sub(lambda m: _keep(f'<code>{m.group(1)}</code>'), text)
+
+    def _link(m):
+        label, url = m.group(1), m.group(2)
+        if not _SAFE_URL_RE.match(url):
+            return m.group(0)
+        return _keep(f'<a href="{url}" rel="nofollow noopener">{label}</a>')
+
+    text = _LINK_RE.sub(_link, text)
+    text = _BOLD_RE.sub(r'<strong>\1</strong>', text)
+    text = _ITALIC_RE.sub(r'<em>\2</em>', text)
+    return _PLACEHOLDER_RE.sub(lambda m: stash[int(m.group(1))], text)
+
+
+# -------------------------------------------------------------------
+# Blocks
+# -------------------------------------------------------------------
+def render(source):
+    """Markdown subset -> safe HTML string."""
+    lines = escape((source or '').replace('\x00', '')).replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    out = []
+    para = []
+    i = 0
+
+    def _flush():
+        if para:
+            out.append('<p>' + '<br>'.join(_inline(line) for line in para) + '</p>')
+            para.clear()
+
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+
+        if _FENCE_RE.match(stripped):
+            _flush()
+            code = []
+            i += 1
+            while i < len(lines) and not _FENCE_RE.match(lines[i].strip()):
+                code.append(lines[i])
+                i += 1
+            out.append('<pre><code>' + '\n'.join(code) + '</code></pre>')
+            i += 1
+            continue
+
+        if not stripped:
+            _flush()
+            i += 1
+            continue
+
+        heading = _HEADING_RE.match(stripped)
+        if heading:
+            _flush()
+            # The post title is the page's <h1>
+            level = min(len(heading.group(1)) + 1, 6)
+            out.append(f'<h{level}>{_inline(heading.group(2))}</h{level}>')
+            i += 1
+            continue
+
+        if _RULE_RE.match(stripped):
+            _flush()
+            out.append('<hr>')
+            i += 1
+            continue
+
+        if _QUOTE_RE.match(stripped):
+            _flush()
+            quoted = []
+            while i < len(lines) and _QUOTE_RE.match(lines[i].strip()):
+                quoted.append(_QUOTE_RE.match(lines[i].strip()).group(1))
+                i += 1
+            out.append('<blockquote>' + _render_quote(quoted) + '</blockquote>')
+            continue
+
+        for pattern, tag in ((_UL_RE, 'ul'), (_OL_RE, 'ol')):
+            if pattern.match(stripped):
+                _flush()
+                items = []
+                while i < len(lines) and pattern.match(lines[i].strip()):
+                    items.append('<li>' + _inline(pattern.match(lines[i].strip()).group(1)) + '</li>')
+                    i += 1
+                out.append(f'<{tag}>' + ''.join(items) + f'</{tag}>')
+                break
+        else:
+            para.append(stripped)
+            i += 1
+
+    _flush()
+    return '\n'.join(out)
+
+
+def _render_quote(lines):
+    # Quote bodies are already escaped; only paragraph and inline rules apply
+    paragraphs, current = [], []
+    for line in lines + ['']:
+        if line.strip():
+            current.append(_inline(line.strip()))
+        elif current:
+            paragraphs.append('<p>' + '<br>'.join(current) + '</p>')
+            current = []
+    return ''.join(paragraphs)
+
+
+def excerpt_length():
+    return getattr(settings, 'UBLOG_EXCERPT_LENGTH', 280)
+
+
+def excerpt(html, length=None):
+    """Plain-text preview of rendered HTML: (text, truncated?)."""
+    length = length or excerpt_length()
+    # Block boundaries become spaces so words don't run together
+    text = strip_tags(re.sub(r'</(?:p|h\d|li|pre|blockquote)>|<br>|<hr>', ' ', html))
+    # Stored as plain text; templates escape it again on output
+    text = ' '.join(unescape(text).split())
+    short = Truncator(text).chars(length)
+    return short, short != text
@@ -0,0 +1,150 @@
+# path: main_app/memo.py
+"""
+Request-scoped identity map and memo.
+
+RequestMemoMiddleware opens one RequestMemo per request. Views, helpers,
+context processors and template tags all reach it through the module-level
+functions below. So anything they look up is loaded at most once per request:
+- rows: ``get_many(model, pks)`` / ``get(model, pk)`` return the instance
+  already loaded for a pk, or load the missing ones in one ``pk IN`` query.
+  ``remember(*instances)`` seeds the map with rows that were loaded anyway
+  (request.user, the post being viewed). ``attach(objects, 'user')`` fills a
+  foreign key on a list of objects the same way, so the viewer, the post
+  author and every commenter are each one instance shared by the whole page.
+- anything else: ``memoize(key, fn)`` runs ``fn`` once per key (the unread
+  badge, the viewer's vote state). A write in the same request calls
+  ``forget(key)``.
+
+Only fully loaded rows enter the map: an ``.only()`` instance would hand later
+callers deferred fields that cost a query each.
+
+Outside a request (management commands, background threads) there is no memo,
+and every call goes straight to the database.
+
+With DEBUG or UBLOG_MEMO_DEBUG, each response carries an ``X-UBlog-Memo``
+header with hits/misses per kind (``main_app.CustomUser=2/1 unread=1/1``).
+Every hit is also logged on the ``main_app.memo`` logger at DEBUG level.
+"""
+import logging
+from collections import Counter
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('ublog_request_memo', default=None)
+_MISSING = object()
+
+
+class RequestMemo:
+    def __init__(self):
+        self.instances = {}
+        self.values = {}
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def _count(self, kind, key, hit):
+        if hit:
+            self.hits[kind] += 1
+            logger.debug("memo hit %s %r", kind, key)
+        else:
+            self.misses[kind] += 1
+
+    # Rows ----------------------------------------------------------------
+    def remember(self, *instances):
+        for obj in instances:
+            if obj is not None and obj.pk is not None and not obj.get_deferred_fields():
+                self.instances.setdefault((obj._meta.label, obj.pk), obj)
+
+    def get_many(self, model, pks):
+        label = model._meta.label
+        found, missing = {}, []
+        for pk in set(pks):
+            obj = self.instances.get((label, pk))
+            self._count(label, pk, obj is not None)
+            if obj is None:
+                missing.append(pk)
+            else:
+                found[pk] = obj
+        if missing:
+            loaded = model._default_manager.in_bulk(missing)
+            self.remember(*loaded.values())
+            found.update(loaded)
+        return found
+
+    # Values --------------------------------------------------------------
+    def memoize(self, key, fn):
+        value = self.values.get(key, _MISSING)
+        self._count(key[0], key[1:], value is not _MISSING)
+        if value is _MISSING:
+            value = self.values[key] = fn()
+        return value
+
+    def forget(self, key):
+        self.values.pop(key, None)
+
+    def summary(self):
+        kinds = sorted(set(self.hits) | set(self.misses))
+        return ' '.join(f'{kind}={self.hits[kind]}/{self.misses[kind]}' for kind in kinds)
+
+
+# -------------------------------------------------------------------
+# Module API (no-ops / straight queries outside a request)
+# -------------------------------------------------------------------
+def current():
+    return _current.get()
+
+
+def activate():
+    """Open a memo for the current context; returns a token for ``deactivate``."""
+    return _current.set(RequestMemo())
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def remember(*instances):
+    memo = current()
+    if memo is not None:
+        memo.remember(*instances)
+
+
+def get_many(model, pks):
+    """{pk: instance} for ``pks``, loading only those this request has not seen."""
+    memo = current()
+    if memo is None:
+        return model._default_manager.in_bulk(set(pks))
+    return memo.get_many(model, pks)
+
+
+def get(model, pk):
+    return get_many(model, [pk]).get(pk)
+
+
+def attach(objects, field_name):
+    """Fill the foreign key ``field_name`` on every object from the identity map; returns ``objects``."""
+    if not objects:
+        return objects
+    field = objects[0]._meta.get_field(field_name)
+    related = get_many(field.related_model, {
+        getattr(obj, field.attname) for obj in objects if getattr(obj, field.attname) is not None
+    })
+    for obj in objects:
+        target = related.get(getattr(obj, field.attname))
+        if target is not None:
+            field.set_cached_value(obj, target)
+    return objects
+
+
+def memoize(key, fn):
+    """``fn()`` once per request for ``key``, a tuple whose first item names the kind (``('unread', user_id)``)."""
+    memo = current()
+    if memo is None:
+        return fn()
+    return memo.memoize(key, fn)
+
+
+def forget(key):
+    memo = current()
+    if memo is not None:
+        memo.forget(key)
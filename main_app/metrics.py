@@ -0,0 +1,65 @@
+# path: main_app/metrics.py
+"""
+Tiny in-process counters and timers.
+
+Each worker keeps its own numbers; /metrics/ (staff only) shows the
+snapshot for the worker that served the request. Timings also keep their
+last SAMPLE_SIZE samples for the p95.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+SAMPLE_SIZE = 1000
+
+_lock = threading.Lock()
+_counters = {}
+_timings = {}
+_samples = {}
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def observe(name, seconds):
+    """Record one duration sample (kept as count / total / max, plus recent samples)."""
+    with _lock:
+        count, total, peak = _timings.get(name, (0, 0.0, 0.0))
+        _timings[name] = (count + 1, total + seconds, max(peak, seconds))
+        _samples.setdefault(name, deque(maxlen=SAMPLE_SIZE)).append(seconds)
+
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def _p95(samples):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+
+
+def snapshot():
+    with _lock:
+        timings = {
+            name: {
+                'count': n, 'avg_ms': total / n * 1000 if n else 0.0, 'max_ms': peak * 1000,
+                'p95_ms': _p95(_samples.get(name, ())) * 1000,
+            }
+            for name, (n, total, peak) in _timings.items()
+        }
+        return {'counters': dict(_counters), 'timings': timings}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+        _samples.clear()
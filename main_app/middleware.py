@@ -0,0 +1,233 @@
+# path: main_app/middleware.py
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date
+
+from . import memo, metrics
+from .profiling import RenderProfile
+
+
+def user_cache_key(user_id):
+    return f'ublog:user:{user_id}'
+
+
+def _user_cache():
+    alias = getattr(settings, 'UBLOG_USER_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def forget_cached_user(user_id):
+    """Drop a user's cached row; call after any write that skips post_save (queryset.update)."""
+    cache = _user_cache()
+    if cache is not None:
+        cache.delete(user_cache_key(user_id))
+
+
+def get_cached_user(request):
+    """
+    Same contract as django.contrib.auth.get_user(), but the user row is served
+    from the cache when the session's auth hash still matches it. Anything
+    unusual (missing hash, rotated secret, stale entry) takes Django's own path.
+    Without UBLOG_USER_CACHE it is Django's path every time.
+    """
+    cache = _user_cache()
+    if cache is None:
+        user = auth.get_user(request)
+        memo.remember(user)
+        return user
+
+    session = request.session
+    try:
+        user_id = session[SESSION_KEY]
+        backend_path = session[BACKEND_SESSION_KEY]
+        session_hash = session[HASH_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if (
+        user is not None
+        and user.is_active
+        and backend_path in settings.AUTHENTICATION_BACKENDS
+        and constant_time_compare(session_hash, user.get_session_auth_hash())
+    ):
+        metrics.incr('auth.user_cache_hit')
+        user.backend = backend_path
+        memo.remember(user)
+        return user
+
+    metrics.incr('auth.user_cache_miss')
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(key, user, getattr(settings, 'UBLOG_USER_CACHE_TIMEOUT', 300))
+        memo.remember(user)
+    return user
+
+
+class RequestMemoMiddleware:
+    """
+    Opens the request-scoped identity map / memo (main_app/memo.py) around
+    each request. With DEBUG or UBLOG_MEMO_DEBUG the response reports
+    per-kind hits/misses in an X-UBlog-Memo header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.debug = settings.DEBUG or getattr(settings, 'UBLOG_MEMO_DEBUG', False)
+
+    def __call__(self, request):
+        token = memo.activate()
+        try:
+            response = self.get_response(request)
+            if self.debug:
+                summary = memo.current().summary()
+                if summary:
+                    response['X-UBlog-Memo'] = summary
+            return response
+        finally:
+            memo.deactivate(token)
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware with a cached user loader (invalidated on user save/delete, see signals.py)."""
+
+    def process_request(self, request):
+        super().process_request(request)
+
+        def _get_user():
+            if not hasattr(request, '_cached_user'):
+                request._cached_user = get_cached_user(request)
+            return request._cached_user
+
+        request.user = SimpleLazyObject(_get_user)
+
+
+class StaticAssetMiddleware:
+    """
+    Serves ``collectstatic`` output from STATIC_ROOT without touching the URLconf.
+
+    The file list is read once at startup (restart after collectstatic). Each
+    request then costs a dict lookup and an open(). Hashed names from the
+    manifest are cached for a year as ``immutable``; other names are cached
+    briefly and revalidated by ETag. A pre-built .br/.gz sibling is sent when
+    the client accepts it (see main_app/assets.py).
+    """
+
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'UBLOG_SERVE_STATIC', False) or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.max_age = getattr(settings, 'UBLOG_STATIC_MAX_AGE', 31536000)
+        self.files = self._scan(os.fspath(settings.STATIC_ROOT))
+        self.immutable = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            response = self.serve(request, request.path_info[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    @staticmethod
+    def _scan(root):
+        files = {}
+        for dirpath, _dirs, names in os.walk(root):
+            for filename in names:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                stat = os.stat(path)
+                base, ext = os.path.splitext(name)
+                key, variant = (base, ext) if ext in ('.br', '.gz') else (name, '')
+                files.setdefault(key, {})[variant] = (path, stat.st_size, stat.st_mtime)
+        # Keep only real assets (a stray .gz with no original is not served)
+        return {name: variants for name, variants in files.items() if '' in variants}
+
+    def serve(self, request, name):
+        variants = self.files.get(name)
+        if variants is None:
+            return None
+        accepted = {
+            token.split(';')[0].strip()
+            for token in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+            if not token.replace(' ', '').endswith(';q=0')
+        }
+        encoding, suffix = next(
+            ((enc, ext) for enc, ext in self.ENCODINGS if ext in variants and enc in accepted),
+            (None, ''),
+        )
+        path, size, mtime = variants[suffix]
+        etag = f'"{size:x}-{int(mtime):x}{suffix}"'
+
+        if name in self.immutable:
+            cache_control = f'public, max-age={self.max_age}, immutable'
+        else:
+            cache_control = 'public, max-age=60'
+        headers = {'Cache-Control': cache_control, 'ETag': etag, 'Last-Modified': http_date(mtime)}
+        if len(variants) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            return HttpResponseNotModified(headers=headers)
+
+        content_type, _ = mimetypes.guess_type(name)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        if request.method == 'HEAD':
+            return HttpResponse(content_type=content_type, headers={**headers, 'Content-Length': str(size)})
+        response = FileResponse(open(path, 'rb'), content_type=content_type, headers=headers)
+        # FileResponse would name the .br/.gz file here
+        del response.headers['Content-Disposition']
+        return response
+
+
+class TemplateProfileMiddleware:
+    """
+    Per-request template profiling, for staff (or anyone under DEBUG), when
+    UBLOG_TEMPLATE_PROFILE is on. It adds:
+    ``?_profile=timing``  a Server-Timing header with the heaviest templates
+    ``?_profile=table``   replaces the page with the per-template table
+    ``?_profile=flame``   replaces the page with folded stacks for flamegraph.pl
+    See main_app/profiling.py.
+    """
+
+    MODES = ('timing', 'table', 'flame')
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'UBLOG_TEMPLATE_PROFILE', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.GET.get('_profile')
+        if mode not in self.MODES or not (settings.DEBUG or request.user.is_staff):
+            return self.get_response(request)
+
+        with RenderProfile() as profile:
+            response = self.get_response(request)
+            # TemplateResponses that reach here unrendered still count
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        if mode == 'table':
+            return HttpResponse(profile.table(), content_type='text/plain; charset=utf-8')
+        if mode == 'flame':
+            return HttpResponse(profile.collapsed(), content_type='text/plain; charset=utf-8')
+        response['Server-Timing'] = profile.server_timing()
+        return response
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:39
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_modified_date(apps, schema_editor):
+    # Existing rows start out "last modified" when they were published.
+    Post = apps.get_model('main_app', 'Post')
+    Post.objects.update(modified_date=F('published_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_alter_post_options_remove_post_downvote_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='modified_date',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(backfill_modified_date, migrations.RunPython.noop),
+    ]
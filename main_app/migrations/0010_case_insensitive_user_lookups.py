@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:42
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_case_duplicates(apps, schema_editor):
+    # Fail early with a readable list instead of a bare IntegrityError from the
+    # index build. Duplicates are accounts and must be merged by hand.
+    CustomUser = apps.get_model('main_app', 'CustomUser')
+    problems = []
+    for field in ('email', 'username'):
+        dupes = (
+            CustomUser.objects.annotate(key=Lower(field))
+            .values('key').annotate(n=Count('id')).filter(n__gt=1)
+            .values_list('key', flat=True)[:20]
+        )
+        problems += [f"{field}={key!r}" for key in dupes]
+    if problems:
+        raise RuntimeError(
+            "Resolve case-insensitive duplicate users before migrating: " + ", ".join(problems)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('main_app', '0009_post_modified_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_case_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='uniq_customuser_email_ci'),
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('username'), name='uniq_customuser_username_ci'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0012_moderation_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.SmallIntegerField(choices=[(1, 'Like'), (-1, 'Downvote')])),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='archived_score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['archived_at', '-published_date'], name='post_live_recent_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedvote',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_votes', to='main_app.post'),
+        ),
+        migrations.AddField(
+            model_name='archivedvote',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedvote',
+            unique_together={('post', 'user')},
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:58
+
+from django.db import migrations, models
+
+from main_app import markup
+
+
+def render_existing(apps, schema_editor):
+    # Same as Post.render_content / Comment.render_content, for the historical models,
+    # so no page ever has to fall back to rendering raw content
+    for name in ('Post', 'Comment'):
+        model = apps.get_model('main_app', name)
+        fields = ['content_html', 'render_version']
+        if name == 'Post':
+            fields += ['excerpt', 'excerpt_truncated']
+        rows = model.objects.order_by('pk').only('pk', 'content')
+        last = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last)[:500])
+            if not batch:
+                break
+            for row in batch:
+                row.content_html = markup.render(row.content)
+                row.render_version = markup.RENDERER_VERSION
+                if name == 'Post':
+                    row.excerpt, row.excerpt_truncated = markup.excerpt(
+                        row.content_html, min(markup.excerpt_length(), 500)
+                    )
+            model.objects.bulk_update(batch, fields)
+            last = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0013_post_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='render_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='excerpt_truncated',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='render_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(render_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:25
+
+from collections import defaultdict
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_thread_counters(apps, schema_editor):
+    # Same result as main_app.threads.rebuild(), frozen here for the historical model.
+    # A reply always has a larger id than its parent, so walking ids downwards
+    # finishes every comment's subtree before the comment itself.
+    Comment = apps.get_model('main_app', 'Comment')
+    Comment.objects.update(score=F('like_count') - F('downvote_count'), last_activity_at=F('published_date'))
+    post_ids = list(Comment.objects.order_by('post_id').values_list('post_id', flat=True).distinct())
+    for i in range(0, len(post_ids), 200):
+        rows = Comment.objects.filter(post_id__in=post_ids[i:i + 200]).order_by('-id').values_list(
+            'id', 'parent_id', 'published_date',
+        )
+        replies, descendants, last = defaultdict(int), defaultdict(int), {}
+        parents = {}
+        for pk, parent_id, published_date in rows:
+            last[pk] = max(last.get(pk, published_date), published_date)
+            parents[pk] = parent_id
+            if parent_id is not None:
+                replies[parent_id] += 1
+                descendants[parent_id] += descendants[pk] + 1
+                last[parent_id] = max(last.get(parent_id, last[pk]), last[pk])
+        updates = [
+            Comment(pk=pk, reply_count=replies[pk], descendant_count=descendants[pk], last_activity_at=last[pk])
+            for pk in parents if replies[pk]
+        ]
+        Comment.objects.bulk_update(updates, ['reply_count', 'descendant_count', 'last_activity_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0016_activity_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='descendant_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='score',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'parent', '-score'], name='comment_top_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'parent', '-published_date'], name='comment_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'parent', '-last_activity_at'], name='comment_active_idx'),
+        ),
+        migrations.RunPython(backfill_thread_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0017_comment_thread_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='tag_names',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-post_count', 'name'], name='tag_facet_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('published_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main_app.post')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main_app.tag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', '-published_date', '-post'], name='posttag_page_idx')],
+                'unique_together': {('post', 'tag')},
+            },
+        ),
+    ]
@@ -1,9 +1,16 @@
 # path: main_app/models.py
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 from django.urls import reverse
 
+from . import markup
+
+# Enables `field__lower=value`, which compiles to LOWER(col) = value and can
+# use the functional unique indexes on CustomUser (unlike __iexact / UPPER()).
+models.CharField.register_lookup(Lower)
+
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -20,6 +27,18 @@ class CustomUserManager(BaseUserManager):
         extra_fields.setdefault('is_superuser', True)
         return self.create_user(email, password, **extra_fields)
 
+    def get_by_identifier(self, identifier):
+        """
+        Case-insensitive lookup by email (if it contains '@') or username,
+        served by an index seek on LOWER(email) / LOWER(username). Returns None on a miss.
+        """
+        identifier = (identifier or '').strip().lower()
+        if not identifier:
+            return None
+        if '@' in identifier:
+            return self.filter(email__lower=identifier).first()
+        return self.filter(username__lower=identifier).first()
+
 
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     username = models.CharField(max_length=150, unique=True)
@@ -29,12 +48,22 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     date_joined = models.DateTimeField(default=timezone.now)
+    # Maintained by main_app/timeline.py. Once an author reaches
+    # UBLOG_FANOUT_THRESHOLD followers they switch (for good) to fan-out-on-read.
+    follower_count = models.PositiveIntegerField(default=0)
+    is_high_fanout = models.BooleanField(default=False)
 
     objects = CustomUserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower('email'), name='uniq_customuser_email_ci'),
+            models.UniqueConstraint(Lower('username'), name='uniq_customuser_username_ci'),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -53,34 +82,92 @@ class Profile(models.Model):
         return f'Profile of {self.user.get_full_name()}'
 
 
+class PostQuerySet(models.QuerySet):
+    def live(self):
+        """Posts still in the hot set (see main_app/archive.py)"""
+        return self.filter(archived_at__isnull=True)
+
+
 class Post(models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField(blank=True)
     author = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='posts')
-    published_date = models.DateTimeField(auto_now_add=True)
+    published_date = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Bumped on edits and on any vote/comment activity (see Post.touch);
+    # drives the ETag/Last-Modified validators for detail, list and feed views.
+    modified_date = models.DateTimeField(auto_now=True, db_index=True)
+    # Set when archived: the post is read-only, its votes live in ArchivedVote
+    # and the score is frozen in archived_score. Nullable rather than a boolean
+    # so the live filter is `archived_at IS NULL`, an index seek (NOT col is not).
+    archived_at = models.DateTimeField(null=True, blank=True)
+    archived_score = models.IntegerField(default=0)
+    # Rendered once per write by save(); see main_app/markup.py
+    content_html = models.TextField(blank=True, editable=False)
+    excerpt = models.CharField(max_length=500, blank=True, editable=False)
+    excerpt_truncated = models.BooleanField(default=False, editable=False)
+    render_version = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Space-separated tag names, so cards show topics without a join; PostTag is the index (main_app/tags.py)
+    tag_names = models.CharField(max_length=255, blank=True, default='', editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-published_date']
+        indexes = [
+            # Hot feeds/search read only the live range; the archiver scans the old end
+            models.Index(fields=['archived_at', '-published_date'], name='post_live_recent_idx'),
+            # Per-author range scans (author feeds, timeline fan-out-on-read)
+            models.Index(fields=['author', '-published_date'], name='post_author_recent_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    RENDERED_FIELDS = ('content_html', 'excerpt', 'excerpt_truncated', 'render_version')
+
+    def render_content(self):
+        self.content_html = markup.render(self.content)
+        self.excerpt, self.excerpt_truncated = markup.excerpt(
+            self.content_html, min(markup.excerpt_length(), self._meta.get_field('excerpt').max_length)
+        )
+        self.render_version = markup.RENDERER_VERSION
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.render_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.RENDERED_FIELDS}
+        super().save(*args, **kwargs)
+
     @property
     def score(self):
         """Calculate score as upvotes minus downvotes"""
+        if self.archived:
+            return self.archived_score
         # Use count() to avoid loading all objects into memory
         likes_count = self.like_set.count()
         downvotes_count = self.downvote_set.count()
         return likes_count - downvotes_count
 
+    @property
+    def archived(self):
+        return self.archived_at is not None
+
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('postdetailview', kwargs={'pk': self.pk})
 
+    @classmethod
+    def touch(cls, *pks):
+        """Bump modified_date without a full save (votes or comments changed)"""
+        cls.objects.filter(pk__in=pks).update(modified_date=timezone.now())
+
 
 class Like(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         unique_together = ('user', 'post')
@@ -97,6 +184,7 @@ class Like(models.Model):
 class Downvote(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         unique_together = ('user', 'post')
@@ -110,39 +198,87 @@ class Downvote(models.Model):
     # Removed save() and delete() methods - we calculate score dynamically
 
 
+class ArchivedVote(models.Model):
+    """Likes (+1) and downvotes (-1) of archived posts, moved out of the hot vote tables."""
+    UP = 1
+    DOWN = -1
+    VALUE_CHOICES = [(UP, 'Like'), (DOWN, 'Downvote')]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='archived_votes')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    value = models.SmallIntegerField(choices=VALUE_CHOICES)
+    # Carried over from the Like / Downvote row, so rollups can be rebuilt
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('post', 'user')
+
+    def __str__(self):
+        return f"{self.user_id} {'liked' if self.value == self.UP else 'downvoted'} archived post {self.post_id}"
+
+
 class Comment(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, related_name="comments", on_delete=models.CASCADE)
     parent = models.ForeignKey('self', null=True, blank=True, related_name='children', on_delete=models.CASCADE)
     like_count = models.IntegerField(default=0, blank=True)
     downvote_count = models.IntegerField(default=0, blank=True)
+    # like_count - downvote_count, stored so "top" threads sort on an index
+    score = models.IntegerField(default=0, editable=False)
+    # Thread counters, maintained by main_app/threads.py
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+    descendant_count = models.PositiveIntegerField(default=0, editable=False)
+    last_activity_at = models.DateTimeField(default=timezone.now, editable=False)
     content = models.CharField(max_length=2000)
-    published_date = models.DateTimeField(default=timezone.now, blank=True)
+    content_html = models.TextField(blank=True, editable=False)
+    render_version = models.PositiveSmallIntegerField(default=0, editable=False)
+    published_date = models.DateTimeField(default=timezone.now, blank=True, db_index=True)
     modified_date = models.DateTimeField(default=timezone.now, blank=True)
 
+    RENDERED_FIELDS = ('content_html', 'render_version')
+
+    class Meta:
+        # One per sort mode in main_app/threads.py (siblings share post and parent)
+        indexes = [
+            models.Index(fields=['post', 'parent', '-score'], name='comment_top_idx'),
+            models.Index(fields=['post', 'parent', '-published_date'], name='comment_new_idx'),
+            models.Index(fields=['post', 'parent', '-last_activity_at'], name='comment_active_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} commented on {self.post.title}: {self.content[:40]}"
 
+    def render_content(self):
+        self.content_html = markup.render(self.content)
+        self.render_version = markup.RENDERER_VERSION
+
     def save(self, *args, **kwargs):
         self.modified_date = timezone.now()
+        if self._state.adding:
+            # No replies yet: the thread was last active when it was posted
+            self.last_activity_at = self.published_date
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.render_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.RENDERED_FIELDS}
         super().save(*args, **kwargs)
 
     def update_like_count(self):
         self.like_count = CommentLike.objects.filter(comment=self).count()
-        self.save(update_fields=['like_count'])
+        self.score = self.like_count - self.downvote_count
+        self.save(update_fields=['like_count', 'score'])
 
     def update_downvote_count(self):
         self.downvote_count = CommentDownvote.objects.filter(comment=self).count()
-        self.save(update_fields=['downvote_count'])
-
-    @property
-    def score(self) -> int:
-        return int(self.like_count) - int(self.downvote_count)
+        self.score = self.like_count - self.downvote_count
+        self.save(update_fields=['downvote_count', 'score'])
 
 
 class CommentLike(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         unique_together = ('user', 'comment')
@@ -151,7 +287,7 @@ class CommentLike(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.user.username} liked comment {self.comment.id}"
+        return f"{self.user.username} liked comment {self.comment_id}"
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
@@ -165,6 +301,7 @@ class CommentLike(models.Model):
 class CommentDownvote(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         unique_together = ('user', 'comment')
@@ -173,7 +310,7 @@ class CommentDownvote(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.user.username} downvoted comment {self.comment.id}"
+        return f"{self.user.username} downvoted comment {self.comment_id}"
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
@@ -181,4 +318,262 @@ class CommentDownvote(models.Model):
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
-        self.comment.update_downvote_count()
\ No newline at end of file
+        self.comment.update_downvote_count()
+
+class Notification(models.Model):
+    """
+    One row per (recipient, verb, post, comment) while unread; further events of
+    the same kind bump actor_count instead of inserting ("12 people liked your post").
+    """
+    REPLY = 'reply'
+    LIKE = 'like'
+    VERB_CHOICES = [
+        (REPLY, 'replied to your comment'),
+        (LIKE, 'liked your post'),
+    ]
+
+    recipient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notifications')
+    actor = models.ForeignKey(CustomUser, null=True, on_delete=models.SET_NULL, related_name='+')
+    verb = models.CharField(max_length=16, choices=VERB_CHOICES)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    comment = models.ForeignKey(Comment, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    actor_count = models.PositiveIntegerField(default=1)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Aggregation lookup for the dispatcher
+            models.Index(fields=['recipient', 'is_read', 'verb', 'post', 'comment']),
+            # Inbox listing
+            models.Index(fields=['recipient', '-updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient_id}: {self.actor_count}x {self.verb} on post {self.post_id}"
+
+    @property
+    def summary(self):
+        """'alice and 11 others liked your post' (expects actor selected)"""
+        who = self.actor.username if self.actor_id else 'Someone'
+        if self.actor_count > 1:
+            others = self.actor_count - 1
+            who = f"{who} and {others} other{'s' if others > 1 else ''}"
+        return f"{who} {self.get_verb_display()}"
+
+
+class NotificationInbox(models.Model):
+    """Per-user unread counter (a single PK lookup) and digest watermark."""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='inbox')
+    unread_count = models.PositiveIntegerField(default=0)
+    digest_sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Inbox of {self.user_id}: {self.unread_count} unread"
+
+
+class ModerationJob(models.Model):
+    """A background purge of a user's or a post's content (see main_app/moderation.py)."""
+    PURGE_USER = 'purge_user'
+    PURGE_POST = 'purge_post'
+    KIND_CHOICES = [
+        (PURGE_USER, 'Purge user and all their content'),
+        (PURGE_POST, 'Purge post'),
+    ]
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    # Plain id + label rather than FKs: the target is gone once the job finishes
+    target_id = models.PositiveBigIntegerField()
+    target_label = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    stage = models.CharField(max_length=64, blank=True)
+    deleted = models.JSONField(default=dict, blank=True)
+    rows_deleted = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.target_id} ({self.status})"
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='following')
+    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('follower', 'author')
+        indexes = [
+            # Fan-out reads an author's followers in id order
+            models.Index(fields=['author', 'follower']),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} follows {self.author_id}"
+
+
+class TimelineEntry(models.Model):
+    """
+    One row per (reader, post) in a home timeline, written at post time
+    (fan-out-on-write). Only ids and the sort key; cards are fetched in one batch.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    published_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            # Keyset pages: WHERE user = ? AND (published_date, post) < (?, ?) ORDER BY ... DESC
+            models.Index(fields=['user', '-published_date', '-post'], name='timeline_page_idx'),
+        ]
+
+    def __str__(self):
+        return f"timeline {self.user_id}: post {self.post_id}"
+
+
+# -------------------------------------------------------------------
+# Activity rollups (main_app/rollups.py)
+# -------------------------------------------------------------------
+# Unconstrained FKs with DO_NOTHING: the rollup job rewrites summary rows in bulk,
+# and rows left behind by purged posts/users just drop out of joins.
+class PostStatsHourly(models.Model):
+    """Votes and comments on one post during one hour."""
+    post = models.ForeignKey(Post, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    hour = models.DateTimeField()
+    likes = models.PositiveIntegerField(default=0)
+    downvotes = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    comment_votes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'hour')
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f"post {self.post_id} @ {self.hour:%Y-%m-%d %H:00}"
+
+
+class PostStatsDaily(models.Model):
+    """PostStatsHourly summed per day."""
+    post = models.ForeignKey(Post, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    day = models.DateField()
+    likes = models.PositiveIntegerField(default=0)
+    downvotes = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    comment_votes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'day')
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"post {self.post_id} @ {self.day}"
+
+
+class UserStatsHourly(models.Model):
+    """Posts, comments and votes (post and comment) made by one user during one hour."""
+    user = models.ForeignKey(CustomUser, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    hour = models.DateTimeField()
+    posts = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    votes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'hour')
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f"user {self.user_id} @ {self.hour:%Y-%m-%d %H:00}"
+
+
+class UserStatsDaily(models.Model):
+    """UserStatsHourly summed per day."""
+    user = models.ForeignKey(CustomUser, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    day = models.DateField()
+    posts = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    votes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'day')
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"user {self.user_id} @ {self.day}"
+
+
+class RollupWatermark(models.Model):
+    """How far the rollups have processed the raw tables (by event time)."""
+    name = models.CharField(max_length=32, unique=True)
+    processed_until = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.processed_until:%Y-%m-%d %H:%M}"
+
+
+class Tag(models.Model):
+    """A topic. ``post_count`` counts live posts carrying it, kept up to date on write (main_app/tags.py)."""
+    name = models.CharField(max_length=50, unique=True)
+    post_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Facet list: ORDER BY post_count DESC, name LIMIT n reads the head of this index
+            models.Index(fields=['-post_count', 'name'], name='tag_facet_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class PostTag(models.Model):
+    """
+    Post <-> tag join, for live posts only. published_date is copied from the
+    post so a tag page is one range scan, however many posts the tag has.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='+')
+    published_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('post', 'tag')
+        indexes = [
+            # Keyset pages: WHERE tag = ? AND (published_date, post) < (?, ?) ORDER BY ... DESC
+            models.Index(fields=['tag', '-published_date', '-post'], name='posttag_page_idx'),
+        ]
+
+    def __str__(self):
+        return f"post {self.post_id}: tag {self.tag_id}"
@@ -0,0 +1,335 @@
+# path: main_app/moderation.py
+"""
+Batched removal of a spam account's or a single post's content.
+
+Model.delete() runs Django's deletion collector, which loads every cascaded
+row into memory before it issues any DELETE: a spammer's posts, whole comment
+threads under their comments, and every vote on all of those. It also leaves
+like_count / downvote_count stale on surviving comments the spammer voted on,
+and reply counts stale on surviving comments the spammer replied to.
+
+The purge here walks the same graph in keyset-paged batches of ids. Each
+table's rows go out as plain ``DELETE ... WHERE id IN (...)`` statements,
+children first, so FK checks pass without cascades. Counters touched by a
+batch are repaired before the next batch starts. Every batch is its own short
+transaction, so locks are held briefly. A job that dies part-way can be re-run
+and will pick up whatever is left.
+
+Jobs are ModerationJob rows (status, stage, per-table counts). They run on a
+background thread when UBLOG_MODERATION_ASYNC is set, and always via
+``manage.py run_moderation_jobs``.
+"""
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (
+    CustomUser,
+    Post,
+    Comment,
+    Like,
+    Downvote,
+    CommentLike,
+    CommentDownvote,
+    Notification,
+    ModerationJob,
+    ArchivedVote,
+    Follow,
+    TimelineEntry,
+)
+from . import tags
+from .bulk import delete_rows
+from .archive import refresh_archived_scores
+from .notifications import recount_unread
+from .transfer import rebuild_comment_counters
+from .threads import rebuild as rebuild_threads
+
+logger = logging.getLogger(__name__)
+
+
+def _id_batches(qs, size, field='pk'):
+    """Keyset-page the values of ``field`` (rows may be deleted between pages)."""
+    qs = qs.order_by(field).values_list(field, flat=True)
+    last = None
+    while True:
+        page = qs if last is None else qs.filter(**{f'{field}__gt': last})
+        ids = list(page[:size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def _chunks(ids, size):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+# -------------------------------------------------------------------
+# Purge
+# -------------------------------------------------------------------
+class Purge:
+    """
+    One purge run. ``on_progress(stage, deleted)`` is called after every
+    batch with the running per-model count of deleted rows.
+    """
+
+    def __init__(self, batch_size=None, on_progress=None):
+        self.batch_size = batch_size or getattr(settings, 'UBLOG_MODERATION_BATCH_SIZE', 500)
+        self.on_progress = on_progress
+        self.deleted = Counter()
+        self.stage = ''
+
+    def _delete(self, qs):
+        # A single DELETE with no collector (main_app/bulk.py)
+        n = delete_rows(qs)
+        if n:
+            self.deleted[qs.model._meta.model_name] += n
+        return n
+
+    def _report(self):
+        if self.on_progress:
+            self.on_progress(self.stage, dict(self.deleted))
+
+    @staticmethod
+    def _touch_posts(post_ids):
+        if post_ids:
+            Post.objects.filter(pk__in=post_ids).update(modified_date=timezone.now())
+
+    def _delete_notifications(self, qs):
+        """Delete notifications and fix the unread counters of the users who lose unread ones."""
+        recipients = set(qs.filter(is_read=False).values_list('recipient_id', flat=True).distinct())
+        self._delete(qs)
+        if recipients:
+            recount_unread(recipients)
+
+    # Votes cast by a user ------------------------------------------------
+    def remove_comment_votes(self, user_id):
+        for model in (CommentLike, CommentDownvote):
+            self.stage = f'{model._meta.model_name} by user'
+            for ids in _id_batches(model.objects.filter(user_id=user_id), self.batch_size):
+                with transaction.atomic():
+                    comment_ids = set(model.objects.filter(pk__in=ids).values_list('comment_id', flat=True))
+                    self._delete(model.objects.filter(pk__in=ids))
+                    affected = Comment.objects.filter(pk__in=comment_ids)
+                    rebuild_comment_counters(affected)
+                    self._touch_posts(set(affected.values_list('post_id', flat=True)))
+                self._report()
+
+    def remove_post_votes(self, user_id):
+        for model in (Like, Downvote):
+            self.stage = f'{model._meta.model_name} by user'
+            for ids in _id_batches(model.objects.filter(user_id=user_id), self.batch_size):
+                with transaction.atomic():
+                    post_ids = set(model.objects.filter(pk__in=ids).values_list('post_id', flat=True))
+                    self._delete(model.objects.filter(pk__in=ids))
+                    self._touch_posts(post_ids)
+                self._report()
+        self.stage = 'archivedvote by user'
+        for ids in _id_batches(ArchivedVote.objects.filter(user_id=user_id), self.batch_size):
+            with transaction.atomic():
+                post_ids = set(ArchivedVote.objects.filter(pk__in=ids).values_list('post_id', flat=True))
+                self._delete(ArchivedVote.objects.filter(pk__in=ids))
+                refresh_archived_scores(post_ids)
+                self._touch_posts(post_ids)
+            self._report()
+
+    # Comment threads ----------------------------------------------------
+    def remove_comment_trees(self, roots_qs):
+        """Delete the comments in ``roots_qs`` together with every reply below them."""
+        self.stage = 'comments'
+        for root_ids in _id_batches(roots_qs, self.batch_size):
+            levels = [root_ids]
+            while levels[-1]:
+                levels.append([
+                    pk for chunk in _chunks(levels[-1], self.batch_size)
+                    for pk in Comment.objects.filter(parent_id__in=chunk).values_list('pk', flat=True)
+                ])
+            # Deepest level first; an id listed on several levels goes at its deepest one
+            done = set()
+            post_ids = set()
+            for level in reversed(levels):
+                level = [pk for pk in level if pk not in done]
+                done.update(level)
+                for chunk in _chunks(level, self.batch_size):
+                    post_ids |= self._delete_comments(chunk)
+            # Surviving ancestors of the removed replies lose them from their counts
+            with transaction.atomic():
+                rebuild_threads(post_ids)
+            self._report()
+
+    def _delete_comments(self, ids):
+        with transaction.atomic():
+            post_ids = set(Comment.objects.filter(pk__in=ids).values_list('post_id', flat=True))
+            self._delete_notifications(Notification.objects.filter(comment_id__in=ids))
+            self._delete(CommentLike.objects.filter(comment_id__in=ids))
+            self._delete(CommentDownvote.objects.filter(comment_id__in=ids))
+            self._delete(Comment.objects.filter(pk__in=ids))
+            self._touch_posts(post_ids)
+        return post_ids
+
+    # Posts --------------------------------------------------------------
+    def remove_posts(self, posts_qs):
+        for post_ids in _id_batches(posts_qs, self.batch_size):
+            self.remove_comment_trees(Comment.objects.filter(post_id__in=post_ids))
+            self.stage = 'posts'
+            for model in (Like, Downvote, ArchivedVote, TimelineEntry):
+                for ids in _id_batches(model.objects.filter(post_id__in=post_ids), self.batch_size):
+                    self._delete(model.objects.filter(pk__in=ids))
+            with transaction.atomic():
+                self._delete_notifications(Notification.objects.filter(post_id__in=post_ids))
+                tags.posts_removed(post_ids)
+                self._delete(Post.objects.filter(pk__in=post_ids))
+            self._report()
+
+    # Entry points -------------------------------------------------------
+    def purge_post(self, post_id):
+        self.remove_posts(Post.objects.filter(pk=post_id))
+        self.stage = 'done'
+        self._report()
+        return dict(self.deleted)
+
+    def purge_user(self, user_id):
+        user = CustomUser.objects.filter(pk=user_id).first()
+        if user is None:
+            return dict(self.deleted)
+        if user.is_active:
+            # Locks the account out (and drops its cached auth row) while the purge runs
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+
+        self.remove_comment_votes(user_id)
+        self.remove_post_votes(user_id)
+        self.remove_comment_trees(Comment.objects.filter(user_id=user_id))
+        self.remove_posts(Post.objects.filter(author_id=user_id))
+
+        self.stage = 'follows'
+        for ids in _id_batches(Follow.objects.filter(follower_id=user_id), self.batch_size):
+            with transaction.atomic():
+                authors = list(Follow.objects.filter(pk__in=ids).values_list('author_id', flat=True))
+                self._delete(Follow.objects.filter(pk__in=ids))
+                CustomUser.objects.filter(pk__in=authors, follower_count__gt=0).update(
+                    follower_count=F('follower_count') - 1
+                )
+        for model, field in ((Follow, 'author_id'), (TimelineEntry, 'user_id')):
+            for ids in _id_batches(model.objects.filter(**{field: user_id}), self.batch_size):
+                self._delete(model.objects.filter(pk__in=ids))
+        self._report()
+
+        self.stage = 'notifications'
+        for ids in _id_batches(Notification.objects.filter(actor_id=user_id), self.batch_size):
+            Notification.objects.filter(pk__in=ids).update(actor=None)
+        for ids in _id_batches(Notification.objects.filter(recipient_id=user_id), self.batch_size):
+            self._delete(Notification.objects.filter(pk__in=ids))
+        self._report()
+
+        # Only small rows are left (profile, inbox, group links); the collector can handle them
+        self.stage = 'user'
+        user.delete()
+        self.deleted['customuser'] += 1
+        self.stage = 'done'
+        self._report()
+        return dict(self.deleted)
+
+
+# -------------------------------------------------------------------
+# Jobs
+# -------------------------------------------------------------------
+def enqueue(kind, target, requested_by=None):
+    """Record a purge job for ``target`` (a CustomUser or Post) and start it once committed."""
+    job = ModerationJob.objects.create(
+        kind=kind, target_id=target.pk, target_label=str(target)[:255], requested_by=requested_by,
+    )
+    transaction.on_commit(wake_worker)
+    return job
+
+
+def wake_worker():
+    """Start the in-process worker (no-op when jobs are left to run_moderation_jobs)."""
+    if getattr(settings, 'UBLOG_MODERATION_ASYNC', True):
+        _worker.wake()
+
+
+def run_job(job, on_progress=None):
+    """
+    Claim and run one queued job. Returns False if another worker claimed it first.
+    ``on_progress`` is called with the job after each batch.
+    """
+    claimed = ModerationJob.objects.filter(pk=job.pk, status=ModerationJob.QUEUED).update(
+        status=ModerationJob.RUNNING, started_at=timezone.now(), error='',
+    )
+    if not claimed:
+        return False
+    job.refresh_from_db()
+
+    def _progress(stage, deleted):
+        job.stage, job.deleted, job.rows_deleted = stage, deleted, sum(deleted.values())
+        job.save(update_fields=['stage', 'deleted', 'rows_deleted'])
+        if on_progress:
+            on_progress(job)
+
+    purge = Purge(on_progress=_progress)
+    try:
+        if job.kind == ModerationJob.PURGE_USER:
+            purge.purge_user(job.target_id)
+        else:
+            purge.purge_post(job.target_id)
+    except Exception as exc:
+        logger.exception("Moderation job %s failed", job.pk)
+        job.status, job.error = ModerationJob.FAILED, repr(exc)
+    else:
+        job.status = ModerationJob.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return True
+
+
+def run_queued(on_progress=None):
+    """Run queued jobs oldest first until none are left; returns how many ran."""
+    ran = 0
+    while True:
+        job = ModerationJob.objects.filter(status=ModerationJob.QUEUED).order_by('created_at').first()
+        if job is None:
+            return ran
+        if run_job(job, on_progress):
+            ran += 1
+
+
+class Worker:
+    """Single background thread that drains the job queue, then exits until woken again."""
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+        self._again = False
+
+    def wake(self):
+        with self._lock:
+            if self._thread is not None:
+                self._again = True
+                return
+            self._thread = threading.Thread(target=self._run, name='ublog-moderation', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                close_old_connections()
+                run_queued()
+            except Exception:
+                logger.exception("Moderation worker crashed")
+            finally:
+                close_old_connections()
+            with self._lock:
+                if not self._again:
+                    self._thread = None
+                    return
+                self._again = False
+
+
+_worker = Worker()
@@ -0,0 +1,193 @@
+# path: main_app/notifications.py
+"""
+Reply / like notifications, fanned out off the request path.
+
+Views call notify() inside their transaction; once it commits the event is
+queued for a background thread that wakes every
+UBLOG_NOTIFICATION_FLUSH_INTERVAL seconds, collapses the batch by
+(recipient, verb, post, comment) and applies it with one UPDATE per group
+plus a single bulk INSERT for groups with no unread row yet. A popular
+author receiving thousands of likes per hour therefore costs a handful of
+writes per flush, not one per like.
+
+Queued events live in memory: a crashed worker loses at most one interval.
+Set UBLOG_NOTIFICATIONS_ASYNC = False to apply events synchronously on commit.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import memo
+from .models import Comment, CustomUser, Notification, NotificationInbox, Post
+
+logger = logging.getLogger(__name__)
+
+Event = namedtuple('Event', 'recipient_id verb actor_id post_id comment_id at')
+
+
+def notify(recipient_id, verb, actor_id, post_id, comment_id=None):
+    if recipient_id == actor_id:
+        return
+    event = Event(recipient_id, verb, actor_id, post_id, comment_id, timezone.now())
+    if getattr(settings, 'UBLOG_NOTIFICATIONS_ASYNC', True):
+        transaction.on_commit(lambda: _dispatcher.enqueue(event))
+    else:
+        transaction.on_commit(lambda: apply_events([event]))
+
+
+# -------------------------------------------------------------------
+# Aggregated writes
+# -------------------------------------------------------------------
+def apply_events(events):
+    """Fold a batch of events into Notification rows and inbox counters."""
+    groups = {}
+    counts = Counter()
+    for ev in events:
+        key = (ev.recipient_id, ev.verb, ev.post_id, ev.comment_id)
+        counts[key] += 1
+        last = groups.get(key)
+        if last is None or ev.at >= last.at:
+            groups[key] = ev
+
+    groups = _drop_purged(groups)
+    with transaction.atomic():
+        new_rows = []
+        for key, ev in groups.items():
+            recipient_id, verb, post_id, comment_id = key
+            updated = Notification.objects.filter(
+                recipient_id=recipient_id, is_read=False, verb=verb, post_id=post_id, comment_id=comment_id,
+            ).update(actor_count=F('actor_count') + counts[key], actor_id=ev.actor_id, updated_at=ev.at)
+            if not updated:
+                new_rows.append(Notification(
+                    recipient_id=recipient_id, verb=verb, post_id=post_id, comment_id=comment_id,
+                    actor_id=ev.actor_id, actor_count=counts[key], created_at=ev.at, updated_at=ev.at,
+                ))
+        if not new_rows:
+            return
+        Notification.objects.bulk_create(new_rows)
+
+        # Unread counter tracks unread *rows*, so only new rows move it
+        per_user = Counter(row.recipient_id for row in new_rows)
+        missing = set(per_user)
+        for user_id, n in per_user.items():
+            if NotificationInbox.objects.filter(user_id=user_id).update(unread_count=F('unread_count') + n):
+                missing.discard(user_id)
+        NotificationInbox.objects.bulk_create(
+            [NotificationInbox(user_id=user_id, unread_count=per_user[user_id]) for user_id in missing],
+            ignore_conflicts=True,
+        )
+
+
+def _drop_purged(groups):
+    """
+    Skip events whose recipient, post or comment was deleted while they sat in
+    the queue (e.g. by a moderation purge), and forget deleted actors, so one
+    stale event cannot fail the whole batch on a foreign key.
+    """
+    events = groups.values()
+    users = set(CustomUser.objects.filter(
+        pk__in={ev.recipient_id for ev in events} | {ev.actor_id for ev in events if ev.actor_id}
+    ).values_list('pk', flat=True))
+    posts = set(Post.objects.filter(pk__in={ev.post_id for ev in events}).values_list('pk', flat=True))
+    comments = set(Comment.objects.filter(
+        pk__in={ev.comment_id for ev in events if ev.comment_id}
+    ).values_list('pk', flat=True))
+    return {
+        key: ev if ev.actor_id in users else ev._replace(actor_id=None)
+        for key, ev in groups.items()
+        if ev.recipient_id in users and ev.post_id in posts and (ev.comment_id is None or ev.comment_id in comments)
+    }
+
+
+def unread_count(user):
+    # Read by the page ETag and the nav badge: one query per request
+    return memo.memoize(('unread', user.pk), lambda: (
+        NotificationInbox.objects.filter(user_id=user.pk).values_list('unread_count', flat=True).first() or 0
+    ))
+
+
+def unread_recipients(post_ids):
+    """Users with unread notifications on these posts or their comments (recount them once those are deleted)."""
+    return set(
+        Notification.objects.filter(post_id__in=post_ids, is_read=False)
+        .values_list('recipient_id', flat=True).distinct()
+    )
+
+
+def recount_unread(user_ids):
+    """Recompute inbox counters from the Notification rows (after bulk deletes)."""
+    unread = (
+        Notification.objects.filter(recipient_id=OuterRef('user_id'), is_read=False)
+        .order_by().values('recipient_id').annotate(n=Count('id')).values('n')
+    )
+    NotificationInbox.objects.filter(user_id__in=user_ids).update(
+        unread_count=Coalesce(Subquery(unread), Value(0))
+    )
+
+
+def mark_all_read(user):
+    with transaction.atomic():
+        Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+        NotificationInbox.objects.filter(user_id=user.pk).update(unread_count=0)
+    memo.forget(('unread', user.pk))
+
+
+# -------------------------------------------------------------------
+# Background dispatcher
+# -------------------------------------------------------------------
+class Dispatcher:
+    max_batch = 5000
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, event):
+        self._queue.put(event)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='ublog-notify', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        batch = self._drain()
+        while batch:
+            apply_events(batch)
+            batch = self._drain()
+
+    def _run(self):
+        interval = getattr(settings, 'UBLOG_NOTIFICATION_FLUSH_INTERVAL', 1.0)
+        while True:
+            # Block until there is work, then let the batch build up for one interval
+            pending = [self._queue.get()]
+            time.sleep(interval)
+            try:
+                close_old_connections()
+                apply_events(pending + self._drain())
+                self.flush()
+            except Exception:
+                logger.exception("Notification flush failed; dropping batch")
+
+
+_dispatcher = Dispatcher()
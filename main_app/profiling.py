@@ -0,0 +1,140 @@
+# path: main_app/profiling.py
+"""
+Template render profiler.
+
+Times every Template._render call, including each {% include %}, each
+{% extends %} parent and each recursive comment_item.html. The time is
+booked against the chain of templates that led to it
+(postlist.html -> feed_base.html -> post_card.html), so a page's render time
+splits per partial:
+
+    with RenderProfile() as profile:
+        html = render_to_string('main_app/postlist.html', context)
+    print(profile.table())
+    open('render.folded', 'w').write(profile.collapsed())
+
+Block content runs inside the frame of the layout that defines the block. The
+``{% for %}``/``{% include %}`` overhead of postlist.html's cards therefore
+shows up as base.html self time.
+
+``collapsed()`` is the folded-stack format read by flamegraph.pl,
+speedscope and inferno. Profiles are per thread. The hook is installed on
+first use and costs one thread-local lookup per render when no profile is
+active.
+
+For live requests, see TemplateProfileMiddleware (main_app/middleware.py), and
+``manage.py bench_templates`` for per-card cost at 50/500/5000 posts.
+"""
+import threading
+import time
+
+from django.template.base import Template
+
+_state = threading.local()
+_install_lock = threading.Lock()
+_original_render = None
+
+
+def _template_name(template):
+    origin = getattr(template, 'origin', None)
+    return getattr(origin, 'template_name', None) or template.name or '<string>'
+
+
+def _profiled_render(self, context):
+    profile = getattr(_state, 'profile', None)
+    if profile is None:
+        return _original_render(self, context)
+    return profile._record(self, context)
+
+
+def _install():
+    global _original_render
+    with _install_lock:
+        if _original_render is None:
+            _original_render = Template._render
+            Template._render = _profiled_render
+
+
+class RenderProfile:
+    """Collects (template stack) -> calls / inclusive / self nanoseconds on this thread."""
+
+    def __init__(self):
+        self.stacks = {}
+        self._frames = []
+
+    def __enter__(self):
+        _install()
+        self._previous = getattr(_state, 'profile', None)
+        _state.profile = self
+        return self
+
+    def __exit__(self, *exc):
+        _state.profile = self._previous
+        return False
+
+    def _record(self, template, context):
+        frame = [_template_name(template), 0]
+        self._frames.append(frame)
+        start = time.perf_counter_ns()
+        try:
+            return _original_render(template, context)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self._frames.pop()
+            if self._frames:
+                self._frames[-1][1] += elapsed
+            key = tuple(name for name, _ in self._frames) + (frame[0],)
+            calls, total, own = self.stacks.get(key, (0, 0, 0))
+            self.stacks[key] = (calls + 1, total + elapsed, own + elapsed - frame[1])
+
+    # ---------------------------------------------------------------
+    # Reports
+    # ---------------------------------------------------------------
+    def by_template(self):
+        """{name: {'calls', 'total_ms', 'self_ms', 'self_us_per_call'}}, heaviest self time first."""
+        rows = {}
+        for stack, (calls, total, own) in self.stacks.items():
+            name = stack[-1]
+            row = rows.setdefault(name, {'calls': 0, 'total_ns': 0, 'self_ns': 0})
+            row['calls'] += calls
+            row['self_ns'] += own
+            # Recursive frames are already inside their outermost ancestor's total
+            if name not in stack[:-1]:
+                row['total_ns'] += total
+        report = {
+            name: {
+                'calls': row['calls'],
+                'total_ms': row['total_ns'] / 1e6,
+                'self_ms': row['self_ns'] / 1e6,
+                'self_us_per_call': row['self_ns'] / row['calls'] / 1e3,
+            }
+            for name, row in rows.items()
+        }
+        return dict(sorted(report.items(), key=lambda item: -item[1]['self_ms']))
+
+    def total_ms(self):
+        return sum(total for stack, (_calls, total, _own) in self.stacks.items() if len(stack) == 1) / 1e6
+
+    def table(self):
+        lines = [f"{'template':<48} {'calls':>7} {'total ms':>10} {'self ms':>10} {'self us/call':>13}"]
+        for name, row in self.by_template().items():
+            lines.append(
+                f"{name[-48:]:<48} {row['calls']:>7} {row['total_ms']:>10.2f} "
+                f"{row['self_ms']:>10.2f} {row['self_us_per_call']:>13.1f}"
+            )
+        lines.append(f"{'(all renders)':<48} {'':>7} {self.total_ms():>10.2f}")
+        return '\n'.join(lines)
+
+    def collapsed(self):
+        """Folded stacks, one 'a;b;c <self microseconds>' line per call path."""
+        return ''.join(
+            f"{';'.join(stack)} {max(own // 1000, 0)}\n"
+            for stack, (_calls, _total, own) in sorted(self.stacks.items())
+        )
+
+    def server_timing(self, limit=5):
+        """Server-Timing header value for the heaviest templates (shown in browser devtools)."""
+        parts = [f'tpl;dur={self.total_ms():.2f};desc="templates"']
+        for i, (name, row) in enumerate(list(self.by_template().items())[:limit]):
+            parts.append(f'tpl{i};dur={row["self_ms"]:.2f};desc="{name.rsplit("/", 1)[-1]} x{row["calls"]}"')
+        return ', '.join(parts)
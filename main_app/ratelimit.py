@@ -0,0 +1,182 @@
+# path: main_app/ratelimit.py
+"""
+Sliding-window rate limiting for auth and voting endpoints.
+
+Counters live in the Django cache named by UBLOG_RATELIMIT_CACHE so every
+worker shares them; if that cache errors out the limiter falls back to a
+per-process in-memory store instead of letting traffic through unchecked.
+
+Rates come from settings.UBLOG_RATELIMITS, keyed by scope and then by what
+the counter is keyed on::
+
+    UBLOG_RATELIMITS = {'login': {'ip': '30/5m', 'identifier': '5/5m'}}
+
+Supported keys: ``ip`` (REMOTE_ADDR), ``identifier`` (the POSTed email or
+username, case-folded) and ``user`` (authenticated user id). Rate periods
+are ``<n><s|m|h|d>``. Checks run before the view body, so rejected requests
+never reach password hashing, SMTP or the database.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.shortcuts import redirect
+
+logger = logging.getLogger(__name__)
+
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+
+
+def parse_rate(rate):
+    """'5/15m' -> (5, 900)"""
+    match = _RATE_RE.match(rate.strip())
+    if not match:
+        raise ValueError(f"Invalid rate {rate!r}; expected e.g. '5/m' or '10/15m'")
+    limit, mult, unit = match.groups()
+    return int(limit), int(mult or 1) * _PERIODS[unit]
+
+
+# -------------------------------------------------------------------
+# Counter stores
+# -------------------------------------------------------------------
+class LocalStore:
+    """Thread-safe in-process counters with expiry (fallback / single-process use)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is not None and item[1] <= now:
+            del self._data[key]
+            item = None
+        return item
+
+    def incr(self, key, timeout):
+        now = time.monotonic()
+        with self._lock:
+            item = self._live(key, now)
+            value = (item[0] if item else 0) + 1
+            self._data[key] = (value, item[1] if item else now + timeout)
+            if len(self._data) > 10000:
+                for k in [k for k, (_, exp) in self._data.items() if exp <= now]:
+                    del self._data[k]
+            return value
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.monotonic())
+            return item[0] if item else 0
+
+
+class CacheStore:
+    """Counters in a shared Django cache; add() + incr() keep updates atomic."""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def incr(self, key, timeout):
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.set(key, 1, timeout)
+            return 1
+
+    def get(self, key):
+        return self.cache.get(key) or 0
+
+
+_local_store = LocalStore()
+
+
+def _store():
+    alias = getattr(settings, 'UBLOG_RATELIMIT_CACHE', None)
+    return CacheStore(alias) if alias else _local_store
+
+
+# -------------------------------------------------------------------
+# Limiter
+# -------------------------------------------------------------------
+def _key_value(request, kind):
+    if kind == 'ip':
+        return request.META.get('REMOTE_ADDR') or 'unknown'
+    if kind == 'identifier':
+        return (request.POST.get('identifier') or request.POST.get('email') or '').strip().lower() or None
+    if kind == 'user':
+        return str(request.user.pk) if request.user.is_authenticated else None
+    raise ValueError(f"Unknown rate-limit key {kind!r}")
+
+
+def _hit(store, key, limit, period):
+    """
+    Sliding-window counter: the previous fixed window is weighted by how much
+    of it still overlaps the sliding window. Returns seconds to wait, or 0.
+    """
+    now = time.time()
+    window = int(now // period)
+    elapsed = (now % period) / period
+    current = store.incr(f'{key}:{window}', period * 2)
+    previous = store.get(f'{key}:{window - 1}')
+    if previous * (1 - elapsed) + current > limit:
+        return max(1, int(period * (1 - elapsed)))
+    return 0
+
+
+def check(request, scope):
+    """Count this request against every limit for ``scope``; return retry-after seconds (0 = allowed)."""
+    rates = getattr(settings, 'UBLOG_RATELIMITS', {}).get(scope, {})
+    if not rates or not getattr(settings, 'UBLOG_RATELIMIT_ENABLED', True):
+        return 0
+
+    store = _store()
+    wait = 0
+    for kind, rate in rates.items():
+        value = _key_value(request, kind)
+        if value is None:
+            continue
+        limit, period = parse_rate(rate)
+        digest = hashlib.sha1(value.encode()).hexdigest()
+        key = f'ublog:rl:{scope}:{kind}:{digest}'
+        try:
+            wait = max(wait, _hit(store, key, limit, period))
+        except Exception:
+            if store is _local_store:
+                raise
+            logger.warning("Rate-limit cache unavailable; using in-process counters", exc_info=True)
+            store = _local_store
+            wait = max(wait, _hit(store, key, limit, period))
+    return wait
+
+
+def ratelimit(scope, methods=('POST',), redirect_to=None):
+    """
+    View decorator. Over-limit requests get a 429 with Retry-After, or, when
+    ``redirect_to`` names a URL, a flash message and a redirect back to the form.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if request.method in methods:
+                wait = check(request, scope)
+                if wait:
+                    text = f"Too many attempts. Please try again in {wait} seconds."
+                    if redirect_to:
+                        messages.error(request, text)
+                        return redirect(redirect_to)
+                    response = HttpResponse(text, status=429, content_type='text/plain')
+                    response['Retry-After'] = str(wait)
+                    return response
+            return view_func(request, *args, **kwargs)
+        return _wrapped
+    return decorator
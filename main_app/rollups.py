@@ -0,0 +1,244 @@
+# path: main_app/rollups.py
+"""
+Hourly and daily activity summaries, built incrementally from the raw tables.
+
+Two rollups:
+- ``PostStatsHourly`` / ``PostStatsDaily``: likes, downvotes, comments and
+  comment votes per post
+- ``UserStatsHourly`` / ``UserStatsDaily``: posts, comments and votes per user
+
+``manage.py rollup_stats`` (run it from cron every few minutes up to hourly)
+reads only the rows whose timestamp is past the watermark in RollupWatermark.
+Each read is a range scan on the created_at / published_date indexes. The job
+does not add deltas. It recomputes every hour bucket it touches, then the days
+containing those hours, and replaces those summary rows in one transaction.
+Re-running is therefore idempotent, and a vote removed before its hour is
+rolled up is simply not counted. Each run starts UBLOG_ROLLUP_LAG_SECONDS
+before the watermark, so rows committed late with an earlier timestamp are
+still picked up.
+
+Counts are of rows present at rollup time: votes and comments as cast, not a
+running score. Dashboards read the daily tables through the helpers at the
+bottom of this module.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .bulk import delete_rows
+from .models import (
+    ArchivedVote,
+    Comment,
+    CommentDownvote,
+    CommentLike,
+    Downvote,
+    Like,
+    Post,
+    PostStatsDaily,
+    PostStatsHourly,
+    RollupWatermark,
+    UserStatsDaily,
+    UserStatsHourly,
+)
+
+WATERMARK = 'activity'
+
+
+class Rollup:
+    """One summary: hourly + daily models keyed by ``key``, fed by (model, time field, key path, counter, filters)."""
+
+    def __init__(self, hourly, daily, key, counters, sources):
+        self.hourly = hourly
+        self.daily = daily
+        self.key = key
+        self.counters = counters
+        self.sources = sources
+
+
+ROLLUPS = (
+    Rollup(
+        PostStatsHourly, PostStatsDaily, 'post_id', ('likes', 'downvotes', 'comments', 'comment_votes'),
+        [
+            (Like, 'created_at', 'post_id', 'likes', {}),
+            (Downvote, 'created_at', 'post_id', 'downvotes', {}),
+            # Rebuilding an old range must still see votes that archiving moved
+            (ArchivedVote, 'created_at', 'post_id', 'likes', {'value': ArchivedVote.UP}),
+            (ArchivedVote, 'created_at', 'post_id', 'downvotes', {'value': ArchivedVote.DOWN}),
+            (Comment, 'published_date', 'post_id', 'comments', {}),
+            (CommentLike, 'created_at', 'comment__post_id', 'comment_votes', {}),
+            (CommentDownvote, 'created_at', 'comment__post_id', 'comment_votes', {}),
+        ],
+    ),
+    Rollup(
+        UserStatsHourly, UserStatsDaily, 'user_id', ('posts', 'comments', 'votes'),
+        [
+            (Post, 'published_date', 'author_id', 'posts', {}),
+            (Comment, 'published_date', 'user_id', 'comments', {}),
+            (Like, 'created_at', 'user_id', 'votes', {}),
+            (Downvote, 'created_at', 'user_id', 'votes', {}),
+            (ArchivedVote, 'created_at', 'user_id', 'votes', {}),
+            (CommentLike, 'created_at', 'user_id', 'votes', {}),
+            (CommentDownvote, 'created_at', 'user_id', 'votes', {}),
+        ],
+    ),
+)
+
+
+def _floor_hour(at):
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(at):
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# -------------------------------------------------------------------
+# Build
+# -------------------------------------------------------------------
+def _hourly_rows(rollup, start, end):
+    totals = defaultdict(lambda: dict.fromkeys(rollup.counters, 0))
+    for model, time_field, key_path, counter, filters in rollup.sources:
+        buckets = (
+            model.objects.filter(**{f'{time_field}__gte': start, f'{time_field}__lt': end}, **filters)
+            .annotate(bucket=TruncHour(time_field), key=F(key_path))
+            .values('bucket', 'key').annotate(n=Count('pk')).order_by()
+        )
+        for row in buckets:
+            if row['key'] is not None:
+                totals[(row['key'], row['bucket'])][counter] += row['n']
+    return [
+        rollup.hourly(**{rollup.key: key, 'hour': hour}, **counts)
+        for (key, hour), counts in totals.items()
+    ]
+
+
+def _daily_rows(rollup, day_start, day_end):
+    days = (
+        rollup.hourly.objects.filter(hour__gte=day_start, hour__lt=day_end)
+        .annotate(day=TruncDate('hour'))
+        .values(rollup.key, 'day')
+        .annotate(**{f'sum_{c}': Sum(c) for c in rollup.counters})
+        .order_by()
+    )
+    return [
+        rollup.daily(**{rollup.key: row[rollup.key], 'day': row['day']},
+                     **{c: row[f'sum_{c}'] for c in rollup.counters})
+        for row in days
+    ]
+
+
+def _replace(model, rows, **range_filter):
+    stale = model.objects.filter(**range_filter)
+    delete_rows(stale)
+    model.objects.bulk_create(rows, batch_size=1000)
+
+
+def rollup_window(start, end):
+    """Recompute every summary for [start, end); ``start`` must be on an hour boundary."""
+    day_start = _floor_day(start)
+    day_end = _floor_day(end) + timedelta(days=1)
+    written = 0
+    with transaction.atomic():
+        for rollup in ROLLUPS:
+            hourly = _hourly_rows(rollup, start, end)
+            _replace(rollup.hourly, hourly, hour__gte=start, hour__lt=end)
+            daily = _daily_rows(rollup, day_start, day_end)
+            _replace(rollup.daily, daily, day__gte=day_start.date(), day__lt=day_end.date())
+            written += len(hourly) + len(daily)
+    return written
+
+
+def _earliest_event():
+    firsts = [
+        model.objects.aggregate(first=Min(time_field))['first']
+        for rollup in ROLLUPS for model, time_field, _key, _counter, _filters in rollup.sources
+    ]
+    firsts = [at for at in firsts if at is not None]
+    return min(firsts) if firsts else None
+
+
+def run(since=None, now=None, on_window=None):
+    """
+    Roll up everything from the watermark (or ``since``) to now, one
+    UBLOG_ROLLUP_WINDOW_HOURS window per transaction. Returns summary rows written.
+    """
+    now = now or timezone.now()
+    lag = timedelta(seconds=getattr(settings, 'UBLOG_ROLLUP_LAG_SECONDS', 300))
+    window = timedelta(hours=getattr(settings, 'UBLOG_ROLLUP_WINDOW_HOURS', 24))
+
+    state = RollupWatermark.objects.filter(name=WATERMARK).first()
+    if since is None and state is not None:
+        since = state.processed_until - lag
+    else:
+        # First run or rebuild: don't walk empty windows before the first event
+        earliest = _earliest_event()
+        if earliest is None:
+            return 0
+        since = max(since, earliest) if since else earliest
+
+    start = _floor_hour(min(since, now))
+    written = 0
+    while start < now:
+        end = min(start + window, now)
+        written += rollup_window(start, end)
+        RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'processed_until': end})
+        if on_window:
+            on_window(start, end, written)
+        start = end
+    return written
+
+
+# -------------------------------------------------------------------
+# Reads (dashboards)
+# -------------------------------------------------------------------
+def _since_day(days):
+    return (timezone.now() - timedelta(days=days - 1)).date()
+
+
+def top_posts(days=7, limit=10):
+    """Posts with the most votes over the last ``days`` days (today included)."""
+    return list(
+        PostStatsDaily.objects.filter(day__gte=_since_day(days))
+        .values('post_id', 'post__title')
+        .annotate(total_likes=Sum('likes'), total_downvotes=Sum('downvotes'), total_comments=Sum('comments'))
+        .annotate(total_votes=F('total_likes') + F('total_downvotes'))
+        .order_by('-total_votes', '-total_comments')[:limit]
+    )
+
+
+def top_commenters(days=7, limit=10):
+    """Users with the most comments over the last ``days`` days."""
+    return list(
+        UserStatsDaily.objects.filter(day__gte=_since_day(days), comments__gt=0)
+        .values('user_id', 'user__username')
+        .annotate(total_comments=Sum('comments'), total_votes=Sum('votes'))
+        .order_by('-total_comments')[:limit]
+    )
+
+
+def post_hourly(post_id, hours=48):
+    """Per-hour activity for one post over the last ``hours`` hours."""
+    since = _floor_hour(timezone.now()) - timedelta(hours=hours - 1)
+    return list(
+        PostStatsHourly.objects.filter(post_id=post_id, hour__gte=since)
+        .order_by('hour').values('hour', 'likes', 'downvotes', 'comments', 'comment_votes')
+    )
+
+
+def site_daily(days=14):
+    """Site-wide posts / comments / votes per day."""
+    return list(
+        UserStatsDaily.objects.filter(day__gte=_since_day(days))
+        .values('day').annotate(total_posts=Sum('posts'), total_comments=Sum('comments'), total_votes=Sum('votes'))
+        .order_by('day')
+    )
+
+
+def watermark():
+    state = RollupWatermark.objects.filter(name=WATERMARK).first()
+    return state.processed_until if state else None
@@ -0,0 +1,29 @@
+# path: main_app/sessions.py
+"""
+Session engine used when UBLOG_SESSION_MODE = 'cached_db'.
+
+Django's cached_db store (reads from the cache, writes through to the
+django_session table) with counters for cache hits, table reads and writes.
+"""
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+from . import metrics
+
+
+class SessionStore(CachedDBStore):
+    def load(self):
+        metrics.incr('session.load')
+        return super().load()
+
+    def _get_session_from_db(self):
+        # Only reached on a cache miss
+        metrics.incr('session.db_read')
+        return super()._get_session_from_db()
+
+    def save(self, must_create=False):
+        metrics.incr('session.write')
+        super().save(must_create)
+
+    def delete(self, session_key=None):
+        metrics.incr('session.delete')
+        super().delete(session_key)
@@ -1,5 +1,6 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from .models import CustomUser, Profile
+from .middleware import forget_cached_user
 from django.dispatch import receiver
 
 # Make a profile whenever a user is created
@@ -9,6 +10,8 @@ def create_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 
+# Drop the cached auth user (see middleware.get_cached_user) whenever the row changes
 @receiver(post_save, sender=CustomUser)
-def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    forget_cached_user(instance.pk)
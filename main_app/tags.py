@@ -0,0 +1,195 @@
+# path: main_app/tags.py
+"""
+Tags (topics) on posts, with facet counts kept up to date on write.
+
+Storage:
+- ``Tag``: one row per name, with ``post_count``, the number of live posts
+  carrying it. The facet list ("python (1,204)") reads the head of the
+  (-post_count, name) index. No GROUP BY runs per request.
+- ``PostTag``: the join, one row per (live post, tag), with the post's
+  published_date copied in. A tag page is one keyset range scan of
+  (tag, -published_date, -post), so page 1 and page 5,000 of a tag with
+  hundreds of thousands of posts cost the same. The page's cards are then
+  fetched in one ``pk IN (...)`` query, as on the home timeline.
+- ``Post.tag_names``: the names, space-separated, so cards render their
+  chips without touching the join.
+
+Write path: ``set_tags`` diffs the post's rows against the form's names and
+moves the counts of only the tags added or removed, with single
+``post_count = post_count +/- 1`` UPDATEs. Posts leaving the live set (deleted,
+purged, archived) go through ``posts_removed``. Unarchiving goes through
+``posts_restored``, which rebuilds the rows from ``tag_names``. Archived posts
+keep their names but have no PostTag rows, and are not counted.
+
+``rebuild()`` recomputes every row and count from ``tag_names``: use it after
+imports, or from the Tag admin if counts ever drift.
+"""
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import memo
+from .bulk import delete_rows
+from .models import Post, PostTag, Tag
+from .timeline import encode_cursor
+
+TAG_RE = re.compile(r'^[a-z0-9][a-z0-9+#._-]{0,49}$')
+
+
+def max_tags():
+    return getattr(settings, 'UBLOG_MAX_TAGS_PER_POST', 5)
+
+
+def parse(text):
+    """'Python, #django web' -> ['python', 'django', 'web']; raises ValueError on a bad name or too many."""
+    names = []
+    for raw in re.split(r'[\s,]+', text or ''):
+        name = raw.lstrip('#').lower()
+        if not name:
+            continue
+        if not TAG_RE.match(name):
+            raise ValueError(f"{raw!r} is not a valid tag: use letters, digits and + # . _ - (50 characters at most).")
+        if name not in names:
+            names.append(name)
+    if len(names) > max_tags():
+        raise ValueError(f"A post can have at most {max_tags()} tags.")
+    return names
+
+
+def _tag_ids(names):
+    """{name: id}, creating the tags that do not exist yet."""
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    return dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+
+
+def _adjust(per_tag, sign):
+    """Move post_count by ``sign`` * n for each {tag_id: n}: one UPDATE per distinct n."""
+    by_amount = defaultdict(list)
+    for tag_id, n in per_tag.items():
+        by_amount[n].append(tag_id)
+    for n, tag_ids in by_amount.items():
+        if sign > 0:
+            Tag.objects.filter(pk__in=tag_ids).update(post_count=F('post_count') + n)
+        else:
+            Tag.objects.filter(pk__in=tag_ids).update(post_count=Greatest(F('post_count') - n, Value(0)))
+
+
+# -------------------------------------------------------------------
+# Write
+# -------------------------------------------------------------------
+@transaction.atomic
+def set_tags(post, names):
+    """Make ``post`` carry exactly ``names`` (already parsed)."""
+    # Post row first, as votes and archiving do: two saves of one post can't both add a tag
+    list(Post.objects.select_for_update().filter(pk=post.pk).values_list('pk', flat=True))
+    tag_names = ' '.join(names)
+    if post.tag_names != tag_names:
+        Post.objects.filter(pk=post.pk).update(tag_names=tag_names)
+        post.tag_names = tag_names
+    if post.archived:
+        # Indexed and counted again on unarchive
+        return
+
+    current = dict(PostTag.objects.filter(post=post).values_list('tag__name', 'tag_id'))
+    removed = [tag_id for name, tag_id in current.items() if name not in names]
+    added = [name for name in names if name not in current]
+    if removed:
+        PostTag.objects.filter(post=post, tag_id__in=removed).delete()
+        _adjust(dict.fromkeys(removed, 1), -1)
+    if added:
+        ids = _tag_ids(added)
+        PostTag.objects.bulk_create([
+            PostTag(post_id=post.pk, tag_id=ids[name], published_date=post.published_date) for name in added
+        ])
+        _adjust(dict.fromkeys(ids.values(), 1), +1)
+
+
+def posts_removed(post_ids):
+    """Un-index posts leaving the live set (deleted, purged or archived); call inside their transaction."""
+    rows = PostTag.objects.filter(post_id__in=post_ids)
+    per_tag = Counter(rows.values_list('tag_id', flat=True))
+    if per_tag:
+        delete_rows(rows)
+        _adjust(per_tag, -1)
+
+
+def posts_restored(post_ids):
+    """Index unarchived posts again from their ``tag_names``."""
+    posts = list(Post.objects.filter(pk__in=post_ids).exclude(tag_names='').values_list(
+        'pk', 'published_date', 'tag_names',
+    ))
+    if not posts:
+        return
+    ids = _tag_ids({name for _, _, names in posts for name in names.split()})
+    rows = [
+        PostTag(post_id=pk, tag_id=ids[name], published_date=published_date)
+        for pk, published_date, names in posts for name in names.split()
+    ]
+    PostTag.objects.bulk_create(rows, ignore_conflicts=True)
+    # Rows that already existed (a repeated restore, or one after rebuild()) were skipped,
+    # so an adjustment per requested row would overcount: recount the touched tags instead
+    recount(set(ids.values()))
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    """Recreate every PostTag row from ``Post.tag_names`` and recount every tag; returns rows written."""
+    delete_rows(PostTag.objects.all())
+    live = Post.objects.live().exclude(tag_names='').order_by('pk').values_list('pk', 'published_date', 'tag_names')
+    written, last = 0, 0
+    while True:
+        posts = list(live.filter(pk__gt=last)[:batch_size])
+        if not posts:
+            break
+        ids = _tag_ids({name for _, _, names in posts for name in names.split()})
+        written += len(PostTag.objects.bulk_create([
+            PostTag(post_id=pk, tag_id=ids[name], published_date=published_date)
+            for pk, published_date, names in posts for name in names.split()
+        ], ignore_conflicts=True))
+        last = posts[-1][0]
+    recount()
+    return written
+
+
+def recount(tag_ids=None):
+    """Set post_count from the PostTag rows (all tags when None)."""
+    n = PostTag.objects.filter(tag=OuterRef('pk')).order_by().values('tag').annotate(n=Count('pk')).values('n')
+    tags = Tag.objects.all() if tag_ids is None else Tag.objects.filter(pk__in=tag_ids)
+    return tags.update(post_count=Coalesce(Subquery(n), Value(0)))
+
+
+# -------------------------------------------------------------------
+# Read
+# -------------------------------------------------------------------
+def get(name):
+    return Tag.objects.filter(name=name.lstrip('#').lower()).first()
+
+
+def page(tag, cursor=None, limit=20):
+    """
+    One page of ``tag``'s posts, newest first.
+    Returns (post ids, next cursor or None); cursors are timeline.encode_cursor strings.
+    """
+    rows = PostTag.objects.filter(tag=tag)
+    if cursor:
+        at, post_id = cursor
+        rows = rows.filter(Q(published_date__lt=at) | Q(published_date=at, post_id__lt=post_id))
+    found = list(rows.order_by('-published_date', '-post_id').values_list('published_date', 'post_id')[:limit + 1])
+    next_cursor = encode_cursor(*found[limit - 1]) if len(found) > limit else None
+    return [post_id for _, post_id in found[:limit]], next_cursor
+
+
+def facets(limit=None):
+    """The most used tags as [{'name', 'post_count'}], read once per request."""
+    limit = limit or getattr(settings, 'UBLOG_TAG_FACETS', 15)
+
+    def _read():
+        return list(
+            Tag.objects.filter(post_count__gt=0).order_by('-post_count', 'name').values('name', 'post_count')[:limit]
+        )
+
+    return memo.memoize(('tag_facets', limit), _read)
@@ -0,0 +1,15 @@
+# path: main_app/templatetags/ublog_assets.py
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from main_app.assets import bundle_path, bundles, is_built
+
+register = template.Library()
+
+
+@register.simple_tag
+def css_bundle(name):
+    """<link> tags for a UBLOG_CSS_BUNDLES entry: the built bundle, or its member files under DEBUG."""
+    paths = [bundle_path(name)] if is_built() else bundles()[name]
+    return format_html_join('\n', '<link rel="stylesheet" href="{}">', ((static(path),) for path in paths))
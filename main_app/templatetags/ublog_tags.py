@@ -0,0 +1,12 @@
+# path: main_app/templatetags/ublog_tags.py
+from django import template
+
+from main_app import tags
+
+register = template.Library()
+
+
+@register.simple_tag
+def tag_facets():
+    """The sidebar's most used topics with their post counts (stored counts, see main_app/tags.py)."""
+    return tags.facets()
@@ -1,3 +1,664 @@
-from django.test import TestCase
+# path: main_app/tests.py
+"""
+Run with the test profile (SQLite, no MySQL or collectstatic needed):
 
-# Create your tests here.
+    UBLOG_ENV=test python manage.py test main_app
+"""
+import re
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Sum
+from django.db import connection
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import archive, assets, feeds, markup, moderation, notifications, ratelimit, rollups, tags, threads, timeline, transfer, votestate
+from .models import (
+    ArchivedVote, Comment, CommentDownvote, CommentLike, CustomUser, Downvote, Follow, Like, Notification,
+    NotificationInbox, Post, PostStatsDaily, PostTag, Tag, TimelineEntry, UserStatsDaily,
+)
+
+
+def _user(name):
+    return CustomUser.objects.create_user(f'{name}@example.com', 'Pw12345!x', username=name)
+
+
+# -------------------------------------------------------------------
+# Rate limiting (main_app/ratelimit.py)
+# -------------------------------------------------------------------
+@override_settings(UBLOG_RATELIMIT_ENABLED=True, UBLOG_RATELIMIT_CACHE='default')
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def test_parse_rate(self):
+        self.assertEqual(ratelimit.parse_rate('5/15m'), (5, 900))
+        self.assertEqual(ratelimit.parse_rate('10/h'), (10, 3600))
+        with self.assertRaises(ValueError):
+            ratelimit.parse_rate('5 per minute')
+
+    @override_settings(UBLOG_RATELIMITS={'login': {'identifier': '2/m'}})
+    def test_identifier_limit_ignores_case(self):
+        def attempt(identifier):
+            return ratelimit.check(self.factory.post('/login/', {'identifier': identifier}), 'login')
+
+        self.assertEqual(attempt('Alice'), 0)
+        self.assertEqual(attempt('alice'), 0)
+        self.assertGreater(attempt('ALICE'), 0)
+        # Other identifiers have their own counter
+        self.assertEqual(attempt('bob'), 0)
+
+    @override_settings(UBLOG_RATELIMITS={'vote': {'user': '2/m'}})
+    def test_votes_over_the_limit_get_429(self):
+        user = _user('voter')
+        post = Post.objects.create(title='t', content='c', author=user)
+        self.client.force_login(user)
+        url = reverse('add_comment_like', args=[post.pk])
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, {'like_button': '1'}).status_code, 302)
+        response = self.client.post(url, {'like_button': '1'})
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response['Retry-After']) > 0)
+        # Rejected before the view body: the two accepted toggles cancel out
+        self.assertFalse(Like.objects.filter(post=post).exists())
+
+    @override_settings(UBLOG_RATELIMIT_ENABLED=False, UBLOG_RATELIMITS={'login': {'ip': '1/m'}})
+    def test_disabled(self):
+        request = self.factory.post('/login/')
+        self.assertEqual(ratelimit.check(request, 'login'), 0)
+        self.assertEqual(ratelimit.check(request, 'login'), 0)
+
+
+# -------------------------------------------------------------------
+# Markup sanitising (main_app/markup.py)
+# -------------------------------------------------------------------
+class MarkupTests(SimpleTestCase):
+    def test_source_html_is_escaped(self):
+        html = markup.render('<script>alert(1)</script> **bold**')
+        self.assertNotIn('<script>', html)
+        self.assertIn('&lt;script&gt;', html)
+        self.assertIn('<strong>bold</strong>', html)
+
+    def test_unsafe_link_targets_stay_text(self):
+        for url in ('javascript:alert(1)', 'data:text/html,x', '//evil.example', '/\\evil.example'):
+            with self.subTest(url=url):
+                self.assertNotIn('<a ', markup.render(f'[x]({url})'))
+
+    def test_safe_link_targets(self):
+        for url in ('https://example.com/a', '/blog/1/', '#comments', 'mailto:a@example.com'):
+            with self.subTest(url=url):
+                self.assertIn(f'<a href="{url}" rel="nofollow noopener">x</a>', markup.render(f'[x]({url})'))
+
+    def test_quotes_cannot_break_out_of_href(self):
+        html = markup.render('[x](https://example.com/"onmouseover="alert(1))')
+        self.assertNotIn('"onmouseover', html)
+
+    def test_excerpt_is_plain_text(self):
+        text, truncated = markup.excerpt(markup.render('# Title\n\n' + 'word ' * 100), 50)
+        self.assertTrue(truncated)
+        self.assertLessEqual(len(text), 50)
+        self.assertNotIn('<', text)
+
+
+# -------------------------------------------------------------------
+# CSS minifier (main_app/assets.py)
+# -------------------------------------------------------------------
+class MinifyCssTests(SimpleTestCase):
+    @staticmethod
+    def _selectors(css):
+        # Comments first: no shipped string contains '/*'
+        css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+        return {
+            re.sub(r'\s*([,>])\s*', r'\1', ' '.join(selector.split()))
+            for selector in re.findall(r'([^{};]+)\{', css)
+        }
+
+    def test_quotes_in_comments_do_not_swallow_rules(self):
+        css = "a{content:'x'} /* don't */ b{color:red} /* it's */ c{d:e}"
+        self.assertEqual(assets.minify_css(css), "a{content:'x'}b{color:red}c{d:e}\n")
+
+    def test_strings_and_kept_comments_are_verbatim(self):
+        css = 'a { content: "/* not a comment */  x" } /*! licence: it\'s kept */'
+        self.assertEqual(assets.minify_css(css), 'a{content:"/* not a comment */  x"}/*! licence: it\'s kept */\n')
+
+    def test_shipped_stylesheets_keep_every_selector(self):
+        css_dir = Path(__file__).resolve().parent / 'static' / 'css'
+        paths = sorted(css_dir.glob('*.css'))
+        self.assertTrue(paths)
+        for path in paths:
+            with self.subTest(stylesheet=path.name):
+                source = path.read_text(encoding='utf-8')
+                self.assertEqual(self._selectors(assets.minify_css(source)), self._selectors(source))
+
+
+# -------------------------------------------------------------------
+# Conditional GET on pages (views.ConditionalGetMixin)
+# -------------------------------------------------------------------
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = _user('alice')
+        self.bob = _user('bob')
+        Post.objects.create(title='t', content='c', author=self.alice)
+        self.url = reverse('postlistview')
+
+    def _login(self, name):
+        self.client.post(reverse('loginview'), {'identifier': name, 'password': 'Pw12345!x'})
+
+    def test_unchanged_page_is_304(self):
+        self._login('alice')
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_new_post_changes_etag(self):
+        self._login('alice')
+        etag = self.client.get(self.url)['ETag']
+        Post.objects.create(title='t2', content='c', author=self.bob)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_varies_per_viewer(self):
+        self._login('alice')
+        alice_etag = self.client.get(self.url)['ETag']
+        self.client.get(reverse('logoutview'))
+        self._login('bob')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=alice_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], alice_etag)
+
+    def test_relogin_rotates_csrf_and_etag(self):
+        self._login('alice')
+        etag = self.client.get(self.url)['ETag']
+        self.client.get(reverse('logoutview'))
+        self._login('alice')
+        # A 304 here would keep the page with the old CSRF token, and its next POST would 403
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+# -------------------------------------------------------------------
+# Post feeds (main_app/feeds.py)
+# -------------------------------------------------------------------
+class FeedTests(TestCase):
+    def setUp(self):
+        self.user = _user('alice')
+
+    def _feed_queries(self, fmt):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('post_feed', args=[fmt]))
+            body = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), body
+
+    def test_query_count_does_not_grow_with_items(self):
+        # Empty bodies render to '': the deferred content must still not be read per row
+        Post.objects.create(title='first', content='', author=self.user)
+        for fmt in ('rss', 'atom', 'json'):
+            with self.subTest(format=fmt):
+                one, _ = self._feed_queries(fmt)
+                for i in range(9):
+                    Post.objects.create(title=f'p{i}', content='' if i % 2 else '*x*', author=self.user)
+                ten, body = self._feed_queries(fmt)
+                self.assertEqual(ten, one)
+                self.assertIn(b'p8', body)
+                Post.objects.exclude(title='first').delete()
+
+    def test_items_are_capped(self):
+        for i in range(feeds.FEED_MAX_ITEMS + 1):
+            Post.objects.create(title=f'p{i}', content='x', author=self.user)
+        _, body = self._feed_queries('rss')
+        self.assertEqual(body.count(b'<item>'), feeds.FEED_MAX_ITEMS)
+
+
+# -------------------------------------------------------------------
+# Admin deletes keep counters and page versions right (main_app/admin.py)
+# -------------------------------------------------------------------
+class AdminDeleteTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser('admin@example.com', 'Pw12345!x', username='admin')
+        self.bob = _user('bob')
+        self.post = Post.objects.create(title='t', content='c', author=self.admin)
+        self.comment = Comment.objects.create(post=self.post, user=self.admin, content='c')
+        self.client.force_login(self.admin)
+
+    def _modified(self):
+        return Post.objects.values_list('modified_date', flat=True).get(pk=self.post.pk)
+
+    def _delete_selected(self, model, objs):
+        url = reverse(f'admin:main_app_{model._meta.model_name}_changelist')
+        return self.client.post(url, {
+            'action': 'delete_selected', '_selected_action': [obj.pk for obj in objs], 'post': 'yes',
+        })
+
+    def test_delete_selected_comment_votes_recounts(self):
+        votes = [CommentLike.objects.create(comment=self.comment, user=user) for user in (self.admin, self.bob)]
+        before = self._modified()
+        self.assertEqual(self._delete_selected(CommentLike, votes).status_code, 302)
+        self.comment.refresh_from_db()
+        self.assertEqual((self.comment.like_count, self.comment.score), (0, 0))
+        self.assertGreater(self._modified(), before)
+
+    def test_delete_selected_post_votes_touches_post(self):
+        like = Like.objects.create(post=self.post, user=self.bob)
+        before = self._modified()
+        self._delete_selected(Like, [like])
+        self.assertFalse(Like.objects.exists())
+        self.assertGreater(self._modified(), before)
+
+    def test_delete_comment_touches_post(self):
+        before = self._modified()
+        self._delete_selected(Comment, [self.comment])
+        self.assertFalse(Comment.objects.exists())
+        self.assertGreater(self._modified(), before)
+
+
+# -------------------------------------------------------------------
+# Comment thread counters (main_app/threads.py)
+# -------------------------------------------------------------------
+class ThreadCounterTests(TestCase):
+    def setUp(self):
+        self.user = _user('alice')
+        self.post = Post.objects.create(title='t', content='c', author=self.user)
+        self.url = reverse('add_comment_like', args=[self.post.pk])
+        self.client.force_login(self.user)
+
+    def _comment(self, parent=None):
+        self.client.post(self.url, {
+            'comment_button': '1', 'comment_text': 'hi', 'parent_id': parent.pk if parent else '',
+        })
+        return Comment.objects.filter(post=self.post).latest('id')
+
+    def test_replies_are_counted_up_the_chain(self):
+        root = self._comment()
+        child = self._comment(root)
+        grandchild = self._comment(child)
+        self._comment(root)
+        root.refresh_from_db()
+        child.refresh_from_db()
+        self.assertEqual((root.reply_count, root.descendant_count), (2, 3))
+        self.assertEqual((child.reply_count, child.descendant_count), (1, 1))
+        self.assertEqual(child.last_activity_at, grandchild.published_date)
+        # The write path left nothing for a rebuild to fix
+        self.assertEqual(threads.rebuild([self.post.pk]), 0)
+
+    def test_rebuild_repairs_drift(self):
+        root = self._comment()
+        self._comment(root)
+        Comment.objects.filter(pk=root.pk).update(reply_count=7, descendant_count=9)
+        self.assertEqual(threads.rebuild([self.post.pk]), 1)
+        root.refresh_from_db()
+        self.assertEqual((root.reply_count, root.descendant_count), (1, 1))
+
+    def test_score_follows_votes(self):
+        comment = self._comment()
+        self.client.post(self.url, {'comment_like': '1', 'comment_id': comment.pk})
+        comment.refresh_from_db()
+        self.assertEqual(comment.score, 1)
+        self.client.post(self.url, {'comment_downvote': '1', 'comment_id': comment.pk})
+        comment.refresh_from_db()
+        self.assertEqual((comment.like_count, comment.downvote_count, comment.score), (0, 1, -1))
+
+    def test_load_attaches_replies(self):
+        root = self._comment()
+        child = self._comment(root)
+        roots, total = threads.load(self.post, 'new', self.user)
+        self.assertEqual(total, 2)
+        self.assertEqual([c.pk for c in roots], [root.pk])
+        self.assertEqual([c.pk for c in roots[0].replies], [child.pk])
+
+
+# -------------------------------------------------------------------
+# Tag counts (main_app/tags.py)
+# -------------------------------------------------------------------
+class TagCountTests(TestCase):
+    def setUp(self):
+        self.user = _user('alice')
+        self.client.force_login(self.user)
+
+    def _add(self, title, tag_text):
+        self.client.post(reverse('addpostview'), {'title': title, 'content': 'x', 'tags': tag_text})
+        return Post.objects.get(title=title)
+
+    @staticmethod
+    def _counts():
+        return dict(Tag.objects.values_list('name', 'post_count'))
+
+    def test_add_edit_delete_move_counts(self):
+        first = self._add('one', 'Python, #django')
+        self._add('two', 'python web')
+        self.assertEqual(first.tag_names, 'python django')
+        self.assertEqual(self._counts(), {'python': 2, 'django': 1, 'web': 1})
+
+        self.client.post(reverse('updatePostView', args=[first.pk]), {'title': 'one', 'content': 'x', 'tags': 'django rust'})
+        self.assertEqual(self._counts(), {'python': 1, 'django': 1, 'web': 1, 'rust': 1})
+
+        self.client.post(reverse('deletePostView', args=[first.pk]))
+        self.assertEqual(self._counts(), {'python': 1, 'django': 0, 'web': 1, 'rust': 0})
+        self.assertFalse(PostTag.objects.filter(post_id=first.pk).exists())
+
+    @override_settings(UBLOG_MAX_TAGS_PER_POST=2)
+    def test_invalid_tags_are_form_errors(self):
+        for tag_text in ('no/slash', 'a b c'):
+            with self.subTest(tags=tag_text):
+                response = self.client.post(reverse('addpostview'), {'title': 't', 'content': 'x', 'tags': tag_text})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context['form'].errors['tags'])
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+
+    def test_archived_posts_are_not_counted(self):
+        post = self._add('old', 'python')
+        archive.archive_batch([post.pk])
+        self.assertEqual(self._counts(), {'python': 0})
+        self.assertFalse(PostTag.objects.filter(post=post).exists())
+        archive.unarchive(post.pk)
+        self.assertEqual(self._counts(), {'python': 1})
+
+    def test_repeated_restore_does_not_overcount(self):
+        post = self._add('one', 'python')
+        tags.posts_restored([post.pk])
+        tags.rebuild()
+        tags.posts_restored([post.pk])
+        self.assertEqual(self._counts(), {'python': 1})
+
+    @override_settings(UBLOG_TAG_PAGE_SIZE=2)
+    def test_tag_pages_walk_every_post_once(self):
+        for i in range(5):
+            tags.set_tags(Post.objects.create(title=f'p{i}', content='x', author=self.user), ['python'])
+        seen, url = [], reverse('tag_feed', args=['python'])
+        while url:
+            response = self.client.get(url)
+            seen += [post.pk for post in response.context['posts']]
+            cursor = response.context['next_cursor']
+            url = f"{reverse('tag_feed', args=['python'])}?before={cursor}" if cursor else None
+        self.assertEqual(seen, sorted(Post.objects.values_list('pk', flat=True), reverse=True))
+
+    def test_rebuild_matches_incremental_counts(self):
+        self._add('one', 'python django')
+        self._add('two', 'python')
+        before = self._counts()
+        Tag.objects.update(post_count=42)
+        tags.rebuild()
+        self.assertEqual(self._counts(), before)
+
+
+# -------------------------------------------------------------------
+# Viewer vote state (main_app/votestate.py)
+# -------------------------------------------------------------------
+class VoteStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = _user('alice')
+        self.posts = [Post.objects.create(title=f'p{i}', content='c', author=self.user) for i in range(3)]
+        Like.objects.create(post=self.posts[0], user=self.user)
+        Downvote.objects.create(post=self.posts[1], user=self.user)
+
+    def _state(self):
+        return votestate.vote_state(self.user, [post.pk for post in self.posts])
+
+    @override_settings(UBLOG_VOTE_STATE_CACHE=None)
+    def test_one_query_without_a_shared_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self._state(), ({self.posts[0].pk}, {self.posts[1].pk}))
+        # Nothing outlives the request: a vote from another worker shows up at once
+        Like.objects.create(post=self.posts[2], user=self.user)
+        self.assertEqual(self._state()[0], {self.posts[0].pk, self.posts[2].pk})
+
+    @override_settings(UBLOG_VOTE_STATE_CACHE='default')
+    def test_cached_until_the_users_own_toggle(self):
+        self._state()
+        with self.assertNumQueries(0):
+            self._state()
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add_comment_like', args=[self.posts[2].pk]), {'like_button': '1'})
+        self.assertEqual(self._state()[0], {self.posts[0].pk, self.posts[2].pk})
+
+    @override_settings(UBLOG_VOTE_STATE_CACHE='default')
+    def test_late_write_of_old_state_is_not_served(self):
+        # A request read the votes before a toggle committed and writes them after it
+        stale_key = votestate.cache_key(self.user.pk, votestate._generation(cache, self.user.pk))
+        stale = {post.pk: votestate.NONE for post in self.posts}
+        Like.objects.create(post=self.posts[2], user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            votestate.forget(self.user.pk)
+        cache.set(stale_key, stale)
+        self.assertEqual(self._state()[0], {self.posts[0].pk, self.posts[2].pk})
+
+
+# -------------------------------------------------------------------
+# Activity rollups (main_app/rollups.py)
+# -------------------------------------------------------------------
+class RollupTests(TestCase):
+    def setUp(self):
+        self.alice = _user('alice')
+        self.bob = _user('bob')
+        self.post = Post.objects.create(title='t', content='c', author=self.alice)
+        self.now = timezone.now()
+
+    def _post_totals(self):
+        return PostStatsDaily.objects.filter(post=self.post).aggregate(
+            likes=Sum('likes'), downvotes=Sum('downvotes'), comments=Sum('comments'),
+        )
+
+    def test_counts_and_reruns_are_idempotent(self):
+        Like.objects.create(post=self.post, user=self.bob, created_at=self.now - timedelta(days=2))
+        Downvote.objects.create(post=self.post, user=self.alice)
+        Comment.objects.create(post=self.post, user=self.bob, content='c')
+        rollups.run(now=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self._post_totals(), {'likes': 1, 'downvotes': 1, 'comments': 1})
+        self.assertEqual(UserStatsDaily.objects.filter(user=self.bob).aggregate(n=Sum('votes'))['n'], 1)
+
+        before = list(PostStatsDaily.objects.order_by('day').values_list('day', 'likes', 'downvotes', 'comments'))
+        rollups.run(since=self.now - timedelta(days=5), now=timezone.now() + timedelta(minutes=1))
+        after = list(PostStatsDaily.objects.order_by('day').values_list('day', 'likes', 'downvotes', 'comments'))
+        self.assertEqual(before, after)
+
+    def test_incremental_run_picks_up_new_rows(self):
+        Like.objects.create(post=self.post, user=self.bob)
+        rollups.run(now=timezone.now() + timedelta(minutes=1))
+        Like.objects.create(post=self.post, user=self.alice)
+        rollups.run(now=timezone.now() + timedelta(minutes=2))
+        self.assertEqual(self._post_totals()['likes'], 2)
+        self.assertIsNotNone(rollups.watermark())
+
+    def test_vote_removed_before_rollup_is_not_counted(self):
+        Like.objects.create(post=self.post, user=self.bob).delete()
+        Comment.objects.create(post=self.post, user=self.bob, content='c')
+        rollups.run(now=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self._post_totals(), {'likes': 0, 'downvotes': 0, 'comments': 1})
+
+    def test_archived_votes_are_still_counted(self):
+        Like.objects.create(post=self.post, user=self.bob)
+        archive.archive_batch([self.post.pk])
+        rollups.run(now=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self._post_totals()['likes'], 1)
+
+
+# -------------------------------------------------------------------
+# export_ublog / import_ublog (main_app/transfer.py)
+# -------------------------------------------------------------------
+class TransferRoundTripTests(TestCase):
+    def setUp(self):
+        alice, bob, carol = _user('alice'), _user('bob'), _user('carol')
+        timeline.follow(bob, alice)
+        timeline.follow(carol, alice)
+        posts = []
+        for i, tag_names in enumerate((['python', 'django'], ['python'], [])):
+            post = Post.objects.create(title=f'p{i}', content=f'**body {i}**', author=alice)
+            tags.set_tags(post, tag_names)
+            timeline.fan_out(post.pk)
+            posts.append(post)
+        root = Comment.objects.create(post=posts[0], user=bob, content='root')
+        reply = Comment.objects.create(post=posts[0], user=carol, content='reply', parent=root)
+        threads.reply_added(reply)
+        CommentLike.objects.create(comment=root, user=carol)
+        Like.objects.create(post=posts[0], user=bob)
+        Downvote.objects.create(post=posts[0], user=carol)
+        Like.objects.create(post=posts[1], user=bob)
+        Like.objects.create(post=posts[1], user=carol)
+        archive.archive_batch([posts[1].pk])
+
+    @staticmethod
+    def _state():
+        state = {
+            label: sorted(model.objects.values_list(*transfer.columns(model)))
+            for label, model in transfer.MODELS
+        }
+        state['tags'] = sorted(Tag.objects.values_list('name', 'post_count'))
+        state['post_tags'] = sorted(PostTag.objects.values_list('post_id', 'tag__name', 'published_date'))
+        state['timelines'] = sorted(TimelineEntry.objects.values_list('user_id', 'post_id', 'author_id'))
+        return state
+
+    def test_round_trip_restores_every_table_and_counter(self):
+        before = self._state()
+        self.assertTrue(before['archived_votes'])
+        self.assertTrue(before['follows'])
+        for fmt in transfer.FORMATS:
+            with self.subTest(format=fmt), tempfile.TemporaryDirectory() as out_dir:
+                call_command('export_ublog', out_dir, format=fmt, stdout=StringIO())
+                self.assertEqual(
+                    sorted(path.name for path in Path(out_dir).iterdir()),
+                    sorted(f'{label}.{fmt}' for label, _ in transfer.MODELS),
+                )
+                CustomUser.objects.all().delete()
+                Tag.objects.all().delete()
+                self.assertFalse(Post.objects.exists())
+                call_command('import_ublog', out_dir, stdout=StringIO())
+                self.assertEqual(self._state(), before)
+
+    def test_unarchive_after_restore_keeps_votes(self):
+        archived = Post.objects.get(title='p1')
+        with tempfile.TemporaryDirectory() as out_dir:
+            call_command('export_ublog', out_dir, stdout=StringIO())
+            CustomUser.objects.all().delete()
+            call_command('import_ublog', out_dir, stdout=StringIO())
+        archive.unarchive(archived.pk)
+        self.assertEqual(Like.objects.filter(post=archived).count(), 2)
+
+
+# -------------------------------------------------------------------
+# Batched purge (main_app/moderation.py)
+# -------------------------------------------------------------------
+@override_settings(UBLOG_NOTIFICATIONS_ASYNC=False)
+class PurgeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.spam, self.alice, self.bob = _user('spam'), _user('alice'), _user('bob')
+        self.clients = {}
+        for user in (self.spam, self.alice, self.bob):
+            self.clients[user.pk] = Client()
+            self.clients[user.pk].force_login(user)
+        # Notifications are written on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self._build()
+
+    def _build(self):
+        self.alice_post = self._post(self.alice, ['python'])
+        self.bob_post = self._post(self.bob, ['python', 'web'])
+        spam_post = self._post(self.spam, ['python', 'spam'])
+        old_post = self._post(self.alice, ['history'])
+
+        # Threads under the spammer's post, and spam inside other people's threads
+        alice_on_spam = self._comment(self.alice, spam_post)
+        self._comment(self.bob, spam_post, alice_on_spam)
+        spam_root = self._comment(self.spam, self.alice_post)
+        self._comment(self.bob, self.alice_post, spam_root)
+        self.alice_root = self._comment(self.alice, self.alice_post)
+        bob_reply = self._comment(self.bob, self.alice_post, self.alice_root)
+        spam_reply = self._comment(self.spam, self.alice_post, bob_reply)
+        self._comment(self.alice, self.alice_post, spam_reply)
+
+        # Votes both ways
+        for user, post in ((self.spam, self.alice_post), (self.alice, spam_post), (self.spam, old_post),
+                           (self.bob, old_post)):
+            self._vote(user, post, {'like_button': '1'})
+        self._vote(self.spam, self.bob_post, {'downvote_button': '1'})
+        for user, comment in ((self.spam, self.alice_root), (self.bob, self.alice_root), (self.alice, spam_root)):
+            self._vote(user, comment.post, {'comment_like': '1', 'comment_id': comment.pk})
+        self._vote(self.spam, self.alice_post, {'comment_downvote': '1', 'comment_id': bob_reply.pk})
+        archive.archive_batch([old_post.pk])
+
+        timeline.follow(self.spam, self.alice)
+        timeline.follow(self.bob, self.spam)
+        timeline.follow(self.bob, self.alice)
+
+    def _post(self, author, tag_names):
+        post = Post.objects.create(title=f'{author.username} {tag_names}', content='c', author=author)
+        tags.set_tags(post, tag_names)
+        timeline.fan_out(post.pk)
+        return post
+
+    def _comment(self, user, post, parent=None):
+        self.clients[user.pk].post(reverse('add_comment_like', args=[post.pk]), {
+            'comment_button': '1', 'comment_text': 'c', 'parent_id': parent.pk if parent else '',
+        })
+        return Comment.objects.filter(post=post, user=user).latest('id')
+
+    def _vote(self, user, post, data):
+        self.clients[user.pk].post(reverse('add_comment_like', args=[post.pk]), data)
+
+    @staticmethod
+    def _counters():
+        return {
+            'comments': sorted(Comment.objects.values_list(
+                'pk', 'like_count', 'downvote_count', 'score', 'reply_count', 'descendant_count', 'last_activity_at',
+            )),
+            'tags': sorted(Tag.objects.values_list('name', 'post_count')),
+            'archived_scores': sorted(Post.objects.filter(archived_at__isnull=False).values_list('pk', 'archived_score')),
+            'unread': sorted(NotificationInbox.objects.values_list('user_id', 'unread_count')),
+            'followers': sorted(CustomUser.objects.values_list('pk', 'follower_count')),
+        }
+
+    @staticmethod
+    def _recount():
+        transfer.rebuild_comment_counters()
+        threads.rebuild()
+        tags.rebuild()
+        archive.refresh_archived_scores()
+        notifications.recount_unread(CustomUser.objects.values('pk'))
+        timeline.recount_followers()
+
+    def test_setup_counters_are_consistent(self):
+        # The fixture itself must survive a recount, or the purge test proves nothing
+        self.assertTrue(Notification.objects.filter(recipient=self.alice, is_read=False).exists())
+        before = self._counters()
+        self._recount()
+        self.assertEqual(self._counters(), before)
+
+    def test_purge_user_leaves_counters_matching_a_recount(self):
+        moderation.Purge(batch_size=2).purge_user(self.spam.pk)
+
+        self.assertFalse(CustomUser.objects.filter(pk=self.spam.pk).exists())
+        for model, field in ((Post, 'author'), (Comment, 'user'), (Like, 'user'), (Downvote, 'user'),
+                             (CommentLike, 'user'), (CommentDownvote, 'user'), (ArchivedVote, 'user'),
+                             (Follow, 'follower'), (Follow, 'author'), (TimelineEntry, 'author')):
+            with self.subTest(model=model.__name__, field=field):
+                self.assertFalse(model.objects.filter(**{f'{field}_id': self.spam.pk}).exists())
+        # Replies under the spammer's comments went with them; everything else stayed
+        self.assertEqual(set(Post.objects.values_list('pk', flat=True)) - {self.alice_post.pk, self.bob_post.pk}, {
+            Post.objects.get(archived_at__isnull=False).pk,
+        })
+        self.alice_root.refresh_from_db()
+        self.assertEqual((self.alice_root.like_count, self.alice_root.reply_count), (1, 1))
+
+        after = self._counters()
+        self._recount()
+        self.assertEqual(self._counters(), after)
+
+    def test_purge_post(self):
+        moderation.Purge(batch_size=2).purge_post(self.alice_post.pk)
+        self.assertFalse(Comment.objects.filter(post_id=self.alice_post.pk).exists())
+        after = self._counters()
+        self._recount()
+        self.assertEqual(self._counters(), after)
@@ -0,0 +1,152 @@
+# path: main_app/threads.py
+"""
+Comment thread counters and sort orders.
+
+Every Comment carries:
+- ``reply_count``: its direct replies
+- ``descendant_count``: every comment anywhere below it
+- ``last_activity_at``: when it was posted, or the newest reply below it
+- ``score``: like_count - downvote_count
+
+So a thread can say "3 replies, 12 in thread", even collapsed, without
+counting its children.
+
+Write path: a new reply bumps its whole ancestor chain in one UPDATE
+(``reply_added``). It runs inside add_comment_like, under the post row lock
+that already serializes comments on the post. Bulk paths call
+``rebuild(post_ids)``: moderation purges, imports and admin repairs. It reads
+each post's (id, parent) pairs once, recomputes the counters bottom-up and
+writes only the rows that changed.
+
+Read path: ``load(post, sort)`` takes two queries. The first reads the
+top-level comments in the chosen order, served by the (post, parent, <key>)
+indexes. The second reads every reply in the same order. Replies are attached
+to their parents as ``replies`` lists, so templates never query per comment.
+Commenters come from the request's identity map (main_app/memo.py), plus
+one query for any the page has not loaded yet.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, F, PositiveIntegerField, When
+
+from . import memo
+from .models import Comment
+from .votestate import apply_comment_vote_state
+
+# Sort mode -> ORDER BY; the id tie-break rides along in the secondary index
+SORTS = {
+    'top': ('-score', '-id'),
+    'new': ('-published_date', '-id'),
+    'active': ('-last_activity_at', '-id'),
+}
+
+REBUILD_POSTS_PER_QUERY = 200
+
+
+def default_sort():
+    return getattr(settings, 'UBLOG_COMMENT_SORT', 'top')
+
+
+# -------------------------------------------------------------------
+# Read
+# -------------------------------------------------------------------
+def load(post, sort, user):
+    """Return (top-level comments, total comments) with ``replies`` and the viewer's votes attached."""
+    order = SORTS[sort]
+    base = Comment.objects.filter(post=post)
+    roots = list(base.filter(parent__isnull=True).order_by(*order))
+    # Not gated on reply_count: a reply added outside add_comment_like still shows before a rebuild
+    replies = list(base.filter(parent__isnull=False).order_by(*order)) if roots else []
+
+    children = defaultdict(list)
+    for reply in replies:
+        children[reply.parent_id].append(reply)
+    comments = roots + replies
+    for comment in comments:
+        comment.replies = children.get(comment.pk, [])
+    # Commenters through the request's identity map: the viewer and the post author are usually loaded already
+    memo.attach(comments, 'user')
+    apply_comment_vote_state(comments, user)
+    return roots, len(comments)
+
+
+# -------------------------------------------------------------------
+# Write
+# -------------------------------------------------------------------
+def _ancestor_ids(parent_id):
+    ids = []
+    while parent_id is not None and parent_id not in ids:
+        ids.append(parent_id)
+        parent_id = Comment.objects.filter(pk=parent_id).values_list('parent_id', flat=True).first()
+    return ids
+
+
+def reply_added(comment):
+    """Count ``comment`` on its parent and every ancestor above it."""
+    if comment.parent_id is None:
+        return
+    Comment.objects.filter(pk__in=_ancestor_ids(comment.parent_id)).update(
+        reply_count=Case(
+            When(pk=comment.parent_id, then=F('reply_count') + 1), default=F('reply_count'),
+            output_field=PositiveIntegerField(),
+        ),
+        descendant_count=F('descendant_count') + 1,
+        last_activity_at=comment.published_date,
+    )
+
+
+def _recount(rows):
+    """{id: (reply_count, descendant_count, last_activity_at)} for one post's (id, parent_id, published) rows."""
+    children = defaultdict(list)
+    published = {}
+    for pk, parent_id, published_date in rows:
+        children[parent_id].append(pk)
+        published[pk] = published_date
+
+    counts = {}
+    # Iterative post-order walk from the top-level comments: children before parents
+    stack = [(pk, False) for pk in children[None]]
+    while stack:
+        pk, expanded = stack.pop()
+        if not expanded:
+            stack.append((pk, True))
+            stack.extend((child, False) for child in children.get(pk, ()))
+            continue
+        kids = children.get(pk, ())
+        counts[pk] = (
+            len(kids),
+            sum(counts[k][1] + 1 for k in kids),
+            max([published[pk]] + [counts[k][2] for k in kids]),
+        )
+    return counts
+
+
+def rebuild(post_ids=None):
+    """Recompute thread counters for the given posts (every post with comments when None)."""
+    if post_ids is None:
+        post_ids = Comment.objects.order_by('post_id').values_list('post_id', flat=True).distinct()
+    post_ids = list(post_ids)
+    changed = 0
+    for i in range(0, len(post_ids), REBUILD_POSTS_PER_QUERY):
+        rows = Comment.objects.filter(post_id__in=post_ids[i:i + REBUILD_POSTS_PER_QUERY]).values_list(
+            'post_id', 'id', 'parent_id', 'published_date', 'reply_count', 'descendant_count', 'last_activity_at',
+        )
+        per_post = defaultdict(list)
+        current = {}
+        for post_id, pk, parent_id, published_date, *stored in rows:
+            per_post[post_id].append((pk, parent_id, published_date))
+            current[pk] = tuple(stored)
+
+        updates = []
+        for post_rows in per_post.values():
+            for pk, values in _recount(post_rows).items():
+                if values != current[pk]:
+                    reply_count, descendant_count, last_activity_at = values
+                    updates.append(Comment(
+                        pk=pk, reply_count=reply_count, descendant_count=descendant_count,
+                        last_activity_at=last_activity_at,
+                    ))
+        Comment.objects.bulk_update(updates, ['reply_count', 'descendant_count', 'last_activity_at'], batch_size=500)
+        changed += len(updates)
+    return changed
@@ -0,0 +1,243 @@
+# path: main_app/timeline.py
+"""
+Home timelines ("posts from people you follow"), hybrid fan-out.
+
+Write path: once a new post commits, its id is copied into TimelineEntry for
+every follower of the author, plus the author, in bulk INSERT batches on a
+background thread (fan-out-on-write). Authors with UBLOG_FANOUT_THRESHOLD or
+more followers are marked ``is_high_fanout`` and skipped. Writing a row per
+follower would make one post cost millions of inserts.
+
+Read path: one keyset range scan of the reader's TimelineEntry rows on
+(user, -published_date, -post). If the reader follows any high-fanout
+authors, a second range scan of their recent posts (author, -published_date)
+is merged in (fan-out-on-read). The page's cards are then fetched in a single
+``pk IN (...)`` query. There is no JOIN between follows and posts.
+
+Timelines stay bounded: entries for a post are dropped when it is archived
+(main_app/archive.py) or purged (main_app/moderation.py).
+
+``rebuild()`` recounts followers and refills every timeline from the follow
+graph, as a new follow would: use it after imports (import_ublog).
+"""
+import logging
+import queue
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import BooleanField, Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .bulk import delete_rows
+from .models import CustomUser, Follow, Post, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _threshold():
+    return getattr(settings, 'UBLOG_FANOUT_THRESHOLD', 10000)
+
+
+# -------------------------------------------------------------------
+# Follow graph
+# -------------------------------------------------------------------
+def follow(user, author):
+    """Follow ``author``; returns False if already following (or self)."""
+    if user.pk == author.pk:
+        return False
+    try:
+        with transaction.atomic():
+            Follow.objects.create(follower=user, author=author)
+            CustomUser.objects.filter(pk=author.pk).update(follower_count=F('follower_count') + 1)
+            CustomUser.objects.filter(
+                pk=author.pk, is_high_fanout=False, follower_count__gte=_threshold()
+            ).update(is_high_fanout=True)
+    except IntegrityError:
+        return False
+    if not CustomUser.objects.filter(pk=author.pk, is_high_fanout=True).exists():
+        backfill(user.pk, author.pk)
+    return True
+
+
+def unfollow(user, author):
+    with transaction.atomic():
+        if not Follow.objects.filter(follower=user, author=author).delete()[0]:
+            return False
+        CustomUser.objects.filter(pk=author.pk, follower_count__gt=0).update(follower_count=F('follower_count') - 1)
+        TimelineEntry.objects.filter(user=user, author=author).delete()
+    return True
+
+
+def backfill(user_id, author_id, limit=None):
+    """Copy an author's most recent live posts into one reader's timeline (on follow)."""
+    limit = limit or getattr(settings, 'UBLOG_TIMELINE_BACKFILL', 50)
+    recent = (
+        Post.objects.live().filter(author_id=author_id)
+        .order_by('-published_date').values_list('pk', 'published_date')[:limit]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id, published_date=at) for pk, at in recent],
+        ignore_conflicts=True,
+    )
+
+
+def recount_followers():
+    """Set follower_count (and is_high_fanout) from the Follow rows in two UPDATEs."""
+    n = Follow.objects.filter(author=OuterRef('pk')).order_by().values('author').annotate(n=Count('pk')).values('n')
+    CustomUser.objects.update(follower_count=Coalesce(Subquery(n), Value(0)))
+    CustomUser.objects.update(is_high_fanout=Case(
+        When(follower_count__gte=_threshold(), then=Value(True)), default=Value(False), output_field=BooleanField(),
+    ))
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    """Recount followers and refill every timeline from the follow graph; returns the follows replayed."""
+    recount_followers()
+    delete_rows(TimelineEntry.objects.all())
+    # Authors see their own posts; high-fanout authors' are pulled at read time instead
+    authors = (
+        Post.objects.live().filter(author__is_high_fanout=False)
+        .order_by('author_id').values_list('author_id', flat=True).distinct()
+    )
+    for author_id in authors.iterator():
+        backfill(author_id, author_id)
+    edges = Follow.objects.filter(author__is_high_fanout=False).order_by('pk').values_list('pk', 'follower_id', 'author_id')
+    replayed, last = 0, 0
+    while True:
+        rows = list(edges.filter(pk__gt=last)[:batch_size])
+        if not rows:
+            return replayed
+        for _, follower_id, author_id in rows:
+            backfill(follower_id, author_id)
+        replayed += len(rows)
+        last = rows[-1][0]
+
+
+# -------------------------------------------------------------------
+# Fan-out on write
+# -------------------------------------------------------------------
+def fan_out(post_id):
+    """Write ``post_id`` into the author's and every follower's timeline, in batches."""
+    post = (
+        Post.objects.filter(pk=post_id).select_related('author')
+        .only('pk', 'published_date', 'author__is_high_fanout').first()
+    )
+    if post is None:
+        return 0
+    author_id = post.author_id
+    if post.author.is_high_fanout:
+        return 0
+
+    batch_size = getattr(settings, 'UBLOG_FANOUT_BATCH_SIZE', 1000)
+
+    def _rows(user_ids):
+        return [
+            TimelineEntry(user_id=uid, post_id=post_id, author_id=author_id, published_date=post.published_date)
+            for uid in user_ids
+        ]
+
+    TimelineEntry.objects.bulk_create(_rows([author_id]), ignore_conflicts=True)
+    written = 1
+    followers = Follow.objects.filter(author_id=author_id).order_by('follower_id').values_list('follower_id', flat=True)
+    last = 0
+    while True:
+        ids = list(followers.filter(follower_id__gt=last)[:batch_size])
+        if not ids:
+            return written
+        TimelineEntry.objects.bulk_create(_rows(ids), ignore_conflicts=True)
+        written += len(ids)
+        last = ids[-1]
+
+
+def post_created(post):
+    """Call from the view that created ``post``; fan-out runs after commit."""
+    if getattr(settings, 'UBLOG_TIMELINE_ASYNC', True):
+        transaction.on_commit(lambda: _worker.enqueue(post.pk))
+    else:
+        transaction.on_commit(lambda: fan_out(post.pk))
+
+
+class FanoutWorker:
+    """One background thread that fans out new posts in arrival order."""
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, post_id):
+        self._queue.put(post_id)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='ublog-fanout', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            post_id = self._queue.get()
+            try:
+                close_old_connections()
+                fan_out(post_id)
+            except Exception:
+                logger.exception("Timeline fan-out failed for post %s", post_id)
+
+
+_worker = FanoutWorker()
+
+
+# -------------------------------------------------------------------
+# Read path
+# -------------------------------------------------------------------
+def encode_cursor(published_date, post_id):
+    delta = published_date - _EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+    return f"{micros}_{post_id}"
+
+
+def decode_cursor(cursor):
+    """'<epoch micros>_<post id>' -> (datetime, id), or None if malformed."""
+    try:
+        micros, post_id = (int(part) for part in cursor.split('_', 1))
+    except (AttributeError, ValueError):
+        return None
+    return _EPOCH + timedelta(microseconds=micros), post_id
+
+
+def _before(cursor, date_field, id_field):
+    at, post_id = cursor
+    return Q(**{f'{date_field}__lt': at}) | Q(**{date_field: at, f'{id_field}__lt': post_id})
+
+
+def read(user, cursor=None, limit=20):
+    """
+    One page of ``user``'s home timeline, newest first.
+    Returns (post ids, next cursor or None).
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    if cursor:
+        entries = entries.filter(_before(cursor, 'published_date', 'post_id'))
+    page = list(entries.order_by('-published_date', '-post_id').values_list('published_date', 'post_id')[:limit + 1])
+
+    pulled = list(
+        Follow.objects.filter(follower=user, author__is_high_fanout=True).values_list('author_id', flat=True)
+    )
+    if user.is_high_fanout:
+        pulled.append(user.pk)
+    if pulled:
+        posts = Post.objects.live().filter(author_id__in=pulled)
+        if cursor:
+            posts = posts.filter(_before(cursor, 'published_date', 'pk'))
+        page += list(posts.order_by('-published_date', '-pk').values_list('published_date', 'pk')[:limit + 1])
+        # Merge: a post can be in both if its author crossed the threshold later
+        page = sorted(set(page), reverse=True)
+
+    has_more = len(page) > limit
+    page = page[:limit]
+    next_cursor = encode_cursor(*page[-1]) if has_more and page else None
+    return [post_id for _, post_id in page], next_cursor
@@ -0,0 +1,181 @@
+# path: main_app/transfer.py
+"""
+Shared pieces of the export_ublog / import_ublog management commands.
+
+Each model is written to its own file (``<label>.ndjson`` or ``<label>.csv``)
+with one row per line, columns taken from the model's concrete fields so the
+format follows schema changes. Files are read and written as streams; nothing
+holds a whole table in memory.
+"""
+import csv
+import json
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import (
+    CustomUser,
+    Profile,
+    Post,
+    Comment,
+    Like,
+    Downvote,
+    ArchivedVote,
+    CommentLike,
+    CommentDownvote,
+    Follow,
+)
+
+# Dependency order: parents before children (comments are exported by id,
+# so a parent comment always precedes its replies).
+MODELS = [
+    ('users', CustomUser),
+    ('profiles', Profile),
+    ('posts', Post),
+    ('comments', Comment),
+    ('likes', Like),
+    ('downvotes', Downvote),
+    # Votes of archived posts: without them an unarchived post comes back with none
+    ('archived_votes', ArchivedVote),
+    ('comment_likes', CommentLike),
+    ('comment_downvotes', CommentDownvote),
+    # Timelines are not exported: import_ublog rebuilds them from the follows
+    ('follows', Follow),
+]
+
+FORMATS = ('ndjson', 'csv')
+
+
+def columns(model):
+    """Column names (FKs as ``<name>_id``) for a model's rows; the pk comes first."""
+    return [f.attname for f in model._meta.concrete_fields]
+
+
+@contextmanager
+def snapshot():
+    """
+    One read transaction for the whole export. Django runs MySQL and
+    PostgreSQL at READ COMMITTED, where each query sees the latest commits,
+    so the first statement raises this transaction to REPEATABLE READ (one
+    consistent view for every query). SQLite transactions are already
+    serializable.
+    """
+    with transaction.atomic():
+        if connection.vendor in ('mysql', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+def iter_batches(model, chunk_size):
+    """
+    Yield lists of value tuples in pk order using keyset pagination, so no
+    backend ever buffers more than one chunk (MySQL drivers fetch whole
+    result sets client-side, even under .iterator()).
+    """
+    qs = model.objects.order_by('pk').values_list(*columns(model))
+    last_pk = None
+    while True:
+        page = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1][0]
+
+
+# -------------------------------------------------------------------
+# Row encoding
+# -------------------------------------------------------------------
+def _plain(value):
+    # Full-precision ISO strings (DjangoJSONEncoder would drop microseconds)
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+class RowWriter:
+    def __init__(self, fh, fmt, cols):
+        self.fh = fh
+        self.fmt = fmt
+        self.cols = cols
+        if fmt == 'csv':
+            self._csv = csv.writer(fh)
+            self._csv.writerow(cols)
+
+    def write_many(self, rows):
+        if self.fmt == 'csv':
+            self._csv.writerows(['' if v is None else _plain(v) for v in row] for row in rows)
+        else:
+            self.fh.write(''.join(
+                json.dumps({c: _plain(v) for c, v in zip(self.cols, row)}) + '\n' for row in rows
+            ))
+
+
+def read_rows(fh, fmt, model):
+    """
+    Yield dicts of python values keyed by attname. CSV cells are strings, so
+    every value goes through ``field.to_python``; an empty cell is NULL only
+    for nullable fields.
+    """
+    fields = {f.attname: f for f in model._meta.concrete_fields}
+    if fmt == 'csv':
+        source = csv.DictReader(fh)
+    else:
+        source = (json.loads(line) for line in fh if line.strip())
+    for raw in source:
+        row = {}
+        for name, value in raw.items():
+            field = fields.get(name)
+            if field is None:
+                continue
+            if value == '' and fmt == 'csv' and field.null:
+                value = None
+            row[name] = None if value is None else field.to_python(value)
+        yield row
+
+
+# -------------------------------------------------------------------
+# Import helpers
+# -------------------------------------------------------------------
+@contextmanager
+def raw_timestamps(model):
+    """
+    Keep imported auto_now / auto_now_add values instead of letting
+    pre_save() stamp every row with the import time.
+    """
+    saved = []
+    for field in model._meta.concrete_fields:
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            saved.append((field, field.auto_now, field.auto_now_add))
+            field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def rebuild_comment_counters(comment_qs=None):
+    """Recompute Comment.like_count / downvote_count (and score) from the vote tables in three UPDATEs."""
+    comment_qs = Comment.objects.all() if comment_qs is None else comment_qs
+
+    def _count(vote_model):
+        return Coalesce(
+            Subquery(
+                vote_model.objects.filter(comment=OuterRef('pk'))
+                .order_by().values('comment').annotate(n=Count('id')).values('n')
+            ),
+            Value(0),
+        )
+
+    comment_qs.update(like_count=_count(CommentLike))
+    comment_qs.update(downvote_count=_count(CommentDownvote))
+    comment_qs.update(score=F('like_count') - F('downvote_count'))
+
+
+def create_missing_profiles(batch_size):
+    """post_save does not fire for bulk_create, so backfill any missing Profile rows."""
+    missing = list(CustomUser.objects.filter(profile__isnull=True).values_list('id', flat=True))
+    Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in missing], batch_size=batch_size)
+    return len(missing)
@@ -1,6 +1,6 @@
 # main_app/urls.py
 from django.urls import path
-from . import views
+from . import feeds, views
 
 urlpatterns = [
     # Landing / Auth
@@ -19,16 +19,33 @@ urlpatterns = [
 
     # Blog
     path('blog/', views.PostListView.as_view(), name='postlistview'),
+    path('blog/following/', views.following_view, name='following'),
+    path('blog/tag/<str:name>/', views.tag_view, name='tag_feed'),
     path('blog/<int:pk>/', views.PostDetailView.as_view(), name='postdetailview'),
     path('blog/add-post/', views.AddPostView.as_view(), name='addpostview'),
     path('blog/<int:pk>/update/', views.UpdatePostView.as_view(), name='updatePostView'),
     path('blog/<int:pk>/delete/', views.DeletePostView.as_view(), name='deletePostView'),
     path('blog/<int:pk>/add_comment_like/', views.add_comment_like, name='add_comment_like'),
+    path('blog/<int:pk>/events/', views.post_events, name='post_events'),
+    path('blog/<int:pk>/live/', views.post_live, name='post_live'),
+    path('blog/<int:pk>/body/', views.post_body, name='post_body'),
 
     # Profile
     path('profile/<int:pk>/', views.profile_view, name='profileview'),
     path('profile/<int:pk>/update/', views.update_profile, name='updateprofileview'),
+    path('profile/<int:pk>/follow/', views.follow_toggle, name='follow_toggle'),
+
+    # Notifications
+    path('notifications/', views.notifications_view, name='notifications'),
 
     # Search
     path('search/', views.search, name='search'),
+
+    # Ops
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('stats/', views.stats_view, name='stats'),
+
+    # Feeds (rss / atom / json)
+    path('feeds/<str:fmt>/', feeds.post_feed, name='post_feed'),
+    path('feeds/author/<int:author_pk>/<str:fmt>/', feeds.post_feed, name='author_feed'),
 ]
@@ -1,17 +1,28 @@
 # path: main_app/views.py
+import hashlib
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, DeleteView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Q, Exists, OuterRef, Value, BooleanField, Count, F
+from django.db.models import Q, OuterRef, Subquery, Value, Count, F, Max
+from django.db.models.functions import Coalesce
 from django.db import transaction
 from django.conf import settings
 from django.core.mail import send_mail
 from django.urls import reverse
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode, url_has_allowed_host_and_scheme
+from django.utils.http import (
+    urlsafe_base64_encode, urlsafe_base64_decode, url_has_allowed_host_and_scheme, http_date, quote_etag,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 from django.utils.encoding import force_bytes, force_str
+from django.utils.html import linebreaks
+from django.views.decorators.http import condition, require_POST, require_safe
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth.tokens import default_token_generator
 
@@ -24,9 +35,20 @@ from .models import (
     CommentLike,
     Downvote,
     CommentDownvote,
+    Profile,
+    Notification,
+    ArchivedVote,
+    Follow,
 )
 
 from .tokens import email_verification_token
+from . import memo, metrics
+from . import events
+from .events import get_broker, post_channel, publish_post_event
+from .notifications import notify, mark_all_read, recount_unread, unread_count, unread_recipients
+from .ratelimit import ratelimit
+from . import rollups, tags, threads, timeline
+from .votestate import apply_vote_state, forget as forget_vote_state
 
 
 # -------------------------------------------------------------------
@@ -127,20 +149,15 @@ def homeview(request):
     return render(request, "main_app/landing.html")
 
 
+@ratelimit('login', redirect_to='loginview')
 def loginview(request):
     if request.method == 'POST':
         identifier = request.POST.get('identifier')
         password = request.POST.get('password')
         user = None
         if identifier and password:
-            try:
-                if '@' in identifier:
-                    user_obj = CustomUser.objects.get(email__iexact=identifier)
-                else:
-                    user_obj = CustomUser.objects.get(username__iexact=identifier)
-                user = authenticate(request, username=user_obj.email, password=password)
-            except CustomUser.DoesNotExist:
-                user = None
+            # One user lookup + one hash (main_app/backends.py)
+            user = authenticate(request, identifier=identifier, password=password)
         if user is not None:
             if not user.is_active:
                 messages.error(request, "Your account is not active yet. Please verify your email before logging in.")
@@ -157,6 +174,7 @@ def logoutview(request):
     return redirect('loginview')
 
 
+@ratelimit('signup', redirect_to='signupview')
 def signupview(request):
     form = UserRegisterForm()
     if request.method == 'POST':
@@ -197,16 +215,14 @@ def verify_email(request, uidb64, token):
     return redirect('signupview')
 
 
+@ratelimit('resend_verification', redirect_to='resend_verification')
 def resend_verification_request(request):
     if request.method == "POST":
         identifier = (request.POST.get("identifier") or "").strip()
         if not identifier:
             messages.error(request, "Enter your email or username.")
             return redirect("resend_verification")
-        if "@" in identifier:
-            user = CustomUser.objects.filter(email__iexact=identifier).first()
-        else:
-            user = CustomUser.objects.filter(username__iexact=identifier).first()
+        user = CustomUser.objects.get_by_identifier(identifier)
         if not user:
             messages.info(request, "If an account exists, a verification link has been sent.")
             return redirect("loginview")
@@ -226,16 +242,14 @@ def resend_verification_request(request):
 # -------------------------------------------------------------------
 # Password reset (15-minute tokens)
 # -------------------------------------------------------------------
+@ratelimit('password_reset', redirect_to='password_reset_request')
 def password_reset_request(request):
     if request.method == "POST":
         identifier = (request.POST.get("identifier") or "").strip()
         if not identifier:
             messages.error(request, "Enter your email or username.")
             return redirect("password_reset_request")
-        if "@" in identifier:
-            user = CustomUser.objects.filter(email__iexact=identifier).first()
-        else:
-            user = CustomUser.objects.filter(username__iexact=identifier).first()
+        user = CustomUser.objects.get_by_identifier(identifier)
         if not user:
             messages.info(request, "If an account exists, a reset link has been sent.")
             return redirect("loginview")
@@ -284,110 +298,249 @@ def password_reset_confirm(request, uidb64, token):
 # -------------------------------------------------------------------
 @login_required
 def profile_view(request, pk):
-    custom_user = CustomUser.objects.get(id=pk)
+    # Profile rides along in the same query (bio is shown on the page)
+    custom_user = get_object_or_404(CustomUser.objects.select_related('profile'), id=pk)
     post_count = Post.objects.filter(author=custom_user).count()
-    like_count = Like.objects.filter(user=custom_user).count()
+    like_count = (
+        Like.objects.filter(user=custom_user).count()
+        + ArchivedVote.objects.filter(user=custom_user, value=ArchivedVote.UP).count()
+    )
     comment_count = Comment.objects.filter(user=custom_user).count()
+    is_following = (
+        custom_user.pk != request.user.pk
+        and Follow.objects.filter(follower=request.user, author=custom_user).exists()
+    )
     context = {
         'custom_user': custom_user,
         'post_count': post_count,
         'like_count': like_count,
         'comment_count': comment_count,
+        'is_following': is_following,
     }
     return render(request, 'main_app/profile.html', context=context)
 
 
+@login_required
+@require_POST
+@ratelimit('follow', redirect_to='postlistview')
+def follow_toggle(request, pk):
+    author = get_object_or_404(CustomUser.objects.only('id', 'username'), pk=pk)
+    if Follow.objects.filter(follower=request.user, author=author).exists():
+        timeline.unfollow(request.user, author)
+        messages.success(request, f"Unfollowed @{author.username}.")
+    elif timeline.follow(request.user, author):
+        messages.success(request, f"Following @{author.username}.")
+    return redirect('profileview', pk=pk)
+
+
 @login_required
 def update_profile(request, pk):
     if pk != request.user.id:
         return render(request, 'main_app/error.html')
-    cur_user_profile = {
-        'bio': request.user.profile.bio,
-        'linkedin_link': getattr(request.user.profile, 'linkedin_link', ''),
-    }
+    profile = get_object_or_404(Profile, user_id=request.user.id)
     if request.method == "POST":
-        profile_update_form = ProfileUpdateForm(request.POST, request.FILES, instance=request.user.profile)
+        profile_update_form = ProfileUpdateForm(request.POST, request.FILES, instance=profile)
         if profile_update_form.is_valid():
-            profile = profile_update_form.save(commit=False)
-            profile.user = request.user
-            profile.save()
+            # Only write when the bio actually changed
+            if profile_update_form.has_changed():
+                profile_update_form.save()
             messages.success(request, "Profile updated successfully")
             return redirect('profileview', pk=request.user.id)
     else:
-        profile_update_form = ProfileUpdateForm(initial=cur_user_profile)
+        profile_update_form = ProfileUpdateForm(instance=profile)
     return render(request, 'main_app/update.html', {'profile_update_form': profile_update_form})
 
 
+# -------------------------------------------------------------------
+# Conditional GET (ETag / Last-Modified)
+# -------------------------------------------------------------------
+class ConditionalGetMixin:
+    """
+    Answer GET with 304 Not Modified when the validators from get_validators()
+    match the request, before any queryset or context is built.
+    Pages are per-viewer, so responses are marked private and revalidated.
+    """
+
+    def get_validators(self):
+        """Return (etag, last_modified); either may be None."""
+        return None, None
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        etag = quote_etag(etag) if etag else None
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if etag and not response.has_header('ETag'):
+            response.headers['ETag'] = etag
+        if last_modified and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+
+def _viewer_tag(request):
+    # The nav shows the unread-notification badge, and the forms embed a CSRF token
+    # that login/logout rotate: both are part of the page version. A cached page with
+    # the old token would 403 on its next POST.
+    csrf = hashlib.sha1(request.META.get('CSRF_COOKIE', '').encode()).hexdigest()[:12]
+    if request.user.is_authenticated:
+        return f"u{request.user.pk}n{unread_count(request.user)}c{csrf}"
+    return f"anon-c{csrf}"
+
+
 # -------------------------------------------------------------------
 # Blog views with optimized score calculation
 # -------------------------------------------------------------------
-class PostListView(ListView):
+# Columns a feed card renders. Post bodies (content, content_html) and the
+# rest of the author row stay in the database; cards expand via post_body.
+CARD_FIELDS = (
+    'id', 'title', 'excerpt', 'excerpt_truncated', 'render_version', 'published_date', 'archived_at',
+    'tag_names', 'author__username',
+)
+
+
+def _per_post_count(model):
+    # Correlated COUNT per row: no JOIN fan-out and no GROUP BY over the selected columns
+    return Coalesce(
+        Subquery(
+            model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('pk')).values('n')
+        ),
+        Value(0),
+    )
+
+
+def card_queryset(qs):
+    """Narrow a Post queryset to what post_card.html needs, with score and comment count."""
+    return qs.select_related('author').only(*CARD_FIELDS).annotate(
+        vote_score=_per_post_count(Like) - _per_post_count(Downvote),
+        num_comments=_per_post_count(Comment),
+    )
+
+
+def card_list(qs, user):
+    """Evaluate a card queryset and mark the viewer's votes (see main_app/votestate.py)."""
+    return apply_vote_state(list(qs), user)
+
+
+class PostListView(ConditionalGetMixin, ListView):
     context_object_name = 'posts'
     model = Post
     template_name = 'main_app/postlist.html'
     ordering = ['-published_date']
 
-    def get_queryset(self):
-        qs = super().get_queryset().select_related('author')
+    def get_validators(self):
+        # Global content version: newest edit/activity + row count (catches deletes)
+        state = Post.objects.aggregate(newest=Max('modified_date'), total=Count('id'))
+        if state['newest'] is None:
+            return None, None
+        etag = f"feed-{state['newest'].timestamp():.6f}-{state['total']}-{_viewer_tag(self.request)}"
+        return etag, state['newest']
 
-        # Annotate with calculated score (likes - downvotes)
-        # Use 'vote_score' to avoid conflict with Post.score property
-        qs = qs.annotate(
-            vote_score=Count('like', distinct=True) - Count('downvote', distinct=True)
-        )
+    def get_queryset(self):
+        # Score is 'vote_score' to avoid clashing with the Post.score property
+        return card_queryset(super().get_queryset().live())
 
-        user = self.request.user
-        if user.is_authenticated:
-            liked_subq = Like.objects.filter(post=OuterRef('pk'), user=user)
-            downvoted_subq = Downvote.objects.filter(post=OuterRef('pk'), user=user)
-            return qs.annotate(
-                user_liked=Exists(liked_subq),
-                user_downvoted=Exists(downvoted_subq),
-            )
-        return qs.annotate(
-            user_liked=Value(False, output_field=BooleanField()),
-            user_downvoted=Value(False, output_field=BooleanField()),
-        )
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['posts'] = ctx['object_list'] = card_list(ctx['object_list'], self.request.user)
+        return ctx
 
 
-class PostDetailView(LoginRequiredMixin, DetailView):
+class PostDetailView(LoginRequiredMixin, ConditionalGetMixin, DetailView):
     context_object_name = 'post'
     model = Post
     template_name = 'main_app/postdetail.html'
 
+    def get_validators(self):
+        # Single PK lookup; a miss falls through to the normal 404
+        modified = Post.objects.filter(pk=self.kwargs['pk']).values_list('modified_date', flat=True).first()
+        if modified is None:
+            return None, None
+        etag = f"post-{self.kwargs['pk']}-{modified.timestamp():.6f}-{_viewer_tag(self.request)}"
+        return etag, modified
+
+    def get_queryset(self):
+        # Live score rides along with the row (archived posts use their frozen archived_score)
+        return super().get_queryset().annotate(vote_score=_per_post_count(Like) - _per_post_count(Downvote))
+
     def get_object(self, queryset=None):
-        # Get the post and annotate with user vote status
         post = super().get_object(queryset)
+        # Shared with everything else on the page (main_app/memo.py): the author
+        # is the viewer or a commenter often enough to save a query
+        memo.remember(post)
+        memo.attach([post], 'author')
 
-        # Add user_liked and user_downvoted as attributes
-        user = self.request.user
-        if user.is_authenticated:
-            post.user_liked = Like.objects.filter(post=post, user=user).exists()
-            post.user_downvoted = Downvote.objects.filter(post=post, user=user).exists()
-        else:
-            post.user_liked = False
-            post.user_downvoted = False
-
+        # Add user_liked and user_downvoted as attributes (live or archived votes alike)
+        apply_vote_state([post], self.request.user)
         return post
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         post = self.object
         user = self.request.user
+        ctx['score'] = post.archived_score if post.archived else post.vote_score
+
+        # Whole thread in two queries, in the requested order (main_app/threads.py)
+        sort = self.request.GET.get('sort')
+        if sort not in threads.SORTS:
+            sort = threads.default_sort()
+        ctx['comments'], ctx['comment_count'] = threads.load(post, sort, user)
+        ctx['comment_sort'] = sort
+        ctx['comment_sorts'] = list(threads.SORTS)
+        ctx['live_events'] = events.enabled()
+        ctx['live_poll_seconds'] = getattr(settings, 'UBLOG_LIVE_POLL_SECONDS', 20)
+        return ctx
 
-        # Calculate score efficiently
-        likes = Like.objects.filter(post=post).count()
-        downvotes = Downvote.objects.filter(post=post).count()
-        ctx['score'] = likes - downvotes
 
-        # Annotate comments with user vote status
-        if user.is_authenticated:
-            comments = post.comments.select_related('user').prefetch_related('children')
-            for comment in comments:
-                comment.user_liked = CommentLike.objects.filter(comment=comment, user=user).exists()
-                comment.user_downvoted = CommentDownvote.objects.filter(comment=comment, user=user).exists()
+def _post_body_etag(request, pk):
+    modified = Post.objects.filter(pk=pk).values_list('modified_date', flat=True).first()
+    return f"body-{pk}-{modified.timestamp():.6f}" if modified else None
 
-        return ctx
+
+@login_required
+def following_view(request):
+    """Home timeline: posts from followed authors, keyset-paginated by ?before=<cursor>."""
+    cursor = timeline.decode_cursor(request.GET.get('before'))
+    page_size = getattr(settings, 'UBLOG_TIMELINE_PAGE_SIZE', 20)
+    post_ids, next_cursor = timeline.read(request.user, cursor, page_size)
+    cards = card_queryset(Post.objects.live().filter(pk__in=post_ids)).in_bulk()
+    posts = apply_vote_state([cards[pk] for pk in post_ids if pk in cards], request.user)
+    return render(request, 'main_app/following.html', {'posts': posts, 'next_cursor': next_cursor})
+
+
+@require_safe
+def tag_view(request, name):
+    """Live posts carrying one tag, keyset-paginated by ?before=<cursor> (main_app/tags.py)."""
+    tag = tags.get(name)
+    if tag is None:
+        raise Http404
+    cursor = timeline.decode_cursor(request.GET.get('before'))
+    page_size = getattr(settings, 'UBLOG_TAG_PAGE_SIZE', 20)
+    post_ids, next_cursor = tags.page(tag, cursor, page_size)
+    cards = card_queryset(Post.objects.live().filter(pk__in=post_ids)).in_bulk()
+    posts = apply_vote_state([cards[pk] for pk in post_ids if pk in cards], request.user)
+    return render(request, 'main_app/tag.html', {'tag': tag, 'posts': posts, 'next_cursor': next_cursor})
+
+
+@login_required
+@require_safe
+@condition(etag_func=_post_body_etag)
+def post_body(request, pk):
+    """Full rendered body of one post, fetched when a feed card is expanded."""
+    row = Post.objects.filter(pk=pk).values('content_html', 'render_version').first()
+    if row is None:
+        raise Http404
+    html = row['content_html']
+    if not row['render_version']:
+        # Not rendered yet (see rerender_content): plain text
+        html = linebreaks(Post.objects.filter(pk=pk).values_list('content', flat=True).first(), autoescape=True)
+    response = HttpResponse(html, content_type='text/html; charset=utf-8')
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 class AddPostView(LoginRequiredMixin, CreateView):
@@ -396,9 +549,13 @@ class AddPostView(LoginRequiredMixin, CreateView):
     template_name = 'main_app/addpost.html'
     context_object_name = 'post'
 
+    @transaction.atomic
     def form_valid(self, form):
         form.instance.author = self.request.user
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        tags.set_tags(self.object, form.cleaned_data['tags'])
+        timeline.post_created(self.object)
+        return response
 
 
 class UpdatePostView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
@@ -407,9 +564,12 @@ class UpdatePostView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     template_name = 'main_app/addpost.html'
     context_object_name = 'post'
 
+    @transaction.atomic
     def form_valid(self, form):
         form.instance.author = self.request.user
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        tags.set_tags(self.object, form.cleaned_data['tags'])
+        return response
 
     def test_func(self):
         post = self.get_object()
@@ -422,6 +582,16 @@ class DeletePostView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     context_object_name = 'post'
     success_url = "/blog"
 
+    @transaction.atomic
+    def form_valid(self, form):
+        # Un-index first so the tag counts drop with the post
+        tags.posts_removed([self.object.pk])
+        recipients = unread_recipients([self.object.pk])
+        response = super().form_valid(form)
+        # Its notifications went with it (cascade): fix those users' unread badges
+        recount_unread(recipients)
+        return response
+
     def test_func(self):
         post = self.get_object()
         return bool(self.request.user == post.author)
@@ -429,33 +599,18 @@ class DeletePostView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
 
 def search(request):
     query = (request.GET.get('q') or "").strip()
-    results = Post.objects.none()
+    results = []
+    topic = tags.get(query) if query.startswith('#') else None
+    if topic is not None:
+        # '#python' is a topic, served by its tag page instead of a LIKE scan
+        return redirect('tag_feed', name=topic.name)
     if query:
+        # Matching still reads content in the WHERE clause, but it is not shipped back
         base = (
-            Post.objects.filter(Q(title__icontains=query) | Q(content__icontains=query))
-            .select_related('author')
+            Post.objects.live().filter(Q(title__icontains=query) | Q(content__icontains=query))
             .order_by('-published_date')
         )
-
-        # Annotate with calculated score
-        # Use 'vote_score' to avoid conflict with Post.score property
-        base = base.annotate(
-            vote_score=Count('like', distinct=True) - Count('downvote', distinct=True)
-        )
-
-        user = request.user
-        if user.is_authenticated:
-            liked_subq = Like.objects.filter(post=OuterRef('pk'), user=user)
-            downvoted_subq = Downvote.objects.filter(post=OuterRef('pk'), user=user)
-            results = base.annotate(
-                user_liked=Exists(liked_subq),
-                user_downvoted=Exists(downvoted_subq),
-            )
-        else:
-            results = base.annotate(
-                user_liked=Value(False, output_field=BooleanField()),
-                user_downvoted=Value(False, output_field=BooleanField()),
-            )
+        results = card_list(card_queryset(base), request.user)
     return render(request, 'main_app/search.html', {'results': results, 'query': query})
 
 
@@ -463,6 +618,7 @@ def search(request):
 # ATOMIC Likes / comments with safe 'next' redirect
 # -------------------------------------------------------------------
 @login_required
+@ratelimit('vote')
 @transaction.atomic
 def add_comment_like(request, pk):
     """
@@ -479,54 +635,75 @@ def add_comment_like(request, pk):
         next_url = None
 
     if request.method == 'POST':
+        # Lock the post row first: serializes votes on it and orders them against archive_posts.
+        # The wait is recorded so load tests can see contention (scripts/loadtest.py).
+        with metrics.timed('votes.post_lock'):
+            post = get_object_or_404(Post.objects.select_for_update().only('id', 'author_id', 'archived_at'), pk=pk)
+        if post.archived:
+            messages.error(request, "This post is archived and can no longer be voted or commented on.")
+            return redirect(next_url) if next_url else _redirect_default()
+
         if 'comment_button' in request.POST:
-            # Lock the post row for update
-            post = Post.objects.select_for_update().get(id=pk)
             parent_id = request.POST.get('parent_id')
             parent = get_object_or_404(Comment, id=parent_id, post=post) if parent_id else None
             comment_text = (request.POST.get('comment_text') or '').strip()
             if comment_text:
-                Comment.objects.create(post=post, user=request.user, content=comment_text, parent=parent)
+                comment = Comment.objects.create(post=post, user=request.user, content=comment_text, parent=parent)
+                threads.reply_added(comment)
                 messages.success(request, "Comment added")
+                if parent is not None:
+                    notify(parent.user_id, Notification.REPLY, request.user.id, pk, parent.pk)
+                if events.enabled():
+                    publish_post_event(pk, 'comment', {
+                        'id': comment.pk,
+                        'parent_id': comment.parent_id,
+                        # No request: the fragment goes to every viewer and must not carry this user's CSRF token
+                        'html': render_to_string(
+                            'main_app/partials/comment_item.html', {'node': comment, 'post_id': pk, 'live': True}
+                        ),
+                    })
             else:
                 messages.error(request, "Please write something before posting.")
 
         elif 'like_button' in request.POST:
-            # Lock the post row to prevent race conditions
-            post_obj = Post.objects.select_for_update().get(id=pk)
-
             # Remove any downvote first (atomic)
-            Downvote.objects.filter(post=post_obj, user=request.user).delete()
+            delta = Downvote.objects.filter(post=post, user=request.user).delete()[0]
 
             # Toggle like
-            like_obj = Like.objects.filter(post=post_obj, user=request.user).first()
+            like_obj = Like.objects.filter(post=post, user=request.user).first()
             if like_obj:
                 like_obj.delete()
+                delta -= 1
             else:
-                Like.objects.create(post=post_obj, user=request.user)
+                Like.objects.create(post=post, user=request.user)
+                delta += 1
+                notify(post.author_id, Notification.LIKE, request.user.id, pk)
+            publish_post_event(pk, 'score', {'delta': delta})
 
         elif 'downvote_button' in request.POST:
-            # Lock the post row to prevent race conditions
-            post_obj = Post.objects.select_for_update().get(id=pk)
-
             # Remove any like first (atomic)
-            Like.objects.filter(post=post_obj, user=request.user).delete()
+            delta = -Like.objects.filter(post=post, user=request.user).delete()[0]
 
             # Toggle downvote
-            dv = Downvote.objects.filter(post=post_obj, user=request.user).first()
+            dv = Downvote.objects.filter(post=post, user=request.user).first()
             if dv:
                 dv.delete()
+                delta += 1
             else:
-                Downvote.objects.create(post=post_obj, user=request.user)
+                Downvote.objects.create(post=post, user=request.user)
+                delta -= 1
+            publish_post_event(pk, 'score', {'delta': delta})
 
         elif 'comment_like' in request.POST:
             c_id = request.POST.get('comment_id')
             if c_id:
                 # Lock the comment row
-                comment = Comment.objects.select_for_update().get(id=c_id, post_id=pk)
+                with metrics.timed('votes.comment_lock'):
+                    comment = Comment.objects.select_for_update().get(id=c_id, post_id=pk)
 
-                # Remove any downvote first (atomic)
-                CommentDownvote.objects.filter(comment=comment, user=request.user).delete()
+                # Remove any downvote first (atomic); queryset delete skips the counter refresh
+                if CommentDownvote.objects.filter(comment=comment, user=request.user).delete()[0]:
+                    comment.update_downvote_count()
 
                 # Toggle like
                 cl = CommentLike.objects.filter(comment=comment, user=request.user).first()
@@ -534,15 +711,19 @@ def add_comment_like(request, pk):
                     cl.delete()
                 else:
                     CommentLike.objects.create(comment=comment, user=request.user)
+                comment.refresh_from_db(fields=['like_count', 'downvote_count', 'score'])
+                publish_post_event(pk, 'comment_score', {'id': comment.pk, 'score': comment.score})
 
         elif 'comment_downvote' in request.POST:
             c_id = request.POST.get('comment_id')
             if c_id:
                 # Lock the comment row
-                comment = Comment.objects.select_for_update().get(id=c_id, post_id=pk)
+                with metrics.timed('votes.comment_lock'):
+                    comment = Comment.objects.select_for_update().get(id=c_id, post_id=pk)
 
-                # Remove any like first (atomic)
-                CommentLike.objects.filter(comment=comment, user=request.user).delete()
+                # Remove any like first (atomic); queryset delete skips the counter refresh
+                if CommentLike.objects.filter(comment=comment, user=request.user).delete()[0]:
+                    comment.update_like_count()
 
                 # Toggle downvote
                 cd = CommentDownvote.objects.filter(comment=comment, user=request.user).first()
@@ -550,5 +731,135 @@ def add_comment_like(request, pk):
                     cd.delete()
                 else:
                     CommentDownvote.objects.create(comment=comment, user=request.user)
+                comment.refresh_from_db(fields=['like_count', 'downvote_count', 'score'])
+                publish_post_event(pk, 'comment_score', {'id': comment.pk, 'score': comment.score})
+
+        # Invalidate conditional-GET validators for this post and the feed
+        Post.touch(pk)
+        if 'like_button' in request.POST or 'downvote_button' in request.POST:
+            forget_vote_state(request.user.pk)
+
+    return redirect(next_url) if next_url else _redirect_default()
+
+
+# -------------------------------------------------------------------
+# Notifications
+# -------------------------------------------------------------------
+@login_required
+def notifications_view(request):
+    items = list(
+        Notification.objects.filter(recipient=request.user)
+        .select_related('actor', 'post')
+        .order_by('-updated_at')[:50]
+    )
+    if any(not n.is_read for n in items):
+        mark_all_read(request.user)
+    return render(request, 'main_app/notifications.html', {'notifications': items})
+
+
+# -------------------------------------------------------------------
+# Live updates: Server-Sent Events (async; ASGI only, UBLOG_LIVE_EVENTS),
+# or short polling everywhere else
+# -------------------------------------------------------------------
+async def post_events(request, pk):
+    """
+    One long-lived idle connection per open post page. Pushes score deltas,
+    comment score changes and rendered comment fragments for post ``pk``.
+    """
+    if not events.enabled():
+        raise Http404("Live events are off")
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=403)
+    if not await Post.objects.filter(pk=pk).aexists():
+        raise Http404("No such post")
+
+    async def stream():
+        yield "retry: 5000\n\n"
+        async for event in get_broker().subscribe(post_channel(pk)):
+            if event is None:
+                yield ": ping\n\n"
+            else:
+                yield f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _live_after(request):
+    try:
+        return max(int(request.GET.get('after', 0)), 0)
+    except ValueError:
+        return 0
+
+
+def _post_live_etag(request, pk):
+    # Votes and comments bump modified_date (Post.touch), so an idle post answers 304 from one lookup
+    modified = Post.objects.filter(pk=pk).values_list('modified_date', flat=True).first()
+    if modified is None:
+        return None
+    return f"live-{pk}-{modified.timestamp():.6f}-{_live_after(request)}-u{request.user.pk}"
+
+
+@login_required
+@require_safe
+@condition(etag_func=_post_live_etag)
+def post_live(request, pk):
+    """
+    Short-polling counterpart of post_events: the post's score and the comments
+    newer than ?after=<comment id>, rendered for this viewer. Reads the
+    database, so it works under WSGI and across workers.
+    """
+    post = (
+        Post.objects.filter(pk=pk).only('id', 'archived_at', 'archived_score')
+        .annotate(vote_score=_per_post_count(Like) - _per_post_count(Downvote)).first()
+    )
+    if post is None:
+        raise Http404
+    limit = getattr(settings, 'UBLOG_LIVE_POLL_MAX_COMMENTS', 50)
+    new = list(Comment.objects.filter(post_id=pk, pk__gt=_live_after(request)).order_by('pk')[:limit])
+    memo.attach(new, 'user')
+    response = JsonResponse({
+        'score': post.archived_score if post.archived else post.vote_score,
+        'comments': [
+            {
+                'id': comment.pk,
+                'parent_id': comment.parent_id,
+                # This viewer's own request: the fragment carries their CSRF token, nobody else's
+                'html': render_to_string(
+                    'main_app/partials/comment_item.html', {'node': comment, 'post_id': pk}, request=request
+                ),
+            }
+            for comment in new
+        ],
+    })
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# -------------------------------------------------------------------
+# Per-worker counters (staff only)
+# -------------------------------------------------------------------
+@user_passes_test(lambda u: u.is_staff)
+def metrics_view(request):
+    return JsonResponse(metrics.snapshot())
+
 
-    return redirect(next_url) if next_url else _redirect_default()
\ No newline at end of file
+# -------------------------------------------------------------------
+# Activity summaries (staff only; read from the rollup tables)
+# -------------------------------------------------------------------
+@user_passes_test(lambda u: u.is_staff)
+def stats_view(request):
+    try:
+        days = max(1, min(int(request.GET.get('days', 7)), 90))
+    except ValueError:
+        days = 7
+    return JsonResponse({
+        'watermark': rollups.watermark(),
+        'days': days,
+        'top_posts': rollups.top_posts(days),
+        'top_commenters': rollups.top_commenters(days),
+        'site_daily': rollups.site_daily(days),
+    })
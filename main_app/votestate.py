@@ -0,0 +1,148 @@
+# path: main_app/votestate.py
+"""
+The viewer's own votes on a batch of posts.
+
+Every page that renders post cards needs to know which posts the viewer has
+liked or downvoted. ``vote_state(user, post_ids)`` answers that for any list
+of ids with one query. The query is a UNION ALL over Like, Downvote and
+ArchivedVote, each filtered by (user, post__in) and served by the table's
+(user, post) unique index. So feeds need no correlated EXISTS per row, and
+archived posts need no special case.
+
+With a shared cache (UBLOG_VOTE_STATE_CACHE, set when UBLOG_REDIS_URL is),
+answers are kept per user for UBLOG_VOTE_STATE_TTL seconds as
+{post_id: +1 / -1 / 0}, so paging back and forth or reloading a page costs
+no query at all. Archiving moves votes between tables but does not change
+them, so it leaves the cache alone. Without a shared cache every request runs
+the query: a per-process cache would keep serving a vote the user toggled on
+another worker.
+
+Entries are keyed by a per-user generation, which a vote toggle bumps once it
+commits (``forget``). Deleting the entry instead would race: a request that
+read the old votes before the commit could write them back after the delete.
+With a new generation, that write lands under a key nobody reads any more.
+
+Comment votes (``apply_comment_vote_state``) use the same one-query UNION,
+without the cache: a thread is read once per page view.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import IntegerField, Value
+
+from . import memo, metrics
+from .models import ArchivedVote, CommentDownvote, CommentLike, Downvote, Like
+
+UP, DOWN, NONE = ArchivedVote.UP, ArchivedVote.DOWN, 0
+
+
+def _cache():
+    alias = getattr(settings, 'UBLOG_VOTE_STATE_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def generation_key(user_id):
+    return f'ublog:votes:gen:{user_id}'
+
+
+def cache_key(user_id, generation):
+    return f'ublog:votes:{user_id}:{generation}'
+
+
+def _generation(cache, user_id):
+    key = generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock, so a generation lost to eviction never comes back as an old number
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _query(user_id, post_ids):
+    likes = Like.objects.filter(user_id=user_id, post_id__in=post_ids).values_list(
+        'post_id', Value(UP, output_field=IntegerField()),
+    )
+    downvotes = Downvote.objects.filter(user_id=user_id, post_id__in=post_ids).values_list(
+        'post_id', Value(DOWN, output_field=IntegerField()),
+    )
+    archived = ArchivedVote.objects.filter(user_id=user_id, post_id__in=post_ids).values_list('post_id', 'value')
+    return dict(likes.union(downvotes, archived, all=True).order_by())
+
+
+def vote_state(user, post_ids):
+    """
+    Return (liked, downvoted): the subsets of ``post_ids`` the user has voted
+    up or down. Anonymous users get two empty sets, without a query.
+    """
+    post_ids = set(post_ids)
+    if not post_ids or not user.is_authenticated:
+        return set(), set()
+
+    cache = _cache()
+    key = cache_key(user.pk, _generation(cache, user.pk)) if cache else None
+    # The same dict serves later calls in this request (main_app/memo.py)
+    known = memo.memoize(('votes', user.pk), lambda: (cache.get(key) if cache else None) or {})
+    missing = post_ids.difference(known)
+    if missing:
+        metrics.incr('votes.state_miss')
+        found = _query(user.pk, missing)
+        known.update({pk: found.get(pk, NONE) for pk in missing})
+        # Keep the entry small: a long scroll only retains the posts it last needed
+        if len(known) > getattr(settings, 'UBLOG_VOTE_STATE_MAX_POSTS', 1000):
+            for pk in set(known).difference(post_ids):
+                del known[pk]
+        if cache:
+            cache.set(key, known, getattr(settings, 'UBLOG_VOTE_STATE_TTL', 60))
+    else:
+        metrics.incr('votes.state_hit')
+
+    liked = {pk for pk in post_ids if known[pk] == UP}
+    downvoted = {pk for pk in post_ids if known[pk] == DOWN}
+    return liked, downvoted
+
+
+def apply_vote_state(posts, user):
+    """Set ``user_liked`` / ``user_downvoted`` on each post (what post_card.html reads); returns ``posts``."""
+    liked, downvoted = vote_state(user, [post.pk for post in posts])
+    for post in posts:
+        post.user_liked = post.pk in liked
+        post.user_downvoted = post.pk in downvoted
+    return posts
+
+
+def forget(user_id):
+    """Start a new generation of a user's cached vote state once the current transaction commits."""
+    memo.forget(('votes', user_id))
+    cache = _cache()
+    if cache:
+        transaction.on_commit(lambda: _bump(cache, user_id))
+
+
+def _bump(cache, user_id):
+    key = generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Never read (or evicted): any reader will start from a later clock value
+        cache.add(key, time.time_ns(), None)
+
+
+def apply_comment_vote_state(comments, user):
+    """Set ``user_liked`` / ``user_downvoted`` on each comment (what comment_item.html reads)."""
+    found = {}
+    if comments and user.is_authenticated:
+        ids = [comment.pk for comment in comments]
+        likes = CommentLike.objects.filter(user_id=user.pk, comment_id__in=ids).values_list(
+            'comment_id', Value(UP, output_field=IntegerField()),
+        )
+        downvotes = CommentDownvote.objects.filter(user_id=user.pk, comment_id__in=ids).values_list(
+            'comment_id', Value(DOWN, output_field=IntegerField()),
+        )
+        found = dict(likes.union(downvotes, all=True).order_by())
+    for comment in comments:
+        comment.user_liked = found.get(comment.pk) == UP
+        comment.user_downvoted = found.get(comment.pk) == DOWN
+    return comments
@@ -0,0 +1,425 @@
+"""
+Load generator for a running UBlog (runserver, gunicorn, uvicorn, ...).
+
+Concurrent clients replay a weighted mix of:
+- feed:    anonymous GET /blog/
+- detail:  logged-in GET /blog/<pk>/
+- search:  GET /search/?q=<term>
+- vote:    like / downvote toggles through add_comment_like (the
+           select_for_update path)
+- comment: comment posts through add_comment_like
+
+Every client keeps two keep-alive connections, one anonymous and one logged
+in, each with its own cookie jar. Redirects are not followed, so a vote costs
+one request. Each --clients value is a stage of --duration seconds. The first
+--warmup seconds of a stage are not recorded.
+
+Per stage the harness prints:
+- throughput and error rate
+- per-operation latency percentiles, plus a latency histogram
+- lock waits: how long the vote path waited for its row locks, read from
+  /metrics/ (votes.post_lock / votes.comment_lock; needs --staff). These are
+  per worker, so run a single worker process when you need exact numbers.
+- with --mysql-status, InnoDB's own row-lock wait counters, read over the
+  server's database settings
+
+Throughput that stops rising while vote latency and lock waits keep climbing
+is the contention ceiling. --hot-posts 1 sends every vote and comment to the
+newest post, which is the worst case.
+
+Rate limits count every client as one IP, so start the server with
+UBLOG_RATELIMIT_ENABLED=0. Rate-limited responses (429) are reported on their
+own line, not as errors. Accounts come from --create-users, which seeds active
+``loadtest<N>`` users through the ORM. Run it from the repository root with
+the server's DJANGO_SETTINGS_MODULE / UBLOG_ENV:
+
+    python scripts/loadtest.py --create-users 64 --password loadtest-pw
+    python scripts/loadtest.py --url http://127.0.0.1:8000 --password loadtest-pw \\
+        --clients 1 4 16 64 --duration 30 --staff admin:secret --hot-posts 1
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MIX = 'feed=45,detail=25,search=10,vote=15,comment=5'
+OPERATIONS = ('feed', 'detail', 'search', 'vote', 'comment')
+SEARCH_TERMS = ('the', 'post', 'django', 'hello', 'blog', 'a', 'zzz-no-match')
+# Histogram bucket upper bounds, milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+LOCK_TIMINGS = ('votes.post_lock', 'votes.comment_lock')
+
+_POST_LINK_RE = re.compile(r'/blog/(\d+)/')
+
+
+# -------------------------------------------------------------------
+# HTTP client
+# -------------------------------------------------------------------
+class Session:
+    """One keep-alive connection with its own cookie jar. Redirects are returned, not followed."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.base_url = base_url.rstrip('/')
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self.cookies = {}
+        self.conn = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, form=None):
+        headers = {'Host': self.netloc, 'User-Agent': 'ublog-loadtest'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        body = None
+        if form is not None:
+            body = urlencode(dict(form, csrfmiddlewaretoken=self.cookies.get('csrftoken', '')))
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['Referer'] = self.base_url + path  # checked by CSRF over HTTPS
+        for attempt in (0, 1):
+            reused = self.conn is not None
+            if self.conn is None:
+                self.conn = self._connect()
+            try:
+                self.conn.request(method, path, body, headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                # Only a keep-alive connection the server already closed is retried
+                if attempt or not reused:
+                    raise
+        for header in response.msg.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                if morsel.value and morsel['max-age'] != '0':
+                    self.cookies[name] = morsel.value
+                else:
+                    self.cookies.pop(name, None)
+        return response.status, data
+
+    def login(self, identifier, password):
+        self.request('GET', '/login/')
+        status, _ = self.request('POST', '/login/', {'identifier': identifier, 'password': password})
+        if status != 302:
+            raise RuntimeError(f"Login failed for {identifier!r} (HTTP {status})")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+# -------------------------------------------------------------------
+# Setup
+# -------------------------------------------------------------------
+def _django():
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'UBlog.settings')
+    import django
+    django.setup()
+
+
+def create_users(count, prefix, password):
+    """Seed ``count`` active accounts (one hash, shared) and their profiles; existing names are kept."""
+    _django()
+    from django.contrib.auth.hashers import make_password
+
+    from main_app.models import CustomUser
+    from main_app.transfer import create_missing_profiles
+
+    names = [f'{prefix}{i}' for i in range(count)]
+    existing = set(CustomUser.objects.filter(username__in=names).values_list('username', flat=True))
+    encoded = make_password(password)
+    CustomUser.objects.bulk_create(
+        [CustomUser(username=n, email=f'{n}@loadtest.invalid', password=encoded, is_active=True)
+         for n in names if n not in existing],
+        batch_size=1000,
+    )
+    create_missing_profiles(1000)
+    return len(names) - len(existing)
+
+
+def discover_posts(session):
+    status, body = session.request('GET', '/blog/')
+    if status != 200:
+        raise RuntimeError(f"GET /blog/ returned HTTP {status}")
+    # Feed order: newest first
+    ids = list(dict.fromkeys(int(pk) for pk in _POST_LINK_RE.findall(body.decode('utf-8', 'replace'))))
+    if not ids:
+        raise RuntimeError("The feed has no posts to read or vote on; create some first.")
+    return ids
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r} (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one positive weight")
+    return mix
+
+
+# -------------------------------------------------------------------
+# Workload
+# -------------------------------------------------------------------
+class Client:
+    """One simulated user: an anonymous and a logged-in connection plus its own RNG."""
+
+    def __init__(self, args, identifier, post_ids, seed):
+        self.anon = Session(args.url, args.timeout)
+        self.user = Session(args.url, args.timeout)
+        self.user.login(identifier, args.password)
+        self.post_ids = post_ids
+        self.hot_ids = post_ids[:args.hot_posts] if args.hot_posts else post_ids
+        self.rng = random.Random(seed)
+
+    def run(self, op):
+        """Perform one operation; returns (HTTP status, expected status)."""
+        rng = self.rng
+        if op == 'feed':
+            return self.anon.request('GET', '/blog/')[0], 200
+        if op == 'detail':
+            return self.user.request('GET', f'/blog/{rng.choice(self.post_ids)}/')[0], 200
+        if op == 'search':
+            return self.anon.request('GET', '/search/?' + urlencode({'q': rng.choice(SEARCH_TERMS)}))[0], 200
+        pk = rng.choice(self.hot_ids)
+        if op == 'vote':
+            form = {rng.choice(('like_button', 'downvote_button')): '1'}
+        else:
+            form = {'comment_button': '1', 'comment_text': f'load test comment {rng.getrandbits(32):08x}'}
+        return self.user.request('POST', f'/blog/{pk}/add_comment_like/', form)[0], 302
+
+    def close(self):
+        self.anon.close()
+        self.user.close()
+
+
+def _new_record():
+    return {'latencies': [], 'errors': 0, 'limited': 0}
+
+
+def run_stage(clients, mix, duration, warmup):
+    names, weights = list(mix), list(mix.values())
+    records = [{op: _new_record() for op in names} for _ in clients]
+    start = time.perf_counter()
+    record_from, deadline = start + warmup, start + warmup + duration
+
+    def worker(client, record):
+        while True:
+            op = client.rng.choices(names, weights)[0]
+            began = time.perf_counter()
+            if began >= deadline:
+                return
+            try:
+                status, expected = client.run(op)
+            except (http.client.HTTPException, OSError):
+                status, expected = None, 0
+            ended = time.perf_counter()
+            if began < record_from:
+                continue
+            rec = record[op]
+            rec['latencies'].append(ended - began)
+            if status == 429:
+                rec['limited'] += 1
+            elif status != expected:
+                rec['errors'] += 1
+
+    threads = [threading.Thread(target=worker, args=pair, daemon=True) for pair in zip(clients, records)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    merged = {op: _new_record() for op in names}
+    for record in records:
+        for op, rec in record.items():
+            merged[op]['latencies'].extend(rec['latencies'])
+            merged[op]['errors'] += rec['errors']
+            merged[op]['limited'] += rec['limited']
+    return merged
+
+
+# -------------------------------------------------------------------
+# Server-side lock counters
+# -------------------------------------------------------------------
+def lock_metrics(staff):
+    """{timing: (count, total seconds)} from /metrics/, or None without a staff session."""
+    if staff is None:
+        return None
+    status, body = staff.request('GET', '/metrics/')
+    if status != 200:
+        return None
+    timings = json.loads(body).get('timings', {})
+    return {
+        name: (timings[name]['count'], timings[name]['avg_ms'] * timings[name]['count'] / 1000)
+        for name in LOCK_TIMINGS if name in timings
+    }
+
+
+def mysql_lock_status():
+    """InnoDB row-lock counters (MySQL / MariaDB only), or None."""
+    from django.db import connection
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN "
+                       "('Innodb_row_lock_waits', 'Innodb_row_lock_time', 'Innodb_deadlocks')")
+        return {name: int(value) for name, value in cursor.fetchall()}
+
+
+# -------------------------------------------------------------------
+# Report
+# -------------------------------------------------------------------
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def histogram(latencies, width=40):
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for seconds in latencies:
+        ms = seconds * 1000
+        counts[next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))] += 1
+    used = [i for i, n in enumerate(counts) if n]
+    if not used:
+        return []
+    peak = max(counts)
+    labels = [f'<= {bound} ms' for bound in BUCKETS_MS] + [f'> {BUCKETS_MS[-1]} ms']
+    return [
+        f"  {labels[i]:>11} {'#' * round(counts[i] / peak * width):<{width}} {counts[i]}"
+        for i in range(used[0], used[-1] + 1)
+    ]
+
+
+def report(n_clients, results, duration, locks, mysql):
+    every = [s for rec in results.values() for s in rec['latencies']]
+    total = len(every)
+    errors = sum(rec['errors'] for rec in results.values())
+    limited = sum(rec['limited'] for rec in results.values())
+    rps = total / duration
+    print(f"\n== {n_clients} clients, {duration:.0f}s: {total} requests, {rps:.1f} req/s, "
+          f"errors {errors} ({errors / total * 100 if total else 0:.2f}%), rate-limited {limited}")
+    print(f"{'op':<8} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+    for op, rec in results.items():
+        ordered = sorted(rec['latencies'])
+        if not ordered:
+            continue
+        print(f"{op:<8} {len(ordered):>7} {len(ordered) / duration:>8.1f} "
+              f"{_percentile(ordered, .5) * 1000:>8.1f} {_percentile(ordered, .95) * 1000:>8.1f} "
+              f"{_percentile(ordered, .99) * 1000:>8.1f} {ordered[-1] * 1000:>8.1f} {rec['errors']:>7}")
+    print("latency histogram (all operations):")
+    for line in histogram(every):
+        print(line)
+
+    summary = {
+        'clients': n_clients, 'requests': total, 'rps': rps, 'errors': errors, 'limited': limited,
+        'p95_ms': _percentile(sorted(every), .95) * 1000,
+        'vote_p95_ms': _percentile(sorted(results.get('vote', _new_record())['latencies']), .95) * 1000,
+        'lock_waits': locks, 'mysql': mysql,
+    }
+    for name, (count, seconds) in (locks or {}).items():
+        print(f"lock wait {name}: {count} acquisitions, avg {seconds / count * 1000 if count else 0:.2f} ms, "
+              f"total {seconds:.2f} s")
+    if mysql:
+        print("innodb: " + ', '.join(f"{name} +{value}" for name, value in mysql.items()))
+    return summary
+
+
+def _delta(before, after):
+    if before is None or after is None:
+        return None
+    return {
+        name: tuple(a - b for a, b in zip(value, before.get(name, (0,) * len(value))))
+        if isinstance(value, tuple) else value - before.get(name, 0)
+        for name, value in after.items()
+    }
+
+
+# -------------------------------------------------------------------
+# Entry point
+# -------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16], help="Concurrency per stage.")
+    parser.add_argument('--duration', type=float, default=20.0, help="Recorded seconds per stage.")
+    parser.add_argument('--warmup', type=float, default=3.0, help="Unrecorded seconds before each stage.")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Operation weights (default {DEFAULT_MIX}).")
+    parser.add_argument('--hot-posts', type=int, default=0,
+                        help="Send votes and comments to the N newest posts only (0 = every post in the feed).")
+    parser.add_argument('--user-prefix', default='loadtest')
+    parser.add_argument('--accounts', type=int, default=None,
+                        help="Log in as <prefix>0..<prefix>N-1 (default: one per client of the largest stage).")
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--create-users', type=int, metavar='N', help="Seed N accounts through the ORM and exit.")
+    parser.add_argument('--staff', metavar='USER:PASSWORD', help="Staff login for /metrics/ lock-wait timings.")
+    parser.add_argument('--mysql-status', action='store_true', help="Also diff InnoDB row-lock counters.")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', metavar='PATH', help="Write the per-stage summaries to PATH.")
+    args = parser.parse_args()
+
+    if args.create_users:
+        created = create_users(args.create_users, args.user_prefix, args.password)
+        print(f"{created} accounts created ({args.create_users - created} already existed).")
+        return
+    if args.mysql_status:
+        _django()
+
+    post_ids = discover_posts(Session(args.url, args.timeout))
+    n_accounts = args.accounts or max(args.clients)
+    print(f"{len(post_ids)} posts in the feed; logging in {max(args.clients)} clients as {n_accounts} accounts...")
+    clients = [
+        Client(args, f'{args.user_prefix}{i % n_accounts}', post_ids, args.seed + i)
+        for i in range(max(args.clients))
+    ]
+    staff = None
+    if args.staff:
+        staff = Session(args.url, args.timeout)
+        staff.login(*args.staff.split(':', 1))
+
+    summaries = []
+    for n in args.clients:
+        locks_before = lock_metrics(staff)
+        mysql_before = mysql_lock_status() if args.mysql_status else None
+        results = run_stage(clients[:n], args.mix, args.duration, args.warmup)
+        summaries.append(report(
+            n, results, args.duration,
+            _delta(locks_before, lock_metrics(staff)),
+            _delta(mysql_before, mysql_lock_status() if args.mysql_status else None),
+        ))
+
+    print(f"\n{'clients':>7} {'req/s':>9} {'p95 ms':>8} {'vote p95':>9} {'errors':>7} {'limited':>8}")
+    for s in summaries:
+        print(f"{s['clients']:>7} {s['rps']:>9.1f} {s['p95_ms']:>8.1f} {s['vote_p95_ms']:>9.1f} "
+              f"{s['errors']:>7} {s['limited']:>8}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summaries, f, indent=2)
+    for client in clients:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Measure UBlog cold start per settings profile (UBLOG_ENV).
+
+For each profile, every run starts a fresh interpreter and times:
+- ``manage.py check``: the whole process, wall clock
+- WSGI: importing UBlog.wsgi (settings, app loading and middleware setup),
+  then the first and second GET /login/ served by the WSGI callable (the
+  first one pays for URLconf import and template compilation)
+
+The prod profile links hashed static names from the collectstatic manifest,
+so its static files are collected into a temporary STATIC_ROOT first.
+
+Medians over --runs are printed. Run it from the repository root:
+
+    python scripts/measure_startup.py --runs 7 --profiles dev prod
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Runs inside the child interpreter; prints one JSON line
+WSGI_PROBE = r'''
+import io, json, sys, time
+t0 = time.perf_counter()
+from UBlog.wsgi import application
+t1 = time.perf_counter()
+
+def request(path):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': True,
+        'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    status = []
+    start = time.perf_counter()
+    body = b''.join(application(environ, lambda s, h, exc_info=None: status.append(s)))
+    return time.perf_counter() - start, status[0], len(body)
+
+first, status, size = request('/login/')
+second, _, _ = request('/login/')
+print(json.dumps({'import': t1 - t0, 'first': first, 'second': second, 'status': status,
+                  'drivers': sorted(m for m in ('pymysql', 'MySQLdb', 'dotenv') if m in sys.modules)}))
+'''
+
+
+def _env(profile, static_root):
+    env = dict(os.environ, UBLOG_ENV=profile, DJANGO_SETTINGS_MODULE='UBlog.settings', UBLOG_STATIC_ROOT=static_root)
+    env.setdefault('DJANGO_SECRET_KEY', 'startup-measurement-only')
+    env.setdefault('DJANGO_ALLOWED_HOSTS', 'localhost')
+    return env
+
+
+def measure(profile, runs, static_root):
+    env = _env(profile, static_root)
+    if profile == 'prod':
+        # Only prod serves hashed assets from the collectstatic manifest
+        subprocess.run(
+            [sys.executable, 'manage.py', 'collectstatic', '--noinput', '-v0'],
+            cwd=ROOT, env=env, check=True, capture_output=True,
+        )
+    check, imports, first, second = [], [], [], []
+    probe = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'manage.py', 'check'], cwd=ROOT, env=env, check=True, capture_output=True)
+        check.append(time.perf_counter() - start)
+
+        out = subprocess.run(
+            [sys.executable, '-c', WSGI_PROBE], cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        probe = json.loads(out.strip().splitlines()[-1])
+        imports.append(probe['import'])
+        first.append(probe['first'])
+        second.append(probe['second'])
+
+    ms = lambda samples: statistics.median(samples) * 1000  # noqa: E731
+    return {
+        'check_ms': ms(check), 'wsgi_import_ms': ms(imports), 'first_request_ms': ms(first),
+        'warm_request_ms': ms(second), 'status': probe['status'], 'drivers': ','.join(probe['drivers']) or '-',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--profiles', nargs='+', default=['dev', 'test', 'prod'], choices=['dev', 'test', 'prod'])
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'check ms':>9} {'wsgi import ms':>15} {'1st req ms':>11} {'warm req ms':>12}  status / drivers")
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as static_root:
+            r = measure(profile, args.runs, static_root)
+        print(
+            f"{profile:<8} {r['check_ms']:>9.0f} {r['wsgi_import_ms']:>15.0f} {r['first_request_ms']:>11.1f} "
+            f"{r['warm_request_ms']:>12.2f}  {r['status']} / {r['drivers']}"
+        )
+
+
+if __name__ == '__main__':
+    main()